@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from outbound import FRAME, RESULT, send_lane
+
+
+class Animation:
+    __slots__ = ('message', 'frames', 'final', 'markup', 'final_at')
+
+    def __init__(self, message: types.Message, frames: List[Tuple[float, str]], final: str,
+                 markup: Optional[types.InlineKeyboardMarkup], final_at: float):
+        self.message = message
+        # (event loop time the frame is due, text) for the frames not yet shown.
+        self.frames = frames
+        self.final = final
+        self.markup = markup
+        self.final_at = final_at
+
+
+class AnimationScheduler:
+    # Plays message animations in background tasks, so a handler can settle the game,
+    # submit the frames and the final text and return at once. A chat is edited at most
+    # once per `chat_interval`: frames that come due while it waits collapse into the
+    # newest one, and once Telegram answers RetryAfter only the final text is sent.
+    # With `max_active` animations running, new ones skip straight to the final text.
+    def __init__(self, frame_interval: float = 0.5, chat_interval: float = 0.5, max_active: int = 100):
+        self.frame_interval = frame_interval
+        self.chat_interval = chat_interval
+        self.max_active = max_active
+        self._animations: Dict[Tuple[int, int], Animation] = {}
+        self._chat_ready: Dict[int, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.edits = 0
+        self.dropped_frames = 0
+        self.skipped = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._animations)
+
+    def submit(self, message: types.Message, frames: List[str], final: str,
+               markup: Optional[types.InlineKeyboardMarkup] = None):
+        now = asyncio.get_running_loop().time()
+        key = (message.chat.id, message.message_id)
+        animation = self._animations.get(key)
+        if animation is not None:
+            # The message is still animating an earlier result: show the new one next.
+            self.dropped_frames += len(animation.frames)
+            animation.frames = []
+            animation.final, animation.markup, animation.final_at = final, markup, now
+            return
+
+        if len(self._animations) >= self.max_active:
+            self.skipped += 1
+            self.dropped_frames += len(frames)
+            frames = []
+        interval = self.frame_interval
+        self._animations[key] = animation = Animation(
+            message, [(now + i * interval, frame) for i, frame in enumerate(frames)], final, markup,
+            now + len(frames) * interval
+        )
+        if len(self._chat_ready) > 4 * self.max_active:
+            self._chat_ready = {chat_id: at for chat_id, at in self._chat_ready.items() if at > now}
+        task = asyncio.create_task(self._play(key, animation))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _play(self, key: Tuple[int, int], animation: Animation):
+        loop = asyncio.get_running_loop()
+        chat_id = key[0]
+        try:
+            while True:
+                frames = animation.frames
+                at = frames[0][0] if frames else animation.final_at
+                wait = max(at, self._chat_ready.get(chat_id, 0.0)) - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                now = loop.time()
+                if now < animation.final_at:
+                    due = 1
+                    while due < len(frames) and frames[due][0] <= now:
+                        due += 1
+                    self.dropped_frames += due - 1
+                    animation.frames = frames[due:]
+                    if not await self._edit(chat_id, animation.message, frames[due - 1][1], lane=FRAME):
+                        self.dropped_frames += len(animation.frames)
+                        animation.frames = []
+                        animation.final_at = now
+                    continue
+
+                self.dropped_frames += len(frames)
+                animation.frames = []
+                final = animation.final
+                # Repeated until delivered, and again if a newer result arrived meanwhile.
+                if await self._edit(chat_id, animation.message, final, animation.markup) \
+                        and animation.final is final:
+                    break
+        except Exception:
+            logging.exception("Animation of message %s failed", key)
+        finally:
+            del self._animations[key]
+
+    async def _edit(self, chat_id: int, message: types.Message, text: str,
+                    markup: Optional[types.InlineKeyboardMarkup] = None, lane: int = RESULT) -> bool:
+        # False when the chat is rate limited and the text was not shown.
+        loop = asyncio.get_running_loop()
+        self._chat_ready[chat_id] = loop.time() + self.chat_interval
+        token = send_lane.set(lane)
+        try:
+            await message.edit_text(text, reply_markup=markup)
+        except TelegramRetryAfter as e:
+            self._chat_ready[chat_id] = loop.time() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        finally:
+            send_lane.reset(token)
+        self.edits += 1
+        return True
+
+    async def close(self, timeout: float = 5.0):
+        # The games behind running animations are settled, so their results are still
+        # shown: remaining frames are skipped and the final texts sent, for up to `timeout`.
+        now = asyncio.get_running_loop().time()
+        for animation in self._animations.values():
+            self.dropped_frames += len(animation.frames)
+            animation.frames = []
+            animation.final_at = min(animation.final_at, now)
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def format_stats(self) -> str:
+        return f'{self.edits} edits, {self.dropped_frames} frames dropped, {self.skipped} animations skipped'
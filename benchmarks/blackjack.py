@@ -0,0 +1,47 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from games.blackjack import Blackjack  # noqa: E402
+
+
+def play(table: Blackjack, hands: int, players: int):
+    # Each hand: deal, hit to 17 and stand, as the bot's handlers would drive it.
+    for hand in range(hands):
+        user_id = hand % players
+        game = table.start_game(user_id, 10)
+        while game.result == 'playing' and game.player.total < 17:
+            table.hit(user_id)
+        if game.result == 'playing':
+            table.stand(user_id)
+
+
+def bench(hands: int, players: int):
+    print(f'{hands} hands, {players} players')
+    for decks in (1, 6, 8):
+        table = Blackjack(decks, 0.75, random.Random(1))
+        play(table, players, players)  # every player's shoe exists before timing
+
+        started = time.perf_counter()
+        play(table, hands, players)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        play(table, 1000, players)
+        grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+        print(f'{decks} deck(s): {hands / elapsed:10.0f} hands/s, retained {grown / 1000:6.1f} bytes per hand')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Blackjack engine throughput')
+    parser.add_argument('--hands', type=int, default=200_000)
+    parser.add_argument('--players', type=int, default=100)
+    args = parser.parse_args()
+    bench(args.hands, args.players)
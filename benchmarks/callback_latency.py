@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix='cybergamble-bench-')
+os.environ.setdefault('TELEGRAM_API_TOKEN', '123456:BENCHMARK')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'casino.db')
+
+import main  # noqa: E402
+from callbacks import SlotsBet  # noqa: E402
+from daily_limits import DailyLimiter  # noqa: E402
+from database import Database  # noqa: E402
+
+# Only the bot's own machine and scheduler are stubbed: no spin frames, and the
+# background edits of the result go out without pauses.
+main.slot_machine.get_animation_frames = lambda: []
+main.animations.frame_interval = main.animations.chat_interval = 0
+
+
+class BlockingDatabase:
+    # Baseline: the old behaviour, sqlite work runs inline on the event loop.
+    def __init__(self, path: str):
+        self._db = Database(path)
+        self.daily = DailyLimiter(main.config.MAX_DAILY_GAMES)
+
+    def __getattr__(self, name):
+        method = getattr(self._db, name)
+        if not asyncio.iscoroutinefunction(getattr(main.AsyncDatabase, name, None)):
+            # Fire and forget in AsyncDatabase (save_sessions, drop_session, ...): runs inline.
+            return method
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+    async def check_daily_limit(self, user_id: int) -> bool:
+        # Kept in memory by AsyncDatabase too, so all three variants do the same work here.
+        return self.daily.allowed(user_id)
+
+    def close(self):
+        self._db.conn.close()
+
+
+class FakeMessage:
+    def __init__(self, user_id: int):
+        self.chat = SimpleNamespace(id=user_id)
+        self.message_id = 1
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        return self
+
+
+class FakeCallback:
+    ids = itertools.count(1)
+
+    def __init__(self, user_id: int, data: str):
+        self.id = str(next(self.ids))
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.message = FakeMessage(user_id)
+
+    async def answer(self, text=None, show_alert=False, **kwargs):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def simulate_user(user_id: int, rounds: int, think: float, latencies: list):
+    # Latency is measured from the moment the user taps the button, so time spent
+    # waiting for a stalled event loop is counted as well.
+    rng = random.Random(user_id)
+    tapped = time.perf_counter()
+    for data in ['profile', 'slots'] + [SlotsBet(amount=10).pack(), 'profile'] * rounds:
+        tapped += rng.uniform(0, 2 * think)
+        delay = tapped - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Same work as UserContextMiddleware does before the handler runs.
+        user = await main.db.get_user(user_id)
+        await main.handle_callback(FakeCallback(user_id, data), user)
+        latencies.append(time.perf_counter() - tapped)
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.001):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(db, users: int, rounds: int, think: float) -> dict:
+    main.db = db
+    # The session store was built around the bot's own database; it writes here instead.
+    main.blackjack_sessions.db = db
+    for user_id in range(1, users + 1):
+        await db.register_user(user_id, f'player{user_id}')
+
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate_user(user_id, rounds, think, latencies) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    return {
+        'callbacks': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_loop_lag_ms': max(lags, default=0) * 1000,
+        'mean_loop_lag_ms': statistics.fmean(lags) * 1000 if lags else 0,
+    }
+
+
+async def bench(users: int, rounds: int, think: float):
+    main.db.close()
+    results = {}
+    factories = [
+        ('blocking', BlockingDatabase),
+        ('async', main.AsyncDatabase),
+        ('group', lambda path: main.AsyncDatabase(path, group_commit_window=main.config.DB_GROUP_COMMIT_WINDOW)),
+    ]
+    for name, factory in factories:
+        db = factory(os.path.join(WORKDIR, f'{name}.db'))
+        try:
+            results[name] = await run(db, users, rounds, think)
+        finally:
+            db.close()
+
+    print(f'{users} concurrent users, {rounds} slots rounds each, {think:.2f}s mean think time')
+    for name, r in results.items():
+        print(
+            f"{name:>9}: {r['callbacks']} callbacks, {r['throughput']:.0f}/s, "
+            f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, "
+            f"loop lag max {r['max_loop_lag_ms']:.2f} ms / mean {r['mean_loop_lag_ms']:.3f} ms"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='p99 callback latency with concurrent simulated users')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--think', type=float, default=0.5, help='mean pause between taps, seconds')
+    args = parser.parse_args()
+    asyncio.run(bench(args.users, args.rounds, args.think))
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix='cybergamble-load-')
+os.environ.setdefault('TELEGRAM_API_TOKEN', '123456:BENCHMARK')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'casino.db')
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+
+import main  # noqa: E402
+from callbacks import BlackjackBet, RouletteBet, SetLayout, SlotsBet  # noqa: E402
+from games.roulette import BetType  # noqa: E402
+
+# What one user does in a visit, per scenario: ('m', text) is a message, ('c', data) a button.
+Steps = List[Tuple[str, str]]
+SCENARIOS: Dict[str, Steps] = {
+    'menu': [('m', '/start')] + [('c', data) for data in (
+        'profile', 'games', 'main_menu', 'settings', 'layout_settings', SetLayout(layout='horizontal').pack(),
+        SetLayout(layout='vertical').pack(), 'language_settings', 'settings', 'rating', 'rules', 'main_menu'
+    )],
+    'slots': [('c', data) for data in ('games', 'slots', *[SlotsBet(amount=10).pack()] * 3)],
+    'roulette': [('c', data) for data in (
+        'games', 'roulette', RouletteBet(bet_type=BetType.COLOR, value='red').pack(),
+        RouletteBet(bet_type=BetType.DOZEN, value='2').pack(), 'roulette_spin'
+    )],
+    'blackjack': [('c', data) for data in (
+        'games', 'blackjack', BlackjackBet(amount=10).pack(), 'blackjack_hint', 'blackjack_hit', 'blackjack_stand'
+    )],
+}
+DEFAULT_MIX = 'menu=4,slots=3,roulette=1,blackjack=2'
+
+
+class RecordingSession(BaseSession):
+    # Stands in for the Bot API: counts every call by method and answers it, after
+    # `latency` seconds, with the smallest result aiogram accepts.
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if 'Message' not in str(method.__returning__):
+            return True
+        return Message(
+            message_id=getattr(method, 'message_id', None) or next(self._message_ids),
+            date=datetime.datetime.now(), chat=Chat(id=method.chat_id, type='private'),
+            text=getattr(method, 'text', None)
+        )
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class StatementCounter:
+    # Trace callback for the database connection; runs on the writer thread.
+    TRANSACTION = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+    def __init__(self):
+        self.queries = 0
+        self.commits = 0
+
+    def __call__(self, sql: str):
+        head = sql.lstrip().split(None, 1)[0].upper()
+        if head == 'COMMIT':
+            self.commits += 1
+        elif head not in self.TRANSACTION:
+            self.queries += 1
+
+
+class UpdateFactory:
+    def __init__(self):
+        self.ids = itertools.count(1)
+
+    def __call__(self, user_id: int, kind: str, data: str) -> Update:
+        user = User(id=user_id, is_bot=False, first_name=f'Player{user_id}')
+        chat = Chat(id=user_id, type='private')
+        if kind == 'm':
+            message = Message(message_id=next(self.ids), date=datetime.datetime.now(), chat=chat, from_user=user,
+                              text=data)
+            return Update(update_id=next(self.ids), message=message)
+        # The menu message the button belongs to, always the same one per user as in a real chat.
+        message = Message(message_id=user_id, date=datetime.datetime.now(), chat=chat, text='menu',
+                          from_user=User(id=1, is_bot=True, first_name='Casino'))
+        return Update(update_id=next(self.ids), callback_query=CallbackQuery(
+            id=str(next(self.ids)), from_user=user, chat_instance=str(user_id), message=message, data=data
+        ))
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+async def play(user_id: int, visits: List[Steps], updates: UpdateFactory, think: float, rng: random.Random,
+               latencies: List[float], errors: List[str]):
+    for steps in visits:
+        for kind, data in steps:
+            update = updates(user_id, kind, data)
+            started = time.perf_counter()
+            try:
+                await main.dp.feed_update(main.bot, update)
+            except Exception as e:
+                errors.append(f'{data}: {e!r}')
+            latencies.append(time.perf_counter() - started)
+            if think:
+                await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+async def settle(timeout: float = 60.0):
+    # Animations still playing and open roulette bets send their messages after the
+    # handlers return; they are counted with the phase that caused them.
+    deadline = time.monotonic() + timeout
+    while (main.animations.active or main.roulette_table.players) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def phase(name: str, plans: Dict[int, List[Steps]], updates: UpdateFactory, session: RecordingSession,
+                counter: StatementCounter, think: float, seed: int) -> dict:
+    session.calls.clear()
+    counter.queries = counter.commits = 0
+    latencies: List[float] = []
+    errors: List[str] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        play(user_id, visits, updates, think, random.Random(f'{seed}:{name}:{user_id}'), latencies, errors)
+        for user_id, visits in plans.items()
+    ))
+    elapsed = time.perf_counter() - started
+    await settle()
+
+    latencies.sort()
+    count = len(latencies)
+    if errors:
+        logging.warning("%s: %d updates failed, first: %s", name, len(errors), errors[0])
+    return {
+        'updates': count,
+        'seconds': round(elapsed, 3),
+        'throughput': round(count / elapsed, 1),
+        'latency_ms': {p: round(percentile(latencies, q) * 1000, 3)
+                       for p, q in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+        'db_queries_per_update': round(counter.queries / count, 3),
+        'db_commits_per_update': round(counter.commits / count, 3),
+        'api_calls_per_update': round(sum(session.calls.values()) / count, 3),
+        'api_calls': dict(session.calls.most_common()),
+        'errors': len(errors),
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        scenario, _, weight = part.partition('=')
+        if scenario not in SCENARIOS:
+            raise SystemExit(f'unknown scenario {scenario!r}, expected one of {", ".join(SCENARIOS)}')
+        mix[scenario] = float(weight or 1)
+    return mix
+
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\nagainst {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for name, current in results['phases'].items():
+        before = baseline['phases'].get(name)
+        if before is None:
+            continue
+        changes = []
+        for label, now, then in (
+            ('throughput', current['throughput'], before['throughput']),
+            ('p99', current['latency_ms']['p99'], before['latency_ms']['p99']),
+            ('db queries', current['db_queries_per_update'], before['db_queries_per_update']),
+            ('api calls', current['api_calls_per_update'], before['api_calls_per_update']),
+        ):
+            changes.append(f'{label} {(now - then) / then * 100:+.1f}%' if then else f'{label} {now} (was 0)')
+        print(f'{name:>10}: ' + ', '.join(changes))
+
+
+async def bench(users: int, visits: int, mix: Dict[str, float], think: float, api_latency: float, paced: bool,
+                roulette_round: float, seed: int) -> dict:
+    logging.getLogger('aiogram.event').setLevel(logging.WARNING)
+    session = RecordingSession(api_latency)
+    if paced:
+        session.middleware(main.send_scheduler)
+    main.bot.session = session
+    main.config.ROULETTE_ROUND_SECONDS = roulette_round
+    counter = StatementCounter()
+    background = await main.startup()
+    await main.db.set_trace(counter)
+    updates = UpdateFactory()
+    user_ids = range(100_000, 100_000 + users)
+    rng = random.Random(seed)
+    results = {}
+    try:
+        # Registration goes through the handlers as well: /start unregistered, then /register.
+        results['register'] = await phase(
+            'register', {u: [[('m', '/start'), ('m', f'/register player{u}')]] for u in user_ids},
+            updates, session, counter, think, seed
+        )
+        for scenario in mix:
+            results[scenario] = await phase(scenario, {u: [SCENARIOS[scenario]] * visits for u in user_ids},
+                                            updates, session, counter, think, seed)
+        names, weights = list(mix), list(mix.values())
+        results['mixed'] = await phase(
+            'mixed', {u: [SCENARIOS[name] for name in rng.choices(names, weights, k=visits)] for u in user_ids},
+            updates, session, counter, think, seed
+        )
+    finally:
+        await main.db.set_trace(None)
+        await main.shutdown(background)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'users': users,
+            'visits': visits,
+            'mix': mix,
+            'think': think,
+            'api_latency': api_latency,
+            'paced': paced,
+            'seed': seed,
+        },
+        'phases': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drive the Dispatcher with synthetic updates against a stub Bot API')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--visits', type=int, default=5, help='scenario runs per user in each phase')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights for the mixed phase ({DEFAULT_MIX})')
+    parser.add_argument('--think', type=float, default=0.0, help='mean pause between a user\'s updates, seconds')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds each stub Bot API call takes')
+    parser.add_argument('--paced', action='store_true', help='send through the outbound rate limiter')
+    parser.add_argument('--roulette-round', type=float, default=1.0, help='roulette round length, seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='dispatcher_load.json', help='where to save the results as JSON')
+    parser.add_argument('--compare', help='results JSON of an earlier run to show the changes against')
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args.users, args.visits, parse_mix(args.mix), args.think, args.api_latency,
+                                args.paced, args.roulette_round, args.seed))
+    print(f"{args.users} users, {args.visits} visits per phase, commit {results['meta']['commit']}")
+    for name, r in results['phases'].items():
+        latency = r['latency_ms']
+        print(f"{name:>10}: {r['updates']:6} updates, {r['throughput']:8.0f}/s, "
+              f"p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms, "
+              f"{r['db_queries_per_update']:.2f} queries, {r['db_commits_per_update']:.2f} commits, "
+              f"{r['api_calls_per_update']:.2f} API calls per update, {r['errors']} errors")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'saved to {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
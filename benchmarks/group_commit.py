@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncDatabase  # noqa: E402
+
+
+async def settle(db: AsyncDatabase, user_id: int, games: int):
+    # One slots spin: stake, payout and stats, each a separate write.
+    for _ in range(games):
+        await asyncio.gather(
+            db.update_balance(user_id, -10),
+            db.update_balance(user_id, 20),
+            db.update_stats(user_id, 'win'),
+        )
+
+
+async def run(path: str, users: int, games: int, window, batch: int) -> float:
+    db = AsyncDatabase(path, group_commit_window=window, group_commit_max=batch)
+    try:
+        for user_id in range(1, users + 1):
+            await db.register_user(user_id, f'player{user_id}')
+        started = time.perf_counter()
+        await asyncio.gather(*(settle(db, user_id, games) for user_id in range(1, users + 1)))
+        return users * games / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+
+async def bench(users: int, games: int, batch: int, directory: str):
+    print(f'{users} concurrent players, {games} settled games each')
+    for name, window in [('commit per call', None), ('group, 0 ms', 0.0), ('group, 2 ms', 0.002), ('group, 5 ms', 0.005)]:
+        path = os.path.join(directory, f'{name.replace(" ", "").replace(",", "_")}.db')
+        rate = await run(path, users, games, window, batch)
+        print(f'{name:>16}: {rate:9.0f} games/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Settled games per second with and without group commit')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=128, help='max calls per transaction')
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases (pick the production disk)')
+    args = parser.parse_args()
+    asyncio.run(bench(args.users, args.games, args.batch, args.dir or tempfile.mkdtemp(prefix='cybergamble-bench-')))
@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards import KeyboardManager  # noqa: E402
+
+
+def bench(number: int):
+    kb = KeyboardManager()
+    print(f'{"keyboard":>10} {"cold, us":>10} {"cached, us":>11} {"speedup":>8}')
+    for name, build in kb.builders.items():
+        getter = getattr(kb, f'get_{name}_keyboard')
+        if name == 'language':
+            cached = lambda: getter('en', 'horizontal')  # noqa: E731
+        else:
+            cached = lambda: getter('horizontal', 'en')  # noqa: E731
+        cold = timeit.timeit(lambda: build('horizontal', 'en'), number=number) / number
+        warm = timeit.timeit(cached, number=number) / number
+        print(f'{name:>10} {cold * 1e6:10.2f} {warm * 1e6:11.3f} {cold / warm:7.0f}x')
+
+    startup = timeit.timeit(KeyboardManager, number=10) / 10
+    print(f'prebuilding all keyboards at startup: {startup * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold vs cached keyboard generation')
+    parser.add_argument('--number', type=int, default=2000)
+    bench(parser.parse_args().number)
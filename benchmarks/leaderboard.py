@@ -0,0 +1,55 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard  # noqa: E402
+
+
+def timed(label: str, fn, repeat: int = 1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f'{label:>34}: {elapsed * 1e6:12.1f} us')
+
+
+def bench(users: int, operations: int):
+    rng = random.Random(7)
+    rows = [(user_id, f'player{user_id}', rng.randint(0, 5000), 0, 0) for user_id in range(1, users + 1)]
+
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.load(rows)
+    print(f'{users} players loaded in {time.perf_counter() - started:.2f} s')
+
+    ids = [rng.randint(1, users) for _ in range(operations)]
+    ratings = iter([rng.randint(0, 5000) for _ in range(operations)])
+    timed('update rating', lambda: board.update(rng.choice(ids), 'p', next(ratings), 1, 1), operations)
+    timed('rank of a player', lambda: board.rank(rng.choice(ids)), operations)
+    timed('player with 2 neighbours each side', lambda: board.around(rng.choice(ids), 2), operations)
+    timed('top 10', lambda: board.top(10), operations)
+
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(prefix='cybergamble-bench-'), 'leaderboard.db'))
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER, '
+                 'wins INTEGER, games_played INTEGER, is_banned INTEGER DEFAULT 0)')
+    conn.executemany('INSERT INTO users (user_id, username, rating, wins, games_played) VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    timed('SQL top 10 (no index)', lambda: conn.execute(
+        'SELECT username, rating FROM users WHERE is_banned = 0 ORDER BY rating DESC LIMIT 10').fetchall(), 5)
+    timed('SQL rank of a player (no index)', lambda: conn.execute(
+        'SELECT COUNT(*) FROM users WHERE is_banned = 0 AND rating > (SELECT rating FROM users WHERE user_id = ?)',
+        (rng.choice(ids),)).fetchone(), 5)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='In-memory leaderboard operations at scale')
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--operations', type=int, default=20000)
+    args = parser.parse_args()
+    bench(args.users, args.operations)
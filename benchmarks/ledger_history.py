@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger_partitions import archive_closed_months, user_history  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+def populate(conn: sqlite3.Connection, users: int, rows: int, days: int, today: date):
+    rng = random.Random(11)
+    start = datetime.combine(today - timedelta(days=days), datetime.min.time())
+    step = days * 86400 / rows
+    conn.executemany(
+        '''INSERT INTO transactions (user_id, entry_type, game_type, bet_amount, win_amount, result, timestamp)
+        VALUES (?, 'settle', ?, 10, ?, ?, ?)''',
+        (
+            (rng.randint(1, users), rng.choice(['slots', 'roulette', 'blackjack']), win * 20,
+             'win' if win else 'lose', start + timedelta(seconds=i * step))
+            for i in range(rows) for win in [rng.random() < 0.45]
+        )
+    )
+    conn.commit()
+
+
+def measure(conn: sqlite3.Connection, users: int, repeat: int, today: date) -> float:
+    rng = random.Random(5)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        user_history(conn, rng.randint(1, users), 30, today)
+    return (time.perf_counter() - started) / repeat
+
+
+def bench(users: int, rows: int, days: int, repeat: int, directory: str):
+    today = date.today()
+    conn = sqlite3.connect(os.path.join(directory, 'ledger.db'))
+    migrate(conn)
+    populate(conn, users, rows, days, today)
+
+    print(f'{rows} ledger rows over {days} days, {users} players')
+    print(f'  everything live: {measure(conn, users, repeat, today) * 1e3:8.3f} ms per 30-day history')
+    started = time.perf_counter()
+    archived = archive_closed_months(conn, os.path.join(directory, 'archive'), today=today)
+    print(f'  archived {sum(archived.values())} rows from {len(archived)} months in {time.perf_counter() - started:.1f} s')
+    live = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+    print(f'  rollups + live ({live} rows): {measure(conn, users, repeat, today) * 1e3:8.3f} ms per 30-day history')
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='30-day user history with and without ledger rollups')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases')
+    args = parser.parse_args()
+    bench(args.users, args.rows, args.days, args.repeat, args.dir or tempfile.mkdtemp(prefix='cybergamble-bench-'))
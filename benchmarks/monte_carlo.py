@@ -0,0 +1,32 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from games.monte_carlo import GAMES, simulate  # noqa: E402
+
+
+def bench(rounds: int, max_workers: int):
+    # The same simulation (same shards, same seeds) at 1, 2, 4, ... workers.
+    print(f'{rounds} rounds per game, {len(GAMES)} games, {os.cpu_count()} cores')
+    shards = max_workers * 4
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        started = time.perf_counter()
+        simulate(list(GAMES), rounds, shards=shards, workers=workers)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f'{workers:3} worker(s): {rounds * len(GAMES) / elapsed:10.0f} rounds/s, '
+              f'speedup {baseline / elapsed:5.2f}x')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo harness scaling across processes')
+    parser.add_argument('--rounds', type=int, default=200_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    bench(args.rounds, args.max_workers)
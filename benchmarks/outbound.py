@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+
+from outbound import FRAME, SendScheduler, TokenBucket, send_lane  # noqa: E402
+
+TOKEN = '123456:FAKE'
+
+
+class FakeBotAPI:
+    # A local stand-in for api.telegram.org that enforces its documented flood limits,
+    # about one message per second per chat with short bursts and 30 per second
+    # overall, answering 429 with a retry_after beyond them. Requests without a chat
+    # are never limited.
+    def __init__(self, chat_rate: float = 1.0, chat_burst: float = 3.0, global_rate: float = 30.0,
+                 latency: float = 0.02, retry_after: int = 1):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        self.latency = latency
+        self.retry_after = retry_after
+        self._chats: Dict[str, TokenBucket] = {}
+        self._global = TokenBucket(global_rate, global_rate, time.monotonic())
+        self.requests = 0
+        self.floods = 0
+        self.message_ids = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.match_info['method'].lower()
+        form = await request.post()
+        chat_id = form.get('chat_id')
+        now = time.monotonic()
+        if chat_id is not None:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+            if chat.delay(now) > 0 or self._global.delay(now) > 0:
+                self.floods += 1
+                return web.json_response({
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after}
+                })
+            chat.reserve(now)
+            self._global.reserve(now)
+        await asyncio.sleep(self.latency)
+
+        if method in ('sendmessage', 'editmessagetext'):
+            self.message_ids += 1
+            result = {
+                'message_id': int(form.get('message_id') or self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'},
+                'text': form.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self, port: int = 0) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', port)
+        await site.start()
+        self.port = runner.addresses[0][1]
+        return runner
+
+
+async def chat_burst(bot: Bot, chat_id: int, frames: int, results: List[float], failures: List[str]):
+    # What one slots spin sends: animation frames, then the result.
+    async def frame(text: str):
+        token = send_lane.set(FRAME)
+        try:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=1)
+        except TelegramRetryAfter:
+            failures.append('frame')
+        finally:
+            send_lane.reset(token)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(frame(f'frame {i}') for i in range(frames)))
+    try:
+        await bot.edit_message_text('result', chat_id=chat_id, message_id=1)
+        results.append(time.perf_counter() - started)
+    except TelegramRetryAfter:
+        failures.append('result')
+
+
+async def run(chats: int, frames: int, scheduler: Optional[SendScheduler]) -> str:
+    api = FakeBotAPI()
+    runner = await api.start()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f'http://127.0.0.1:{api.port}'))
+    if scheduler is not None:
+        session.middleware(scheduler)
+    bot = Bot(TOKEN, session=session)
+    results: List[float] = []
+    failures: List[str] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(chat_burst(bot, 1000 + chat, frames, results, failures) for chat in range(chats)))
+    elapsed = time.perf_counter() - started
+    await session.close()
+    await runner.cleanup()
+    if scheduler is not None:
+        await scheduler.close()
+
+    results.sort()
+    p99 = results[int(len(results) * 0.99) - 1] if results else 0.0
+    line = (f'{api.requests:6} requests, {api.floods:5} answered 429, '
+            f'results delivered {len(results)}/{chats}, frames lost {failures.count("frame")}, '
+            f'result latency p50 {statistics.median(results) if results else 0:.2f} s, p99 {p99:.2f} s, '
+            f'total {elapsed:.2f} s')
+    if scheduler is not None:
+        line += '\n' + scheduler.format_stats()
+    return line
+
+
+async def bench(chats: int, frames: int):
+    print(f'{chats} chats, {frames} frames + 1 result each, fake API at 1 msg/s per chat (burst 3), 30 msg/s overall')
+    print('direct:    ', await run(chats, frames, None))
+    print('scheduled: ', await run(chats, frames, SendScheduler()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Outbound send scheduler against a local fake Bot API')
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(bench(args.chats, args.frames))
@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import latest_version, migrate  # noqa: E402
+
+QUERIES = {
+    'user history': (
+        'SELECT game_type, bet_amount, win_amount, timestamp FROM transactions '
+        'WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20'
+    ),
+    'moderation log': 'SELECT action, reason, timestamp FROM moderation_logs WHERE user_id = ?',
+    'top players': (
+        'SELECT username, rating FROM users WHERE is_banned = 0 ORDER BY rating DESC LIMIT ?'
+    ),
+}
+
+
+def populate(conn: sqlite3.Connection, users: int, transactions: int, rng: random.Random):
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        'INSERT INTO users (user_id, username, rating, registration_date) VALUES (?, ?, ?, ?)',
+        ((user_id, f'player{user_id}', rng.randint(0, 5000), start) for user_id in range(1, users + 1))
+    )
+    conn.executemany(
+        'INSERT INTO transactions (user_id, game_type, bet_amount, win_amount, timestamp) VALUES (?, ?, ?, ?, ?)',
+        (
+            (rng.randint(1, users), rng.choice(['slots', 'roulette', 'blackjack']), 10, rng.choice([0, 20]),
+             start + timedelta(seconds=i))
+            for i in range(transactions)
+        )
+    )
+    conn.executemany(
+        'INSERT INTO moderation_logs (moderator_id, user_id, action, reason, timestamp) VALUES (?, ?, ?, ?, ?)',
+        ((1, rng.randint(1, users), 'ban', 'spam', start) for _ in range(users // 10))
+    )
+    conn.commit()
+
+
+def measure(conn: sqlite3.Connection, users: int, repeat: int, rng: random.Random):
+    for name, sql in QUERIES.items():
+        param = 10 if name == 'top players' else 1
+        plan = '; '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', (param,)))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, (10 if name == 'top players' else rng.randint(1, users),)).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat
+        print(f'  {name:>15}: {elapsed * 1e6:10.1f} us  [{plan}]')
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        user_id = rng.randint(1, users)
+        conn.execute('UPDATE users SET balance = balance + 10 WHERE user_id = ?', (user_id,))
+        conn.execute(
+            'INSERT INTO transactions (user_id, game_type, bet_amount, win_amount, timestamp) VALUES (?, ?, ?, ?, ?)',
+            (user_id, 'slots', 10, 20, datetime.now())
+        )
+        conn.commit()
+    journal = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    print(f'  {"settle + commit":>15}: {(time.perf_counter() - started) / repeat * 1e6:10.1f} us  [journal_mode={journal}]')
+
+
+def bench(users: int, transactions: int, repeat: int, directory: str):
+    rng = random.Random(3)
+    conn = sqlite3.connect(os.path.join(directory, 'plans.db'))
+    migrate(conn, target=1)
+    populate(conn, users, transactions, rng)
+
+    print(f'schema version 1 ({users} users, {transactions} transactions)')
+    measure(conn, users, repeat, rng)
+
+    migrate(conn)
+    conn.execute('ANALYZE')
+    print(f'schema version {latest_version()}')
+    measure(conn, users, repeat, rng)
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query plans and timings before and after migrations')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--dir', default=None, help='directory for the scratch database')
+    args = parser.parse_args()
+    bench(args.users, args.transactions, args.repeat, args.dir or tempfile.mkdtemp(prefix='cybergamble-bench-'))
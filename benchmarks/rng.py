@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from entropy import EntropyPool, ProvablyFair  # noqa: E402
+from games.blackjack import Blackjack  # noqa: E402
+from games.roulette import Roulette, RouletteTable  # noqa: E402
+from games.slots import SlotMachine  # noqa: E402
+
+
+def workloads(rng: random.Random):
+    # The draws each game makes per round: three reels, one wheel, one six-deck shoe.
+    machine = SlotMachine(rng)
+    table = RouletteTable(Roulette(rng))
+    blackjack = Blackjack(6, 0.75, rng, fresh_shoes=True)
+    return {
+        'slots': lambda user_id: machine.spin(10),
+        'roulette': lambda user_id: table.spin(),
+        'blackjack': lambda user_id: blackjack.start_game(user_id, 10),
+    }
+
+
+def run(rounds: int, rng: random.Random, fairness: ProvablyFair = None) -> dict:
+    rates = {}
+    for game, play in workloads(rng).items():
+        started = time.perf_counter()
+        for n in range(rounds):
+            user_id = n % 100
+            if fairness is None:
+                play(user_id)
+            else:
+                fair_round = fairness.open((game, user_id), f'{game}:{n}', f'{user_id}:{n}', user_id)
+                with fairness.use(fair_round):
+                    play(user_id)
+        rates[game] = rounds / (time.perf_counter() - started)
+    return rates
+
+
+def bench(rounds: int, pool_bytes: int):
+    print(f'{rounds} rounds per game, pool of {pool_bytes} bytes')
+    pool = EntropyPool(pool_bytes)
+    sources = [
+        ('mersenne twister', lambda: run(rounds, random.Random())),
+        ('os.urandom per draw', lambda: run(rounds, random.SystemRandom())),
+        ('entropy pool', lambda: run(rounds, pool)),
+        # Seeds kept away from the pool the games draw from, as in the bot.
+        ('provably fair', lambda: run(rounds, pool, ProvablyFair(EntropyPool(pool_bytes)))),
+    ]
+    for name, measure in sources:
+        rates = measure()
+        print(f'{name:>20}: ' + ', '.join(f'{game} {rate:9.0f}/s' for game, rate in rates.items()))
+    print(f'pool: {pool.format_stats()}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Game rounds per second by source of randomness')
+    parser.add_argument('--rounds', type=int, default=20_000)
+    parser.add_argument('--pool-bytes', type=int, default=64 * 1024)
+    args = parser.parse_args()
+    bench(args.rounds, args.pool_bytes)
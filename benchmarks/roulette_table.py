@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from games.roulette import BetType, Roulette, RouletteTable  # noqa: E402
+
+BETS = [(BetType.COLOR, 'red'), (BetType.PARITY, 'even'), (BetType.DOZEN, '2'), (BetType.NUMBER, '17')]
+
+
+def per_player(db: Database, players: int, rng: random.Random):
+    # Before: a Roulette per player, a spin per player and a commit per settlement.
+    for user_id in range(1, players + 1):
+        game = Roulette()
+        for bet_type, value in rng.sample(BETS, 2):
+            game.place_bet(user_id, bet_type, value, 10)
+        stake = sum(bet.amount for bet in game.get_active_bets(user_id))
+        _, payout = game.spin(user_id)
+        db.settle_game(user_id, 'roulette', stake, payout, 'win' if payout > 0 else 'lose')
+
+
+def shared_table(db: Database, players: int, rng: random.Random):
+    table = RouletteTable()
+    for user_id in range(1, players + 1):
+        for bet_type, value in rng.sample(BETS, 2):
+            table.place_bet(user_id, bet_type, value, 10)
+    result = table.spin()
+    db.settle_round('roulette', [
+        (user_id, stake, payout, 'win' if payout > 0 else 'lose', None)
+        for user_id, stake, payout in result.settlements
+    ])
+
+
+def bench(players: int, directory: str):
+    print(f'{players} players, 2 bets each')
+    for name, play in [('per player', per_player), ('shared table', shared_table)]:
+        db = Database(os.path.join(directory, f"{name.replace(' ', '_')}.db"))
+        with db.batch():
+            for user_id in range(1, players + 1):
+                db.register_user(user_id, f'player{user_id}')
+        started = time.perf_counter()
+        play(db, players, random.Random(7))
+        elapsed = time.perf_counter() - started
+        db.conn.close()
+        print(f'{name:>13}: {elapsed * 1e3:9.1f} ms per round, {elapsed / players * 1e6:7.1f} us per player')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roulette settlement: a wheel per player vs one shared table')
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases')
+    args = parser.parse_args()
+    bench(args.players, args.dir or tempfile.mkdtemp(prefix='cybergamble-bench-'))
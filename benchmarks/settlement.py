@@ -0,0 +1,63 @@
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+KEYS = itertools.count()
+
+
+def separate_calls(db: Database, user_id: int):
+    # What a slots spin used to cost: stake, payout and stats as separate commits.
+    db.update_balance(user_id, -10)
+    db.update_balance(user_id, 20)
+    db.update_stats(user_id, 'win')
+
+
+def settle(db: Database, user_id: int):
+    db.settle_game(user_id, 'slots', 10, 20, 'win')
+
+
+def settle_with_key(db: Database, user_id: int):
+    # What a handler does now: a keyed ledger entry checked against earlier postings.
+    db.settle_game(user_id, 'slots', 10, 20, 'win', idempotency_key=f'settle:{next(KEYS)}')
+
+
+def grouped(db: Database, user_id: int):
+    # 100 keyed settlements sharing one commit, as AsyncDatabase groups them.
+    with db.batch():
+        for _ in range(100):
+            with db.savepoint():
+                settle_with_key(db, user_id)
+
+
+def bench(games: int, directory: str):
+    variants = [
+        ('separate calls', separate_calls, 1),
+        ('settle_game', settle, 1),
+        ('keyed ledger', settle_with_key, 1),
+        ('grouped x100', grouped, 100)
+    ]
+    for name, play, per_call in variants:
+        db = Database(os.path.join(directory, f"{name.replace(' ', '_')}.db"))
+        db.register_user(1, 'player1')
+        db.update_balance(1, games * 100)
+        started = time.perf_counter()
+        for _ in range(games // per_call):
+            play(db, 1)
+        elapsed = time.perf_counter() - started
+        db.conn.close()
+        print(f'{name:>15}: {elapsed / games * 1e6:8.1f} us per game')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-game database time of a settlement')
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--dir', default=None, help='directory for the scratch databases')
+    args = parser.parse_args()
+    bench(args.games, args.dir or tempfile.mkdtemp(prefix='cybergamble-bench-'))
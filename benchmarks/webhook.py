@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:FAKE'
+
+
+class FakeBotAPI:
+    # Answers every Bot API call the workers make with a plausible result, without limits,
+    # and tells each fake user when the bot has replied to them.
+    def __init__(self):
+        self.requests = 0
+        self.message_ids = itertools.count(1000)
+        self._waiting: Dict[int, asyncio.Future] = {}
+
+    def reply(self, user_id: int) -> asyncio.Future:
+        future = self._waiting[user_id] = asyncio.get_running_loop().create_future()
+        return future
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.match_info['method'].lower()
+        form = await request.post()
+        # A reply is a message sent or edited in the user's chat, or an alert; callback
+        # query ids are '<user id>:<n>', see UpdateFactory.
+        if 'chat_id' in form:
+            user_id = int(form['chat_id'])
+        elif method == 'answercallbackquery' and form.get('text'):
+            user_id = int(form['callback_query_id'].split(':')[0])
+        else:
+            user_id = None
+        future = self._waiting.pop(user_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+        if method == 'getme':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Casino', 'username': 'casino_bot'}
+        elif method in ('sendmessage', 'editmessagetext'):
+            chat_id = int(form.get('chat_id', 0))
+            result = {
+                'message_id': int(form.get('message_id') or next(self.message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': form.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        self.port = runner.addresses[0][1]
+        return runner
+
+
+class UpdateFactory:
+    # Raw updates shaped like Telegram's for a private chat with each fake user.
+    def __init__(self):
+        self.update_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'en'}
+
+    def message(self, user_id: int, text: str) -> Dict:
+        return {'update_id': next(self.update_ids), 'message': {
+            'message_id': next(self.update_ids), 'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'}, 'from': self._user(user_id), 'text': text
+        }}
+
+    def callback(self, user_id: int, data: str) -> Dict:
+        return {'update_id': next(self.update_ids), 'callback_query': {
+            'id': f'{user_id}:{next(self.update_ids)}', 'chat_instance': str(user_id), 'from': self._user(user_id),
+            'data': data, 'message': {
+                'message_id': 1, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Casino'}, 'text': 'menu'
+            }
+        }}
+
+
+# What each fake user does after registering: a few spins and a blackjack hand.
+SCRIPT = ['slots', 'slots_bet:10', 'slots_bet:10', 'blackjack', 'bet:10', 'blackjack_hit',
+          'blackjack_stand', 'profile']
+
+
+async def user_session(http: aiohttp.ClientSession, url: str, api: FakeBotAPI, factory: UpdateFactory,
+                       user_id: int, rounds: int, acks: List[float], replies: List[float], failures: List[int]):
+    # Like a person tapping through the bot: the next update only once the chat shows the
+    # reply, so each user is paced by the bot's per-chat send limit as on Telegram.
+    updates = [factory.message(user_id, '/start'), factory.message(user_id, f'/register player{user_id}')]
+    for _ in range(rounds):
+        updates.extend(factory.callback(user_id, data) for data in SCRIPT)
+    for update in updates:
+        reply = api.reply(user_id)
+        started = time.perf_counter()
+        try:
+            async with http.post(url, json=update) as response:
+                ok = response.status == 200
+        except aiohttp.ClientError:
+            ok = False
+        if not ok:
+            failures.append(user_id)
+            continue
+        acks.append(time.perf_counter() - started)
+        try:
+            await asyncio.wait_for(reply, 10.0)
+        except asyncio.TimeoutError:
+            failures.append(user_id)
+            continue
+        replies.append(time.perf_counter() - started)
+
+
+def percentiles(values: List[float]) -> str:
+    values = sorted(values)
+    if not values:
+        return 'n/a'
+    return f'p50 {statistics.median(values) * 1000:.1f} ms, p99 {values[int(len(values) * 0.99) - 1] * 1000:.1f} ms'
+
+
+async def wait_ready(http: aiohttp.ClientSession, port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f'http://127.0.0.1:{port}/status') as response:
+                status = await response.json()
+            if all(worker['ready'] for worker in status['workers']):
+                return status
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('ingress did not come up')
+
+
+async def bench(workers: int, users: int, rounds: int, port: int, restart: bool, kill_worker: bool):
+    api = FakeBotAPI()
+    api_runner = await api.start()
+    workdir = tempfile.mkdtemp(prefix='webhook-bench-')
+    env = dict(os.environ, TELEGRAM_API_TOKEN=TOKEN, TELEGRAM_API_URL=f'http://127.0.0.1:{api.port}',
+               DATABASE_PATH=os.path.join(workdir, 'casino.db'), WEBHOOK_URL='', WEBHOOK_SECRET='')
+    ingress = subprocess.Popen([sys.executable, 'webhook.py', '--workers', str(workers), '--port', str(port)],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, 'log'), 'w'))
+    url = f'http://127.0.0.1:{port}/webhook'
+    acks: List[float] = []
+    replies: List[float] = []
+    failures: List[int] = []
+    try:
+        async with aiohttp.ClientSession() as http:
+            status = await wait_ready(http, port)
+            print(f'{workers} workers up (pids {[w["pid"] for w in status["workers"]]}), '
+                  f'{users} users x {2 + rounds * len(SCRIPT)} updates')
+            factory = UpdateFactory()
+            started = time.perf_counter()
+            sessions = asyncio.gather(*(
+                user_session(http, url, api, factory, 10_000 + user, rounds, acks, replies, failures) for user in range(users)
+            ))
+            if restart:
+                await asyncio.sleep(2.0)
+                ingress.send_signal(signal.SIGHUP)
+                print('rolling restart of the workers mid-run')
+            elif kill_worker:
+                await asyncio.sleep(2.0)
+                os.kill(status['workers'][0]['pid'], signal.SIGKILL)
+                print('killed worker 0 mid-run')
+            await sessions
+            elapsed = time.perf_counter() - started
+            async with http.get(f'http://127.0.0.1:{port}/status') as response:
+                status = await response.json()
+    finally:
+        ingress.send_signal(signal.SIGTERM)
+        ingress.wait(120)
+        await api_runner.cleanup()
+
+    print(f'{users * (2 + rounds * len(SCRIPT))} updates in {elapsed:.2f} s: '
+          f'{len(replies) / elapsed:.0f} answered/s, {len(failures)} refused or unanswered')
+    print(f'ack latency {percentiles(acks)}; reply latency {percentiles(replies)}')
+    print(f'{api.requests} Bot API calls from the workers')
+    print(json.dumps(status['workers']))
+    print(f'ingress log: {os.path.join(workdir, "log")}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Webhook ingress and workers fed by a fake update generator')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3, help='slots/blackjack rounds per user')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--restart', action='store_true', help='SIGHUP the ingress (rolling restart) mid-run')
+    parser.add_argument('--kill-worker', action='store_true', help='SIGKILL worker 0 mid-run')
+    args = parser.parse_args()
+    asyncio.run(bench(args.workers, args.users, args.rounds, args.port, args.restart, args.kill_worker))
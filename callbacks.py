@@ -0,0 +1,154 @@
+import pkgutil
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+from pydantic import field_validator
+import locales
+from games.roulette import BetType
+
+# Stakes offered by the slots and blackjack keyboards; any other amount is a forged payload.
+BET_AMOUNTS = (10, 50, 100)
+
+
+# Keyboard layouts, and languages with a locale module; anything else would be stored
+# in the user's settings as is.
+LAYOUTS = ('vertical', 'horizontal')
+LANGUAGES = tuple(sorted(module.name for module in pkgutil.iter_modules(locales.__path__)))
+
+
+def _offered_amount(amount: int) -> int:
+    if amount not in BET_AMOUNTS:
+        raise ValueError(f'{amount} is not an offered bet')
+    return amount
+
+
+def _known_layout(layout: str) -> str:
+    if layout not in LAYOUTS:
+        raise ValueError(f"'{layout}' is not a keyboard layout")
+    return layout
+
+
+def _known_language(lang: str) -> str:
+    if lang not in LANGUAGES:
+        raise ValueError(f"'{lang}' has no locale")
+    return lang
+
+
+class SetLayout(CallbackData, prefix='set_layout'):
+    layout: str
+
+    _known = field_validator('layout')(_known_layout)
+
+class SetLanguage(CallbackData, prefix='set_lang'):
+    lang: str
+
+    _known = field_validator('lang')(_known_language)
+
+class SlotsBet(CallbackData, prefix='slots_bet'):
+    amount: int
+
+    _offered = field_validator('amount')(_offered_amount)
+
+class RouletteBet(CallbackData, prefix='roulette_bet'):
+    bet_type: BetType
+    value: str
+
+class BlackjackBet(CallbackData, prefix='bet'):
+    amount: int
+
+    _offered = field_validator('amount')(_offered_amount)
+
+
+CallbackHandler = Callable[..., Awaitable[Any]]
+
+SEPARATOR = ':'
+
+
+class RouteStats:
+    __slots__ = ('calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class CallbackRouter:
+    # Plain keys ('profile') are matched exactly; CallbackData factories are matched by
+    # their prefix and the handler receives the unpacked payload as `callback_data`.
+    # Either way dispatch is a single dict lookup. A payload its factory rejects, e.g. a
+    # forged bet amount, is treated like unknown data and never reaches a handler.
+    def __init__(self):
+        self._exact: Dict[str, CallbackHandler] = {}
+        self._prefixed: Dict[str, Tuple[Type[CallbackData], CallbackHandler]] = {}
+        self.stats: Dict[str, RouteStats] = {}
+
+    def exact(self, *keys: str):
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            for key in keys:
+                if key in self._exact:
+                    raise ValueError(f"Callback '{key}' is already routed")
+                self._exact[key] = handler
+                self.stats[key] = RouteStats()
+            return handler
+        return decorator
+
+    def prefix(self, factory: Type[CallbackData]):
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            prefix = factory.__prefix__
+            if factory.__separator__ != SEPARATOR:
+                raise ValueError(f"{factory.__name__} must use '{SEPARATOR}' as separator")
+            if prefix in self._prefixed:
+                raise ValueError(f"Callback prefix '{prefix}' is already routed")
+            self._prefixed[prefix] = (factory, handler)
+            self.stats[prefix] = RouteStats()
+            return handler
+        return decorator
+
+    def format_stats(self) -> str:
+        lines = []
+        for route, stats in sorted(self.stats.items(), key=lambda item: item[1].total_time, reverse=True):
+            if stats.calls or stats.errors:
+                lines.append(
+                    f"{route}: {stats.calls} calls, {stats.errors} errors, "
+                    f"avg {stats.avg_time * 1000:.2f} ms, max {stats.max_time * 1000:.2f} ms"
+                )
+        return '\n'.join(lines)
+
+    async def dispatch(self, callback: CallbackQuery, **context) -> Optional[Any]:
+        # Returns whatever the handler returned; None if nothing matched.
+        data = callback.data or ''
+        route = data
+        handler = self._exact.get(data)
+        if handler is None:
+            prefix, separator, _ = data.partition(SEPARATOR)
+            entry = self._prefixed.get(prefix) if separator else None
+            if entry is None:
+                return None
+            factory, handler = entry
+            route = prefix
+            try:
+                context['callback_data'] = factory.unpack(data)
+            except (TypeError, ValueError):
+                self.stats[route].errors += 1
+                return None
+
+        stats = self.stats[route]
+        started = time.perf_counter()
+        try:
+            return await handler(callback, **context)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.calls += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
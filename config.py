@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 from typing import Dict
 
@@ -9,6 +10,49 @@ class Config:
     AVAILABLE_LANGUAGES: Dict[str, str] = None
     MAX_DAILY_GAMES: int = 100
     ADMIN_IDS: list = None
+    DATABASE_PATH: str = None
+    DB_GROUP_COMMIT_WINDOW: float = 0.003
+    DB_GROUP_COMMIT_MAX: int = 128
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 300.0
+    LEDGER_ARCHIVE_DIR: str = 'ledger_archive'
+    LEDGER_LIVE_MONTHS: int = 1
+    LEDGER_ARCHIVE_INTERVAL: float = 24 * 3600
+    ROULETTE_ROUND_SECONDS: float = 15.0
+    BLACKJACK_DECKS: int = 6
+    BLACKJACK_PENETRATION: float = 0.75
+    ANIMATION_FRAME_INTERVAL: float = 0.5
+    ANIMATION_CHAT_INTERVAL: float = 0.5
+    ANIMATION_MAX_ACTIVE: int = 100
+    OUTBOUND_GLOBAL_RATE: float = 30.0
+    OUTBOUND_CHAT_RATE: float = 1.0
+    OUTBOUND_CHAT_BURST: float = 3.0
+    OUTBOUND_GROUP_RATE: float = 20 / 60
+    OUTBOUND_GROUP_BURST: float = 3.0
+    OUTBOUND_MAX_RETRIES: int = 3
+    SESSION_TTL: float = 1800.0
+    SESSION_MAX: int = 10000
+    SESSION_SWEEP_INTERVAL: float = 60.0
+    DAILY_FLUSH_INTERVAL: float = 30.0
+    # Webhook workers only: how often the leaderboard is re-read to show other workers' players.
+    LEADERBOARD_REFRESH_INTERVAL: float = 60.0
+    RNG_POOL_BYTES: int = 64 * 1024
+    PROVABLY_FAIR: bool = False
+    FAIR_CHAIN_LENGTH: int = 1000  # seeds per chain; every player's game gets its own
+    BOT_API_URL: str = None
+    WEBHOOK_HOST: str = '0.0.0.0'
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_PATH: str = '/webhook'
+    WEBHOOK_URL: str = None
+    WEBHOOK_SECRET: str = None
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_WORKER_PORT: int = 8100
+    WEBHOOK_BATCH_MAX: int = 256
+    # Long enough for a worker to drain, snapshot and come back during a rolling restart.
+    WEBHOOK_FORWARD_TIMEOUT: float = 30.0
+    # Set by the webhook ingress for each worker process; polling runs as worker 0 of 1.
+    WORKER_INDEX: int = 0
+    WORKER_COUNT: int = 1
     
     def __post_init__(self):
         self.AVAILABLE_LANGUAGES = {
@@ -17,4 +61,11 @@ class Config:
         }
         self.ADMIN_IDS = [
             123456789  # Замените на реальные ID администраторов
-        ]
\ No newline at end of file
+        ]
+        self.DATABASE_PATH = os.getenv('DATABASE_PATH', 'casino.db')
+        self.BOT_API_URL = os.getenv('TELEGRAM_API_URL')
+        self.PROVABLY_FAIR = os.getenv('PROVABLY_FAIR', '0') == '1'
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+        self.WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+        self.WORKER_INDEX = int(os.getenv('WORKER_INDEX', '0'))
+        self.WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
\ No newline at end of file
@@ -0,0 +1,73 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def day_bounds(now: float) -> Tuple[datetime, float]:
+    # Local midnight starting the day of `now`, and the timestamp of the next one.
+    today = date.fromtimestamp(now)
+    start = datetime.combine(today, datetime.min.time())
+    return start, datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+
+
+class DailyLimiter:
+    # Games each user has played today, counted in memory: checking the limit costs a
+    # clock read and a dict lookup. Counters changed since the last take_dirty() are
+    # written back in batches, and at local midnight they are all dropped at once, with
+    # `on_rollover(day_start)` resetting the stored ones in a single statement.
+    def __init__(self, limit: int, on_rollover: Optional[Callable[[datetime], None]] = None):
+        self.limit = limit
+        self.on_rollover = on_rollover
+        self.day_start, self._next_day = day_bounds(time.time())
+        self._counts: Dict[int, int] = {}
+        self._dirty: Set[int] = set()
+        self.refused = 0
+        self.rollovers = 0
+
+    def _roll(self):
+        now = time.time()
+        if now < self._next_day:
+            return
+        self.day_start, self._next_day = day_bounds(now)
+        self._counts.clear()
+        self._dirty.clear()
+        self.rollovers += 1
+        if self.on_rollover is not None:
+            self.on_rollover(self.day_start)
+
+    def load(self, counts: Iterable[Tuple[int, int]]):
+        # Today's stored counters, read once at startup.
+        self._roll()
+        for user_id, games in counts:
+            self._counts[user_id] = max(games, self._counts.get(user_id, 0))
+
+    def allowed(self, user_id: int) -> bool:
+        self._roll()
+        if self._counts.get(user_id, 0) < self.limit:
+            return True
+        self.refused += 1
+        return False
+
+    def played(self, user_id: int, games: int = 1) -> int:
+        self._roll()
+        count = self._counts[user_id] = self._counts.get(user_id, 0) + games
+        self._dirty.add(user_id)
+        return count
+
+    def games_today(self, user_id: int) -> int:
+        self._roll()
+        return self._counts.get(user_id, 0)
+
+    def take_dirty(self) -> List[Tuple[int, int]]:
+        # (user_id, games today) for every counter changed since the previous call.
+        self._roll()
+        rows = [(user_id, self._counts[user_id]) for user_id in self._dirty]
+        self._dirty.clear()
+        return rows
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def format_stats(self) -> str:
+        return (f'{len(self._counts)} players today, {len(self._dirty)} unsaved, '
+                f'{self.refused} refused at the limit of {self.limit}, {self.rollovers} rollovers')
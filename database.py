@@ -1,60 +1,98 @@
+import asyncio
+import logging
+import queue
 import sqlite3
-from datetime import datetime
-from typing import Optional, List, Dict
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Optional, List, Dict, Tuple
 import re
+from user_cache import UserCache, UserRecord, USER_COLUMNS
+from leaderboard import Leaderboard
+from game_stats import GameStats, SETTLE_UPSERT, read_game_stats
+from ledger import LedgerWriter, Posting, BET, SETTLE
+from ledger_partitions import archive_closed_months, user_history
+from daily_limits import DailyLimiter
+from migrations import migrate
 
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect('casino.db')
+    # Connection settings, applied on every connect (journal_mode=WAL is persisted by a migration).
+    PRAGMAS = (
+        'PRAGMA synchronous = FULL',  # group commit keeps one fsync per batch affordable
+        'PRAGMA cache_size = -16000',  # 16 MB page cache
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA busy_timeout = 5000'
+    )
+
+    def __init__(self, path: str = 'casino.db', user_cache: Optional[UserCache] = None):
+        self.conn = sqlite3.connect(path)
+        for pragma in self.PRAGMAS:
+            self.conn.execute(pragma)
+        self.users = user_cache or UserCache()
+        self.leaderboard = Leaderboard()
+        self._batching = False
+        self._savepoint_users: Optional[set] = None
         self.create_tables()
+        self.ledger = LedgerWriter(self.conn)
+        self.load_leaderboard()
 
-    def create_tables(self):
-        cursor = self.conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE,
-            balance INTEGER DEFAULT 1000,
-            games_played INTEGER DEFAULT 0,
-            wins INTEGER DEFAULT 0,
-            last_game TIMESTAMP,
-            rating INTEGER DEFAULT 1000,
-            layout_type TEXT DEFAULT 'vertical',
-            language TEXT DEFAULT 'ru',
-            is_banned INTEGER DEFAULT 0,
-            registration_date TIMESTAMP,
-            games_today INTEGER DEFAULT 0,
-            last_daily_reset TIMESTAMP
-        )
-        ''')
+    def _commit(self):
+        if not self._batching:
+            self.ledger.flush()
+            self.conn.commit()
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            game_type TEXT,
-            bet_amount INTEGER,
-            win_amount INTEGER,
-            timestamp TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS moderation_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            moderator_id INTEGER,
-            user_id INTEGER,
-            action TEXT,
-            reason TEXT,
-            timestamp TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
+    @contextmanager
+    def batch(self):
+        # Every call made inside the block shares one transaction and a single commit.
+        # Inside an enclosing batch the block simply joins it.
+        if self._batching:
+            yield
+            return
+        # IMMEDIATE takes the write lock up front: with webhook workers sharing the file, a
+        # deferred transaction that read first could not upgrade once another one committed.
+        self.conn.execute('BEGIN IMMEDIATE')
+        self._batching = True
+        try:
+            yield
+            self.ledger.flush()
+        except BaseException:
+            self._batching = False
+            self.ledger.discard()
+            self.conn.rollback()
+            raise
+        self._batching = False
         self.conn.commit()
 
+    @contextmanager
+    def savepoint(self, name: str = 'call'):
+        # Inside a batch, undoes only the statements of the failed call.
+        self.conn.execute(f'SAVEPOINT {name}')
+        mark = self.ledger.mark()
+        outer, self._savepoint_users = self._savepoint_users, set()
+        try:
+            yield
+        except BaseException:
+            self.conn.execute(f'ROLLBACK TO {name}')
+            self.ledger.rollback_to(mark)
+            # Users cached by the failed call are re-read in their rolled back state.
+            touched, self._savepoint_users = self._savepoint_users, None
+            for user_id in touched:
+                self.users.invalidate(user_id)
+                if self.load_user(user_id) is None:
+                    self.leaderboard.remove(user_id)
+            self._savepoint_users = touched
+            raise
+        finally:
+            self.conn.execute(f'RELEASE {name}')
+            # An enclosing savepoint may still roll these users back as well.
+            if outer is not None:
+                outer.update(self._savepoint_users)
+            self._savepoint_users = outer
+
+    def create_tables(self):
+        migrate(self.conn)
+
     def register_user(self, user_id: int, username: str) -> bool:
         if not self.is_valid_username(username):
             return False
@@ -65,7 +103,8 @@ class Database:
             INSERT INTO users (user_id, username, registration_date, last_daily_reset)
             VALUES (?, ?, ?, ?)
             ''', (user_id, username, datetime.now(), datetime.now()))
-            self.conn.commit()
+            self._commit()
+            self.load_user(user_id)
             return True
         except sqlite3.IntegrityError:
             return False
@@ -76,75 +115,92 @@ class Database:
         return bool(re.match('^[a-zA-Z0-9]+$', username))
 
     def is_registered(self, user_id: int) -> bool:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT username FROM users WHERE user_id = ?', (user_id,))
-        return cursor.fetchone() is not None
+        return self.get_user(user_id) is not None
 
     def is_banned(self, user_id: int) -> bool:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT is_banned FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        return result and result[0] == 1
+        user = self.get_user(user_id)
+        return bool(user and user.is_banned == 1)
 
-    def get_user(self, user_id: int) -> Optional[Dict]:
+    def get_user(self, user_id: int) -> Optional[UserRecord]:
+        user = self.users.get(user_id)
+        if user is not None:
+            return user
+        return self.load_user(user_id)
+
+    def load_user(self, user_id: int) -> Optional[UserRecord]:
         cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = cursor.fetchone()
-        if not user:
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE user_id = ?', (user_id,))
+        return self._cache_user(cursor.fetchone())
+
+    def _cache_user(self, row: Optional[tuple]) -> Optional[UserRecord]:
+        # Every user row read back from SQLite refreshes both the cache and the leaderboard.
+        if not row:
             return None
-            
-        return {
-            'user_id': user[0],
-            'username': user[1],
-            'balance': user[2],
-            'games_played': user[3],
-            'wins': user[4],
-            'last_game': user[5],
-            'rating': user[6],
-            'layout_type': user[7],
-            'language': user[8],
-            'is_banned': user[9],
-            'registration_date': user[10],
-            'games_today': user[11],
-            'last_daily_reset': user[12]
-        }
+        user = UserRecord(*row)
+        if self._savepoint_users is not None:
+            self._savepoint_users.add(user.user_id)
+        self.users.put(user)
+        self.leaderboard.update(
+            user.user_id, user.username, user.rating, user.wins, user.games_played, user.is_banned == 1
+        )
+        return user
 
-    def get_top_players(self, limit: int = 10) -> List[Dict]:
+    def set_trace(self, callback: Optional[Callable[[str], None]]):
+        # Called with the SQL of every statement the connection runs; None turns it off.
+        self.conn.set_trace_callback(callback)
+
+    def load_leaderboard(self):
         cursor = self.conn.cursor()
         cursor.execute('''
-        SELECT username, rating, wins, games_played
+        SELECT user_id, username, rating, wins, games_played
         FROM users
         WHERE is_banned = 0
-        ORDER BY rating DESC
-        LIMIT ?
-        ''', (limit,))
-        
+        ''')
+        self.leaderboard.load(cursor)
+
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        return [entry.to_dict() for entry in self.leaderboard.top(limit)]
+
+    def get_rank(self, user_id: int, radius: int = 1) -> List[Dict]:
+        # The player and their neighbours, each with a 'place' key; empty for banned players.
         return [
-            {
-                'username': row[0],
-                'rating': row[1],
-                'wins': row[2],
-                'games_played': row[3]
-            }
-            for row in cursor.fetchall()
+            dict(entry.to_dict(), place=place, user_id=entry.user_id)
+            for place, entry in self.leaderboard.around(user_id, radius)
         ]
 
-    def update_settings(self, user_id: int, layout_type: Optional[str] = None, language: Optional[str] = None):
+    def ledger_history(self, user_id: int, days: int = 30) -> List[Dict]:
+        return user_history(self.conn, user_id, days)
+
+    def get_game_stats(self, user_id: int) -> Dict[str, GameStats]:
+        stats = self.users.game_stats(user_id)
+        if stats is None:
+            stats = read_game_stats(self.conn, user_id)
+            self.users.put_game_stats(user_id, stats)
+        return stats
+
+    def update_settings(self, user_id: int, layout_type: Optional[str] = None,
+                        language: Optional[str] = None) -> Optional[UserRecord]:
         cursor = self.conn.cursor()
-        if layout_type:
-            cursor.execute('UPDATE users SET layout_type = ? WHERE user_id = ?', (layout_type, user_id))
-        if language:
-            cursor.execute('UPDATE users SET language = ? WHERE user_id = ?', (language, user_id))
-        self.conn.commit()
+        cursor.execute(f'''
+        UPDATE users
+        SET layout_type = COALESCE(?, layout_type), language = COALESCE(?, language)
+        WHERE user_id = ?
+        RETURNING {USER_COLUMNS}
+        ''', (layout_type or None, language or None, user_id))
+        user = self._cache_user(cursor.fetchone())
+        self._commit()
+        return user
 
     def update_balance(self, user_id: int, amount: int):
         cursor = self.conn.cursor()
-        cursor.execute('''
+        cursor.execute(f'''
         UPDATE users 
         SET balance = balance + ?
         WHERE user_id = ?
+        RETURNING {USER_COLUMNS}
         ''', (amount, user_id))
-        self.conn.commit()
+        self._cache_user(cursor.fetchone())
+        self._commit()
 
     def update_stats(self, user_id: int, result: str):
         cursor = self.conn.cursor()
@@ -154,7 +210,6 @@ class Database:
         updates.append('games_played = games_played + 1')
         updates.append('last_game = ?')
         params.append(datetime.now())
-        updates.append('games_today = games_today + 1')
 
         if result == 'win':
             updates.append('wins = wins + 1')
@@ -166,52 +221,561 @@ class Database:
         UPDATE users 
         SET {', '.join(updates)}
         WHERE user_id = ?
+        RETURNING {USER_COLUMNS}
         '''
         params.append(user_id)
 
         cursor.execute(query, params)
-        self.conn.commit()
+        self._cache_user(cursor.fetchone())
+        self._commit()
+
+    def place_bet(self, user_id: int, game_type: str, amount: int,
+                  idempotency_key: Optional[str] = None) -> Posting:
+        # Takes the stake of a bet whose outcome comes later (roulette chips, a blackjack
+        # hand) off the balance right away, so the same coins cannot back a second bet
+        # meanwhile; the settlement then only pays out (settle_game with staked=True).
+        # The posting's user is None if the user is unknown or cannot cover the stake.
+        replay = self._replay(user_id, idempotency_key)
+        if replay is not None:
+            return replay
+
+        now = datetime.now()
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+        UPDATE users
+        SET balance = balance - ?
+        WHERE user_id = ? AND balance >= ?
+        RETURNING {USER_COLUMNS}
+        ''', (amount, user_id, amount))
+        row = cursor.fetchone()
+        if not row:
+            self._commit()
+            return Posting(None)
+
+        self.ledger.append(user_id, BET, game_type, amount, 0, idempotency_key=idempotency_key, timestamp=now)
+        self._commit()
+        return Posting(self._cache_user(row))
+
+    def _replay(self, user_id: int, idempotency_key: Optional[str]) -> Optional[Posting]:
+        # A retried write whose key is already posted is not applied again.
+        posted = self.ledger.posted(idempotency_key) if idempotency_key is not None else None
+        if posted is None:
+            return None
+        payout, outcome = posted
+        return Posting(self.get_user(user_id), True, payout, outcome)
+
+    def settle_game(self, user_id: int, game_type: str, bet: int, payout: int, result: str,
+                    idempotency_key: Optional[str] = None, staked: bool = False,
+                    outcome: Optional[str] = None) -> Posting:
+        # Balance, stats, rating and the ledger row change together or not at all.
+        # The posting's user is None if the user is unknown or the balance would go negative.
+        # A settlement retried with an already posted idempotency key is not applied again;
+        # the posting is then marked replayed and carries the stored payout and outcome.
+        # With staked=True the bet was already taken by place_bet and only the payout is credited.
+        replay = self._replay(user_id, idempotency_key)
+        if replay is not None:
+            return replay
+
+        if result == 'win':
+            rating = 'rating + 25'
+        elif result == 'lose':
+            rating = 'MAX(0, rating - 15)'
+        else:
+            rating = 'rating'
+
+        now = datetime.now()
+        delta = payout if staked else payout - bet
+        cursor = self.conn.cursor()
+        # A draw (a pushed blackjack hand) does not count towards games_played.
+        cursor.execute(f'''
+        UPDATE users
+        SET balance = balance + ?,
+            games_played = games_played + ?,
+            wins = wins + ?,
+            rating = {rating},
+            last_game = ?
+        WHERE user_id = ? AND balance + ? >= 0
+        RETURNING {USER_COLUMNS}
+        ''', (delta, 0 if result == 'draw' else 1, 1 if result == 'win' else 0, now, user_id, delta))
+        row = cursor.fetchone()
+        if not row:
+            self._commit()
+            return Posting(None)
+
+        won = 1 if result == 'win' else 0
+        self.ledger.append(user_id, SETTLE, game_type, bet, payout, result, idempotency_key, now, outcome)
+        cursor.execute(SETTLE_UPSERT, (user_id, game_type, won, bet, payout))
+        self._commit()
+        user = self._cache_user(row)
+        # The cached statistics follow the row SETTLE_UPSERT just changed. Entries are
+        # replaced, not mutated, as the event loop may be reading the old one.
+        stats = self.users.game_stats(user_id)
+        if stats is not None and game_type in stats:
+            old = stats[game_type]
+            stats[game_type] = GameStats(
+                game_type, old.games + 1, old.wins + won, old.wagered + bet, old.paid + payout
+            )
+        return Posting(user, payout=payout, outcome=outcome)
+
+    def settle_round(self, game_type: str, settlements: List[tuple], staked: bool = False) -> List[Posting]:
+        # settlements: (user_id, bet, payout, result, idempotency_key) for every player of
+        # a shared round, written as one transaction; one failed player does not undo the rest.
+        results = []
+        with self.batch():
+            for user_id, bet, payout, result, idempotency_key in settlements:
+                try:
+                    with self.savepoint('settlement'):
+                        results.append(
+                            self.settle_game(user_id, game_type, bet, payout, result, idempotency_key, staked)
+                        )
+                except Exception:
+                    logging.exception('Failed to settle %s for user %s', game_type, user_id)
+                    results.append(Posting(None))
+        return results
+
+    def save_sessions(self, game_type: str, sessions: List[tuple]):
+        # sessions: (user_id, state) snapshots of unfinished games, replacing older ones.
+        now = datetime.now()
+        self.conn.executemany(
+            '''INSERT INTO game_sessions (game_type, user_id, state, saved_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (game_type, user_id) DO UPDATE SET state = excluded.state, saved_at = excluded.saved_at''',
+            [(game_type, user_id, state, now) for user_id, state in sessions]
+        )
+        self._commit()
+
+    def session_users(self, game_type: str, shard: int = 0, shards: int = 1) -> List[int]:
+        # Only the users routed to `shard` of `shards` workers (user_id % shards).
+        cursor = self.conn.execute(
+            'SELECT user_id FROM game_sessions WHERE game_type = ? AND user_id % ? = ?', (game_type, shards, shard)
+        )
+        return [row[0] for row in cursor]
+
+    def take_session(self, game_type: str, user_id: int) -> Optional[str]:
+        # The snapshot leaves the table as it is handed back, so a game resumes only once.
+        row = self.conn.execute(
+            'DELETE FROM game_sessions WHERE game_type = ? AND user_id = ? RETURNING state', (game_type, user_id)
+        ).fetchone()
+        self._commit()
+        return row[0] if row else None
+
+    def take_sessions(self, game_type: str, shard: int = 0, shards: int = 1) -> List[tuple]:
+        rows = self.conn.execute(
+            'DELETE FROM game_sessions WHERE game_type = ? AND user_id % ? = ? RETURNING user_id, state',
+            (game_type, shards, shard)
+        ).fetchall()
+        self._commit()
+        return rows
+
+    def drop_session(self, game_type: str, user_id: int):
+        self.conn.execute('DELETE FROM game_sessions WHERE game_type = ? AND user_id = ?', (game_type, user_id))
+        self._commit()
+
+    def record_fair_round(self, round_key: str, game_type: str, user_id: Optional[int], chain: str,
+                          commitment: str, server_seed: str, client_seed: str):
+        self.conn.execute(
+            '''INSERT OR IGNORE INTO fair_rounds
+            (round_key, game_type, user_id, chain, commitment, server_seed, client_seed, created)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (round_key, game_type, user_id, chain, commitment, server_seed, client_seed, datetime.now())
+        )
+        self._commit()
+
+    def fair_chain(self, owner: str, root: bytes, length: int) -> Tuple[bytes, int, int]:
+        # (root, length, used) of a chain of seeds shared by every process, started from
+        # `root` when there is none yet or the current one is spent. The write lock is
+        # taken up front, so two processes finding it spent agree on the new one.
+        with self.batch():
+            row = self.conn.execute('SELECT root, length, used FROM fair_chains WHERE owner = ?', (owner,)).fetchone()
+            if row is None or row[2] >= row[1]:
+                row = (root.hex(), length, 0)
+                self.conn.execute('INSERT OR REPLACE INTO fair_chains (owner, root, length, used) VALUES (?, ?, ?, ?)', (owner, *row))
+        return bytes.fromhex(row[0]), row[1], row[2]
+
+    def spin_roulette_round(self, round_id: int, number: int, fair_round: Optional[tuple] = None,
+                            seed: Optional[Tuple[bytes, int]] = None,
+                            keep_seconds: float = 24 * 3600) -> Tuple[int, Optional[tuple]]:
+        # The first process to close a round decides its number; later callers get that
+        # one back instead of theirs. In provably fair mode `fair_round` holds the
+        # record_fair_round() arguments of the round, recorded with it, and `seed` the
+        # (chain root, index) of its server seed, spent from the 'roulette' chain. Either
+        # way the caller gets the round as recorded. Rounds older than `keep_seconds` are dropped.
+        with self.batch():
+            row = self.conn.execute(
+                'SELECT number FROM roulette_rounds WHERE round_id = ? AND number IS NOT NULL', (round_id,)
+            ).fetchone()
+            if row is not None:
+                number = row[0]
+            else:
+                if seed is not None:
+                    spent = self.conn.execute(
+                        "UPDATE fair_chains SET used = used + 1 WHERE owner = 'roulette' AND root = ? AND used = ?",
+                        (seed[0].hex(), seed[1])
+                    )
+                    if not spent.rowcount:
+                        raise ValueError(f'seed {seed[1]} of the roulette chain is no longer the next one')
+                if fair_round is not None:
+                    self.record_fair_round(*fair_round)
+                self.conn.execute(
+                    '''INSERT INTO roulette_rounds (round_id, number, spun_at) VALUES (?, ?, ?)
+                    ON CONFLICT (round_id) DO UPDATE SET number = excluded.number, spun_at = excluded.spun_at''',
+                    (round_id, number, datetime.now())
+                )
+                self.conn.execute(
+                    'DELETE FROM roulette_rounds WHERE round_id < ?', (round_id - int(keep_seconds * 1000),)
+                )
+            return number, self.get_fair_round(fair_round[0]) if fair_round is not None else None
+
+    def get_fair_round(self, round_key: str) -> Optional[tuple]:
+        # (game_type, round_key, user_id, chain, server_seed, client_seed), FairRound's arguments.
+        return self.conn.execute(
+            '''SELECT game_type, round_key, user_id, chain, server_seed, client_seed
+            FROM fair_rounds WHERE round_key = ?''', (round_key,)
+        ).fetchone()
 
     def ban_user(self, user_id: int, moderator_id: int, reason: str):
         cursor = self.conn.cursor()
-        cursor.execute('UPDATE users SET is_banned = 1 WHERE user_id = ?', (user_id,))
+        cursor.execute(f'UPDATE users SET is_banned = 1 WHERE user_id = ? RETURNING {USER_COLUMNS}', (user_id,))
+        self._cache_user(cursor.fetchone())
         cursor.execute('''
         INSERT INTO moderation_logs (moderator_id, user_id, action, reason, timestamp)
         VALUES (?, ?, ?, ?, ?)
         ''', (moderator_id, user_id, 'ban', reason, datetime.now()))
-        self.conn.commit()
+        self._commit()
 
     def unban_user(self, user_id: int, moderator_id: int, reason: str):
         cursor = self.conn.cursor()
-        cursor.execute('UPDATE users SET is_banned = 0 WHERE user_id = ?', (user_id,))
+        cursor.execute(f'UPDATE users SET is_banned = 0 WHERE user_id = ? RETURNING {USER_COLUMNS}', (user_id,))
+        self._cache_user(cursor.fetchone())
         cursor.execute('''
         INSERT INTO moderation_logs (moderator_id, user_id, action, reason, timestamp)
         VALUES (?, ?, ?, ?, ?)
         ''', (moderator_id, user_id, 'unban', reason, datetime.now()))
-        self.conn.commit()
+        self._commit()
+
+    # games_today is kept by DailyLimiter in memory; the column holds its last saved value
+    # and last_daily_reset the day that value belongs to.
+    def load_daily_games(self, day_start: datetime, shard: int = 0, shards: int = 1) -> List[tuple]:
+        self.reset_daily_games(day_start)
+        cursor = self.conn.execute(
+            'SELECT user_id, games_today FROM users WHERE games_today > 0 AND user_id % ? = ?', (shards, shard)
+        )
+        return cursor.fetchall()
+
+    def save_daily_games(self, counts: List[tuple], day_start: datetime):
+        # counts: (user_id, games today)
+        self.conn.executemany(
+            'UPDATE users SET games_today = ?, last_daily_reset = ? WHERE user_id = ?',
+            [(games, day_start, user_id) for user_id, games in counts]
+        )
+        self._commit()
+
+    def reset_daily_games(self, day_start: datetime):
+        # One statement for every player at the day boundary: counters of earlier days go to zero.
+        self.conn.execute('''
+        UPDATE users
+        SET games_today = 0, last_daily_reset = ?
+        WHERE games_today > 0 AND (last_daily_reset IS NULL OR last_daily_reset < ?)
+        ''', (day_start, day_start))
+        self._commit()
+
+def _resolve_all(results: list):
+    for future, result, error in results:
+        if future.cancelled():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class AsyncDatabase:
+    # Every call is executed by a single thread that owns the sqlite connection,
+    # so coroutines only wait on a future and never block the event loop on disk I/O.
+    #
+    # With group_commit_window set, calls arriving within the window (or until
+    # group_commit_max calls are queued) run in one transaction, and their callers
+    # are released only after that transaction is committed.
+    def __init__(self, path: str = 'casino.db', group_commit_window: Optional[float] = None,
+                 group_commit_max: int = 128, user_cache: Optional[UserCache] = None, daily_limit: int = 100):
+        self.path = path
+        self.daily = DailyLimiter(daily_limit, on_rollover=lambda day_start: self._submit('reset_daily_games', day_start))
+        self.group_commit_window = group_commit_window
+        self.group_commit_max = group_commit_max
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._started = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._db: Optional[Database] = None
+        # Start of the last leaderboard read; the Database loads it in full on startup.
+        self._leaderboard_since = datetime.now()
+        self._thread = threading.Thread(target=self._run, args=(path, user_cache), name='db-writer', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    def _collect(self) -> list:
+        items = [self._queue.get()]
+        if self.group_commit_window:
+            deadline = time.monotonic() + self.group_commit_window
+            while items[-1] is not None and len(items) < self.group_commit_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        # Whatever queued up while the previous batch was running goes in as well.
+        while items[-1] is not None and len(items) < self.group_commit_max:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _execute(self, items: list, group: bool) -> list:
+        results = []
+        for method, args, kwargs, loop, future in items:
+            try:
+                if group:
+                    with self._db.savepoint():
+                        result = getattr(self._db, method)(*args, **kwargs)
+                else:
+                    result = getattr(self._db, method)(*args, **kwargs)
+            except Exception as e:
+                results.append((loop, future, None, e))
+            else:
+                results.append((loop, future, result, None))
+        return results
+
+    def _run(self, path: str, user_cache: Optional[UserCache]):
+        try:
+            self._db = Database(path, user_cache)
+        except Exception as e:
+            self._startup_error = e
+            self._started.set()
+            return
+        self._started.set()
+
+        running = True
+        while running:
+            items = self._collect()
+            if items[-1] is None:
+                running = False
+                items.pop()
+            if not items:
+                continue
+
+            if self.group_commit_window is None:
+                results = self._execute(items, group=False)
+            else:
+                try:
+                    with self._db.batch():
+                        results = self._execute(items, group=True)
+                except Exception as e:
+                    # Records cached by the rolled back calls were never committed.
+                    self._db.users.clear()
+                    try:
+                        self._db.load_leaderboard()
+                    except Exception:
+                        logging.exception('Failed to reload the leaderboard after a rolled back batch')
+                    results = [(loop, future, None, e) for _, _, _, loop, future in items]
+
+            # Wake each waiting loop once per batch instead of once per call.
+            done: Dict[asyncio.AbstractEventLoop, list] = {}
+            for loop, future, result, error in results:
+                if future is None:
+                    if error is not None:
+                        logging.error('Submitted database call failed: %r', error)
+                    continue
+                done.setdefault(loop, []).append((future, result, error))
+            for loop, resolved in done.items():
+                loop.call_soon_threadsafe(_resolve_all, resolved)
+
+        self._db.conn.close()
+
+    def _submit(self, method: str, *args, **kwargs):
+        self._queue.put((method, args, kwargs, None, None))
+
+    async def _call(self, method: str, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((method, args, kwargs, loop, future))
+        return await future
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def is_valid_username(self, username: str) -> bool:
+        return self._db.is_valid_username(username)
+
+    async def set_trace(self, callback: Optional[Callable[[str], None]]):
+        # The callback runs on the writer thread.
+        return await self._call('set_trace', callback)
+
+    async def register_user(self, user_id: int, username: str) -> bool:
+        return await self._call('register_user', user_id, username)
+
+    async def is_registered(self, user_id: int) -> bool:
+        return await self.get_user(user_id) is not None
+
+    async def is_banned(self, user_id: int) -> bool:
+        user = await self.get_user(user_id)
+        return bool(user and user.is_banned == 1)
+
+    async def get_user(self, user_id: int) -> Optional[UserRecord]:
+        # Cache hits are served on the event loop without a round trip to the writer thread.
+        user = self._db.users.get(user_id)
+        if user is not None:
+            return user
+        return await self._call('load_user', user_id)
+
+    # The leaderboard lives in memory and is safe to read from the event loop.
+    async def get_top_players(self, limit: int = 10) -> List[Dict]:
+        return self._db.get_top_players(limit)
+
+    async def get_rank(self, user_id: int, radius: int = 1) -> List[Dict]:
+        return self._db.get_rank(user_id, radius)
+
+    async def count_ranked_players(self) -> int:
+        return len(self._db.leaderboard)
+
+    # A row is stamped before its transaction commits, which may wait up to busy_timeout
+    # for the lock: look back this far so the next refresh still sees it.
+    LEADERBOARD_LOOKBACK = timedelta(seconds=10)
+
+    async def refresh_leaderboard(self, shard: int = 0, shards: int = 1) -> int:
+        # Takes in the players other processes changed since the previous refresh. Read on a
+        # connection of its own in a worker thread, so the writer queue never waits on it.
+        # Returns the number of players updated.
+        return await asyncio.to_thread(self._refresh_leaderboard, shard, shards)
+
+    def _refresh_leaderboard(self, shard: int, shards: int) -> int:
+        started = datetime.now()
+        since = self._leaderboard_since - self.LEADERBOARD_LOOKBACK
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            # Games and registrations of this shard's players only ever go through this
+            # process, whose leaderboard already has them (possibly newer than a read here).
+            rows = [row for row in conn.execute(
+                '''SELECT user_id, username, rating, wins, games_played, is_banned FROM users
+                WHERE last_game > ? OR registration_date > ?''', (since, since)
+            ) if row[0] % shards != shard]
+            # A ban may come from a moderator on any process.
+            rows += conn.execute(
+                '''SELECT user_id, username, rating, wins, games_played, is_banned FROM users
+                WHERE user_id IN (SELECT user_id FROM moderation_logs WHERE timestamp > ?)''', (since,)
+            ).fetchall()
+        finally:
+            conn.close()
+        for user_id, username, rating, wins, games_played, is_banned in rows:
+            self._db.leaderboard.update(user_id, username, rating, wins, games_played, is_banned == 1)
+        self._leaderboard_since = started
+        return len(rows)
+
+    async def ledger_history(self, user_id: int, days: int = 30) -> List[Dict]:
+        return await self._call('ledger_history', user_id, days)
+
+    async def get_game_stats(self, user_id: int) -> Dict[str, GameStats]:
+        # Cached next to the user record, so the profile screen usually needs no round trip.
+        stats = self._db.users.game_stats(user_id)
+        if stats is not None:
+            return stats
+        return await self._call('get_game_stats', user_id)
+
+    def archive_ledger(self, archive_dir: str, live_months: int = 1) -> Dict[str, int]:
+        # Blocking, on the caller's thread with its own connection: each archived day is a
+        # short transaction of its own, so the writer thread keeps committing in between.
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            return archive_closed_months(conn, archive_dir, live_months)
+        finally:
+            conn.close()
+
+    async def update_settings(self, user_id: int, layout_type: Optional[str] = None,
+                              language: Optional[str] = None) -> Optional[UserRecord]:
+        return await self._call('update_settings', user_id, layout_type=layout_type, language=language)
+
+    async def update_balance(self, user_id: int, amount: int):
+        return await self._call('update_balance', user_id, amount)
+
+    async def update_stats(self, user_id: int, result: str):
+        await self._call('update_stats', user_id, result)
+        self.daily.played(user_id)
+
+    async def place_bet(self, user_id: int, game_type: str, amount: int,
+                        idempotency_key: Optional[str] = None) -> Posting:
+        return await self._call('place_bet', user_id, game_type, amount, idempotency_key=idempotency_key)
+
+    async def settle_game(self, user_id: int, game_type: str, bet: int, payout: int, result: str,
+                          idempotency_key: Optional[str] = None, staked: bool = False,
+                          outcome: Optional[str] = None) -> Posting:
+        posting = await self._call('settle_game', user_id, game_type, bet, payout, result,
+                                   idempotency_key=idempotency_key, staked=staked, outcome=outcome)
+        # A replayed settlement was counted when it was first applied. A draw does not
+        # count, as it does not count towards games_played either.
+        if posting.user is not None and not posting.replayed and result != 'draw':
+            self.daily.played(user_id)
+        return posting
+
+    async def settle_round(self, game_type: str, settlements: List[tuple], staked: bool = False) -> List[Posting]:
+        postings = await self._call('settle_round', game_type, settlements, staked=staked)
+        for (user_id, _, _, result, _), posting in zip(settlements, postings):
+            if posting.user is not None and not posting.replayed and result != 'draw':
+                self.daily.played(user_id)
+        return postings
+
+    async def check_daily_limit(self, user_id: int) -> bool:
+        # Answered from memory, no database round trip.
+        return self.daily.allowed(user_id)
+
+    async def load_daily_games(self, shard: int = 0, shards: int = 1):
+        self.daily.load(await self._call('load_daily_games', self.daily.day_start, shard, shards))
+
+    def flush_daily_games(self):
+        # Fire and forget: the counters changed since the last flush, written with the next batch.
+        counts = self.daily.take_dirty()
+        if counts:
+            self._submit('save_daily_games', counts, self.daily.day_start)
+
+    def save_sessions(self, game_type: str, sessions: List[tuple]):
+        # Fire and forget: written with the next batch and nobody waits for it; close()
+        # still drains it to disk.
+        self._submit('save_sessions', game_type, sessions)
+
+    async def session_users(self, game_type: str, shard: int = 0, shards: int = 1) -> List[int]:
+        return await self._call('session_users', game_type, shard, shards)
+
+    async def take_session(self, game_type: str, user_id: int) -> Optional[str]:
+        return await self._call('take_session', game_type, user_id)
+
+    async def take_sessions(self, game_type: str, shard: int = 0, shards: int = 1) -> List[tuple]:
+        return await self._call('take_sessions', game_type, shard, shards)
+
+    def drop_session(self, game_type: str, user_id: int):
+        self._submit('drop_session', game_type, user_id)
+
+    def record_fair_round(self, round_key: str, game_type: str, user_id: Optional[int], chain: str,
+                          commitment: str, server_seed: str, client_seed: str):
+        # Fire and forget, like save_sessions.
+        self._submit('record_fair_round', round_key, game_type, user_id, chain, commitment, server_seed, client_seed)
+
+    async def fair_chain(self, owner: str, root: bytes, length: int) -> Tuple[bytes, int, int]:
+        return await self._call('fair_chain', owner, root, length)
+
+    async def spin_roulette_round(self, round_id: int, number: int, fair_round: Optional[tuple] = None,
+                                  seed: Optional[Tuple[bytes, int]] = None) -> Tuple[int, Optional[tuple]]:
+        return await self._call('spin_roulette_round', round_id, number, fair_round, seed)
+
+    async def get_fair_round(self, round_key: str) -> Optional[tuple]:
+        return await self._call('get_fair_round', round_key)
+
+    async def ban_user(self, user_id: int, moderator_id: int, reason: str):
+        return await self._call('ban_user', user_id, moderator_id, reason)
+
+    async def unban_user(self, user_id: int, moderator_id: int, reason: str):
+        return await self._call('unban_user', user_id, moderator_id, reason)
 
-    def check_daily_limit(self, user_id: int) -> bool:
-        cursor = self.conn.cursor()
-        cursor.execute('''
-        SELECT games_today, last_daily_reset
-        FROM users
-        WHERE user_id = ?
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        if not result:
-            return False
-            
-        games_today, last_reset = result
-        
-        now = datetime.now()
-        if last_reset and (now - datetime.fromisoformat(last_reset)).days >= 1:
-            cursor.execute('''
-            UPDATE users
-            SET games_today = 0, last_daily_reset = ?
-            WHERE user_id = ?
-            ''', (now, user_id))
-            self.conn.commit()
-            return True
-            
-        return games_today < 100
\ No newline at end of file
@@ -0,0 +1,390 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from random import Random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# float in [0, 1) from 53 random bits, as random.Random builds it
+RECIP_BPF = 2 ** -53
+
+
+def commit(seed: bytes) -> str:
+    # Not the plain SHA-256: that is the seed revealed before it in the chain, so it
+    # would commit to nothing the chain does not already.
+    return hmac.new(seed, b'commitment', hashlib.sha256).hexdigest()
+
+
+class ByteStream(Random):
+    # random.Random fed from a byte buffer that `_refill()` tops up in bulk, so a draw
+    # is a slice of the buffer; every method built on getrandbits() or random()
+    # (choice, randrange, shuffle, ...) follows. There is no seed or state to restore.
+    def __init__(self):
+        self._buffer = b''
+        self._position = 0
+        super().__init__()
+
+    def _refill(self) -> bytes:
+        raise NotImplementedError
+
+    def _take(self, n: int) -> bytes:
+        position = self._position
+        if position + n > len(self._buffer):
+            # Leftover bytes are dropped rather than stitched to the next buffer.
+            self._buffer = self._refill()
+            position = 0
+            while n > len(self._buffer):
+                self._buffer += self._refill()
+        self._position = position + n
+        return self._buffer[position:position + n]
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 8:
+            if k < 0:
+                raise ValueError('number of bits must be non-negative')
+            if not k:
+                return 0
+            # randrange() and shuffle() over small ranges mostly end up here: one byte.
+            position = self._position
+            if position >= len(self._buffer):
+                self._buffer = self._refill()
+                position = 0
+            self._position = position + 1
+            return self._buffer[position] >> (8 - k)
+        n = (k + 7) // 8
+        return int.from_bytes(self._take(n), 'little') >> (n * 8 - k)
+
+    def _randbelow(self, n: int) -> int:
+        # Rejection sampling like random.Random's. Ranges of up to 256 (a reel, the wheel,
+        # most steps of a shuffle) take one byte of the buffer per try, read in place.
+        k = n.bit_length()
+        if k > 8:
+            r = self.getrandbits(k)
+            while r >= n:
+                r = self.getrandbits(k)
+            return r
+        shift = 8 - k
+        buffer, position = self._buffer, self._position
+        while True:
+            if position >= len(buffer):
+                buffer = self._buffer = self._refill()
+                position = 0
+            r = buffer[position] >> shift
+            position += 1
+            if r < n:
+                self._position = position
+                return r
+
+    def random(self) -> float:
+        return (int.from_bytes(self._take(7), 'little') >> 3) * RECIP_BPF
+
+    def randbytes(self, n: int) -> bytes:
+        return self._take(n)
+
+    def seed(self, *args, **kwargs):
+        pass
+
+    def getstate(self):
+        raise NotImplementedError(f'{type(self).__name__} has no state to save')
+
+    def setstate(self, state):
+        raise NotImplementedError(f'{type(self).__name__} has no state to restore')
+
+
+class EntropyPool(ByteStream):
+    # The bot's one source of randomness: `size` bytes from the OS CSPRNG per refill
+    # instead of a syscall per draw. While a provably fair round is in use(), draws come
+    # from that round's stream instead, so the games need no changes to take part.
+    def __init__(self, size: int = 64 * 1024):
+        self.size = size
+        self.refills = 0
+        self._round: Optional[Random] = None
+        super().__init__()
+        # A forked child must not hand out the same bytes as its parent.
+        os.register_at_fork(after_in_child=self._discard)
+
+    def _discard(self):
+        self._buffer = b''
+        self._position = 0
+
+    def _refill(self) -> bytes:
+        self.refills += 1
+        return os.urandom(self.size)
+
+    def getrandbits(self, k: int) -> int:
+        if self._round is not None:
+            return self._round.getrandbits(k)
+        return super().getrandbits(k)
+
+    def _randbelow(self, n: int) -> int:
+        if self._round is not None:
+            return self._round._randbelow(n)
+        return ByteStream._randbelow(self, n)
+
+    def random(self) -> float:
+        if self._round is not None:
+            return self._round.random()
+        return super().random()
+
+    def randbytes(self, n: int) -> bytes:
+        if self._round is not None:
+            return self._round.randbytes(n)
+        return super().randbytes(n)
+
+    @contextmanager
+    def diverted(self, stream: Random) -> Iterator[Random]:
+        previous, self._round = self._round, stream
+        try:
+            yield stream
+        finally:
+            self._round = previous
+
+    def format_stats(self) -> str:
+        return f'{self.refills} refills of {self.size} bytes'
+
+
+class FairRandom(ByteStream):
+    # Deterministic stream of a provably fair round: block i is
+    # HMAC-SHA512(key=server seed, msg='<client seed>:<i>'), so anyone holding the
+    # revealed seed can replay the round, e.g. SlotMachine(FairRandom(seed, client)).spin(bet).
+    def __init__(self, server_seed: bytes, client_seed: str):
+        self.server_seed = server_seed
+        self.client_seed = client_seed
+        self._block = 0
+        super().__init__()
+
+    def _refill(self) -> bytes:
+        block = hmac.new(self.server_seed, f'{self.client_seed}:{self._block}'.encode(), hashlib.sha512).digest()
+        self._block += 1
+        return block
+
+
+class SeedChain:
+    # `length` server seeds, seed i being SHA-256 applied length - 1 - i times to a random
+    # root, so every seed hashes to the one before it and `anchor`, the hash of seed 0,
+    # commits to the whole chain once published. Seeds are handed out in order; `used`
+    # counts those handed out. Every STEP-th seed is kept, so seed() needs at most
+    # STEP - 1 hashes and the chain only needs its root and `used` to be restored.
+    STEP = 32
+    __slots__ = ('root', 'length', 'used', 'anchor', '_marks')
+
+    def __init__(self, root: bytes, length: int, used: int = 0):
+        self.root = root
+        self.length = length
+        self.used = used
+        # _marks[k] is seed min(k * STEP + STEP - 1, length - 1).
+        self._marks: List[bytes] = [b''] * ((length + self.STEP - 1) // self.STEP)
+        seed = root
+        for index in range(length - 1, -1, -1):
+            if index % self.STEP == self.STEP - 1 or index == length - 1:
+                self._marks[index // self.STEP] = seed
+            if index:
+                seed = hashlib.sha256(seed).digest()
+        self.anchor = hashlib.sha256(seed).hexdigest()
+
+    @classmethod
+    def generate(cls, pool: Random, length: int) -> 'SeedChain':
+        return cls(pool.randbytes(32), length)
+
+    def __len__(self) -> int:
+        return self.length - self.used
+
+    def seed(self, index: int) -> bytes:
+        mark = index // self.STEP
+        seed = self._marks[mark]
+        for _ in range(min(mark * self.STEP + self.STEP - 1, self.length - 1) - index):
+            seed = hashlib.sha256(seed).digest()
+        return seed
+
+    def snapshot(self) -> Dict:
+        return {'root': self.root.hex(), 'length': self.length, 'used': self.used}
+
+    @classmethod
+    def restore(cls, state: Dict) -> 'SeedChain':
+        return cls(bytes.fromhex(state['root']), state['length'], state['used'])
+
+
+class FairRound:
+    __slots__ = ('game_type', 'key', 'user_id', 'chain', 'server_seed', 'client_seed')
+
+    def __init__(self, game_type: str, key: str, user_id: Optional[int], chain: str, server_seed: str,
+                 client_seed: str):
+        self.game_type = game_type
+        # The ledger idempotency key of the bet or settlement the round decided.
+        self.key = key
+        self.user_id = user_id
+        self.chain = chain
+        self.server_seed = server_seed
+        self.client_seed = client_seed
+
+    @property
+    def commitment(self) -> str:
+        return commit(bytes.fromhex(self.server_seed))
+
+    def stream(self) -> FairRandom:
+        return FairRandom(bytes.fromhex(self.server_seed), self.client_seed)
+
+    def snapshot(self) -> Dict:
+        return {'game_type': self.game_type, 'key': self.key, 'user_id': self.user_id, 'chain': self.chain,
+                'server_seed': self.server_seed, 'client_seed': self.client_seed}
+
+    @classmethod
+    def restore(cls, state: Dict) -> 'FairRound':
+        return cls(**state)
+
+
+# Who a chain of seeds belongs to: (game type, user id), the shared roulette table being
+# ('roulette', 0). A player's games each get their own chain, so revealing a slots seed
+# says nothing about the seed of a blackjack hand still in play.
+Owner = Tuple[str, int]
+
+
+class ProvablyFair:
+    # Gives every owner its own chain of seeds: commitment() publishes the hash of the
+    # owner's next seed before its round and open() spends it. Seeds of a chain are spent
+    # and revealed strictly in order, and a revealed seed only exposes the earlier, already
+    # revealed seeds of the same chain. A spent chain is replaced by a new one with a new
+    # anchor. Beyond `max_chains` owners the least recently used chain is dropped, and its
+    # owner starts a new one. `on_open` sees every round as it is played, which is where
+    # the bot writes it down. Disabled, commitment() and open() return None and use()
+    # does nothing.
+    def __init__(self, pool: EntropyPool, chain_length: int = 1000, enabled: bool = True,
+                 max_chains: int = 10000, on_open: Optional[Callable[[FairRound], None]] = None):
+        self.pool = pool
+        self.chain_length = chain_length
+        self.enabled = enabled
+        self.max_chains = max_chains
+        self.on_open = on_open
+        self._chains: 'OrderedDict[Owner, SeedChain]' = OrderedDict()
+        self.chains = 0
+        self.rounds = 0
+        self.dropped = 0
+
+    def new_chain(self) -> SeedChain:
+        self.chains += 1
+        return SeedChain.generate(self.pool, self.chain_length)
+
+    def _hold(self, owner: Owner, chain: SeedChain) -> SeedChain:
+        self._chains[owner] = chain
+        self._chains.move_to_end(owner)
+        if len(self._chains) > self.max_chains:
+            self._chains.popitem(last=False)
+            self.dropped += 1
+        return chain
+
+    def chain(self, owner: Owner) -> SeedChain:
+        chain = self._chains.get(owner)
+        if chain is not None and len(chain):
+            self._chains.move_to_end(owner)
+            return chain
+        return self._hold(owner, self.new_chain())
+
+    def adopt(self, owner: Owner, root: bytes, length: int, used: int) -> SeedChain:
+        # Follows a chain kept elsewhere, like the roulette table's in the database, of
+        # which other processes may have spent seeds since.
+        chain = self._chains.get(owner)
+        if chain is None or chain.root != root:
+            self.chains += 1
+            chain = SeedChain(root, length)
+        chain.used = used
+        return self._hold(owner, chain)
+
+    def anchor(self, owner: Owner) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return self.chain(owner).anchor
+
+    def commitment(self, owner: Owner) -> Optional[str]:
+        if not self.enabled:
+            return None
+        chain = self.chain(owner)
+        return commit(chain.seed(chain.used))
+
+    def open(self, owner: Owner, key: str, client_seed: str, user_id: Optional[int] = None) -> Optional[FairRound]:
+        # Spends the owner's next seed; the next commitment() shows the one after it.
+        if not self.enabled:
+            return None
+        chain = self.chain(owner)
+        seed = chain.seed(chain.used)
+        chain.used += 1
+        self.rounds += 1
+        fair_round = FairRound(owner[0], key, user_id, chain.anchor, seed.hex(), client_seed)
+        if self.on_open is not None:
+            self.on_open(fair_round)
+        return fair_round
+
+    def release(self, owner: Owner, fair_round: Optional[FairRound]):
+        # Gives back the seed of a round that was opened but never shown, e.g. for a
+        # redelivered update that had already been settled: it stays the owner's next one.
+        chain = self._chains.get(owner)
+        if fair_round is None or chain is None or chain.anchor != fair_round.chain or not chain.used:
+            return
+        if chain.seed(chain.used - 1).hex() == fair_round.server_seed:
+            chain.used -= 1
+            self.rounds -= 1
+
+    def use(self, fair_round: Optional[FairRound]):
+        # Draws the games make inside the block come from the round's stream.
+        if fair_round is None:
+            return nullcontext()
+        return self.pool.diverted(fair_round.stream())
+
+    def snapshot(self, game_type: str) -> List[Tuple[int, str]]:
+        # (user id, state) of the chains of one game, to carry published hashes over a restart.
+        return [(user_id, json.dumps(chain.snapshot()))
+                for (owner_game, user_id), chain in self._chains.items() if owner_game == game_type]
+
+    def restore(self, game_type: str, rows: Iterable[Tuple[int, str]]):
+        for user_id, state in rows:
+            self._chains[(game_type, user_id)] = SeedChain.restore(json.loads(state))
+
+    def format_stats(self) -> str:
+        if not self.enabled:
+            return f'off, {self.pool.format_stats()}'
+        return (f'{self.rounds} rounds, {self.chains} chains started, {len(self._chains)} held, '
+                f'{self.dropped} dropped, {self.pool.format_stats()}')
+
+
+def verify(server_seed: str, commitment: str, previous_seed: Optional[str] = None) -> bool:
+    # The seed matches the hash published before its round and, given the seed revealed
+    # before it in the same chain (or the chain's anchor), hashes to that one.
+    seed = bytes.fromhex(server_seed)
+    if not hmac.compare_digest(commit(seed), commitment.lower()):
+        return False
+    return previous_seed is None or hashlib.sha256(seed).hexdigest() == previous_seed.lower()
+
+
+def replay(game_type: str, server_seed: str, client_seed: str, decks: int = 6) -> str:
+    # What the round's seeds produce with the bot's own game code.
+    rng = FairRandom(bytes.fromhex(server_seed), client_seed)
+    if game_type == 'slots':
+        from games.slots import SlotMachine
+        symbols, _ = SlotMachine(rng).spin(0)
+        return ' '.join(s.emoji for s in symbols)
+    if game_type == 'roulette':
+        from games.roulette import RouletteTable
+        table = RouletteTable()
+        table.roulette.rng = rng
+        return str(table.spin().number)
+    if game_type == 'blackjack':
+        from games.blackjack import CARD_TEXT, Shoe
+        # A fresh shoe per hand: the player's two cards, the dealer's two, then the draws.
+        return ' '.join(CARD_TEXT[card] for card in Shoe(decks, rng=rng).cards[:12])
+    raise ValueError(f"Unknown game '{game_type}'")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a provably fair round and replay its outcome')
+    parser.add_argument('game', choices=['slots', 'roulette', 'blackjack'])
+    parser.add_argument('server_seed', help='revealed server seed, hex')
+    parser.add_argument('client_seed')
+    parser.add_argument('--commitment', help='hash published before the round, hex')
+    parser.add_argument('--previous', help='seed revealed before this one in the chain, or its anchor, hex')
+    parser.add_argument('--decks', type=int, default=6)
+    args = parser.parse_args()
+    if args.commitment is not None:
+        print('seed verified' if verify(args.server_seed, args.commitment, args.previous) else 'SEED DOES NOT MATCH')
+    print(replay(args.game, args.server_seed, args.client_seed, args.decks))
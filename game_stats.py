@@ -0,0 +1,116 @@
+import argparse
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+
+GAME_TYPES = ('slots', 'roulette', 'blackjack')
+
+
+class GameStats:
+    __slots__ = ('game_type', 'games', 'wins', 'wagered', 'paid')
+
+    def __init__(self, game_type: str, games: int = 0, wins: int = 0, wagered: int = 0, paid: int = 0):
+        self.game_type = game_type
+        self.games = games
+        self.wins = wins
+        self.wagered = wagered
+        self.paid = paid
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def net(self) -> int:
+        return self.paid - self.wagered
+
+    @property
+    def rtp(self) -> float:
+        # Realized return to player: share of the wagered coins paid back.
+        return self.paid / self.wagered if self.wagered else 0.0
+
+
+# Applied by Database.settle_game in the settlement's own transaction.
+SETTLE_UPSERT = '''
+INSERT INTO user_game_stats (user_id, game_type, games, wins, wagered, paid)
+VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (user_id, game_type) DO UPDATE SET
+    games = games + 1,
+    wins = wins + excluded.wins,
+    wagered = wagered + excluded.wagered,
+    paid = paid + excluded.paid
+'''
+
+
+def read_game_stats(conn: sqlite3.Connection, user_id: int) -> Dict[str, GameStats]:
+    # One primary key range read: at most one row per game type.
+    stats = {game_type: GameStats(game_type) for game_type in GAME_TYPES}
+    cursor = conn.execute(
+        'SELECT game_type, games, wins, wagered, paid FROM user_game_stats WHERE user_id = ?', (user_id,)
+    )
+    for row in cursor:
+        stats[row[0]] = GameStats(*row)
+    return stats
+
+
+def _ledger_rows(conn: sqlite3.Connection, chunk: int) -> Iterator[Tuple[int, str, int, int, int, int]]:
+    # (user_id, game_type, games, wins, wagered, paid): rolled up days first, then
+    # every settlement still in the live partition, fetched `chunk` rows at a time.
+    queries = (
+        'SELECT user_id, game_type, games, wins, wagered, paid FROM ledger_daily',
+        '''SELECT user_id, game_type, 1, COALESCE(result = 'win', 0), bet_amount, win_amount
+        FROM transactions WHERE entry_type = 'settle' ''',
+    )
+    for query in queries:
+        cursor = conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            yield from rows
+
+
+def _fold(rows: Iterable[Tuple[int, str, int, int, int, int]]) -> Dict[Tuple[int, str], list]:
+    totals: Dict[Tuple[int, str], list] = {}
+    for user_id, game_type, games, wins, wagered, paid in rows:
+        total = totals.get((user_id, game_type))
+        if total is None:
+            totals[(user_id, game_type)] = [games, wins, wagered, paid]
+        else:
+            total[0] += games
+            total[1] += wins
+            total[2] += wagered
+            total[3] += paid
+    return totals
+
+
+def rebuild_game_stats(conn: sqlite3.Connection, chunk: int = 10000) -> int:
+    # Recomputes user_game_stats from the ledger. The scan streams rows and keeps only
+    # one running total per (user, game); the write lock is held throughout so no
+    # settlement can slip in between the scan and the swap. Returns the rows written.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        totals = _fold(_ledger_rows(conn, chunk))
+        conn.execute('DELETE FROM user_game_stats')
+        conn.executemany(
+            'INSERT INTO user_game_stats (user_id, game_type, games, wins, wagered, paid) VALUES (?, ?, ?, ?, ?, ?)',
+            ((user_id, game_type, *total) for (user_id, game_type), total in totals.items())
+        )
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return len(totals)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild per-user game statistics from the ledger')
+    parser.add_argument('path', nargs='?', default='casino.db')
+    parser.add_argument('--chunk', type=int, default=10000, help='ledger rows fetched per round trip')
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.path, timeout=30)
+    started = time.perf_counter()
+    written = rebuild_game_stats(connection, args.chunk)
+    print(f'rebuilt {written} user/game rows in {time.perf_counter() - started:.1f} s')
+    connection.close()
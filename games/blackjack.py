@@ -1,105 +1,247 @@
 import random
-from typing import List, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, MutableMapping, Optional
 
-class Card:
-    def __init__(self, suit: str, rank: str):
-        self.suit = suit
-        self.rank = rank
+# A card is an int 0..51: rank = card % 13 (2..10, J, Q, K, A), suit = card // 13.
+SUITS = ['♠️', '♥️', '♣️', '♦️']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+ACE = 12
 
-    def __str__(self):
-        return f"{self.rank}{self.suit}"
+CARD_TEXT = [rank + suit for suit in SUITS for rank in RANKS]
+# Aces count 11 here and drop to 1 in Hand when the total would bust.
+CARD_VALUE = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11] * 4
+HIDDEN = '🂠'
+
+
+@dataclass(frozen=True)
+class Rules:
+    # Coins returned per coin bet (stake included) for a two-card 21 and for a won hand.
+    natural_pays: int = 3
+    win_pays: int = 2
+    dealer_hits_soft_17: bool = False
+
+    def dealer_draws(self, total: int, soft: bool) -> bool:
+        return total < 17 or (self.dealer_hits_soft_17 and total == 17 and soft)
+
+
+class Shoe:
+    # `decks` shuffled decks dealt in order. Once `penetration` of the shoe has been
+    # dealt, the next round starts with a reshuffle.
+    def __init__(self, decks: int = 6, penetration: float = 0.75, rng: Optional[random.Random] = None):
+        self.validate(decks, penetration)
+        self.decks = decks
+        self.penetration = penetration
+        self.rng = rng or random.Random()
+        self.shuffles = 0
+        self.reshuffle()
+
+    def reshuffle(self, in_play: Iterable[int] = ()):
+        # One byte per card. Cards still on the table in an unfinished hand stay out
+        # until the next shuffle.
+        cards = bytearray(range(52)) * self.decks
+        for card in in_play:
+            cards.remove(card)
+        self.rng.shuffle(cards)
+        self.cards = cards
+        self.position = 0
+        self.cut = int(len(cards) * self.penetration)
+        self.shuffles += 1
+
+    @staticmethod
+    def validate(decks: int, penetration: float):
+        if not 1 <= decks <= 8:
+            raise ValueError(f"A shoe holds 1 to 8 decks, not {decks}")
+        if not 0 < penetration <= 1:
+            raise ValueError(f"Penetration must be in (0, 1], not {penetration}")
+
+    @property
+    def needs_shuffle(self) -> bool:
+        return self.position >= self.cut
+
+    @property
+    def remaining(self) -> int:
+        return len(self.cards) - self.position
+
+    def draw(self) -> int:
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+
+class Hand:
+    # Running total with aces counted as 11 while that does not bust (`soft_aces`),
+    # updated per card; `text` is extended instead of re-rendering every card.
+    __slots__ = ('cards', 'total', 'soft_aces', 'text')
 
-class Blackjack:
     def __init__(self):
-        self.suits = ['♠️', '♥️', '♣️', '♦️']
-        self.ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        self.deck = [Card(suit, rank) for suit in self.suits for rank in self.ranks]
-        self.reset_game()
-
-    def reset_game(self):
-        random.shuffle(self.deck)
-        self.player_hands: dict[int, List[Card]] = {}
-        self.dealer_hand: List[Card] = []
-        self.game_state: dict[int, str] = {}
-        self.bets: dict[int, int] = {}
-
-    def start_game(self, user_id: int, bet: int) -> Tuple[List[str], List[str], bool, int]:
-        self.player_hands[user_id] = [self.deck.pop(), self.deck.pop()]
-        self.dealer_hand = [self.deck.pop(), self.deck.pop()]
-        self.game_state[user_id] = 'playing'
-        self.bets[user_id] = bet
-        
-        player_value = self.calculate_hand(self.player_hands[user_id])
-        is_blackjack = player_value == 21
-        win_amount = bet * 3 if is_blackjack else 0
-        
-        return (
-            [str(card) for card in self.player_hands[user_id]],
-            [str(self.dealer_hand[0]), '🂠'],
-            is_blackjack,
-            win_amount
-        )
-
-    def calculate_hand(self, hand: List[Card]) -> int:
-        value = 0
-        aces = 0
-        
-        for card in hand:
-            if card.rank in ['J', 'Q', 'K']:
-                value += 10
-            elif card.rank == 'A':
-                aces += 1
-            else:
-                value += int(card.rank)
-        
-        for _ in range(aces):
-            if value + 11 <= 21:
-                value += 11
+        self.cards: List[int] = []
+        self.total = 0
+        self.soft_aces = 0
+        self.text = ''
+
+    def add(self, card: int) -> int:
+        self.cards.append(card)
+        self.total += CARD_VALUE[card]
+        if card % 13 == ACE:
+            self.soft_aces += 1
+        while self.total > 21 and self.soft_aces:
+            self.total -= 10
+            self.soft_aces -= 1
+        self.text = f"{self.text} {CARD_TEXT[card]}" if self.text else CARD_TEXT[card]
+        return self.total
+
+    @property
+    def is_soft(self) -> bool:
+        return self.soft_aces > 0
+
+    @property
+    def is_bust(self) -> bool:
+        return self.total > 21
+
+    @property
+    def is_blackjack(self) -> bool:
+        return self.total == 21 and len(self.cards) == 2
+
+
+class BlackjackGame:
+    __slots__ = ('user_id', 'bet', 'player', 'dealer', 'result', 'win_amount', 'fair')
+
+    def __init__(self, user_id: int, bet: int):
+        self.user_id = user_id
+        self.bet = bet
+        self.player = Hand()
+        self.dealer = Hand()
+        # 'playing' until the game ends as 'blackjack', 'bust', 'win', 'lose' or 'draw'.
+        self.result = 'playing'
+        self.win_amount = 0
+        # Snapshot of the provably fair round the hand was dealt in, if any.
+        self.fair: Optional[Dict] = None
+
+    @property
+    def dealer_up_card(self) -> str:
+        return CARD_TEXT[self.dealer.cards[0]]
+
+    def snapshot(self) -> Dict:
+        state = {'bet': self.bet, 'player': self.player.cards, 'dealer': self.dealer.cards}
+        if self.result != 'playing':
+            state['result'] = self.result
+            state['win_amount'] = self.win_amount
+        if self.fair is not None:
+            state['fair'] = self.fair
+        return state
+
+    @classmethod
+    def restore(cls, user_id: int, state: Dict) -> 'BlackjackGame':
+        game = cls(user_id, state['bet'])
+        for card in state['player']:
+            game.player.add(card)
+        for card in state['dealer']:
+            game.dealer.add(card)
+        game.result = state.get('result', 'playing')
+        game.win_amount = state.get('win_amount', 0)
+        game.fair = state.get('fair')
+        return game
+
+
+class Blackjack:
+    # Every player is dealt from a shoe of their own that is kept across rounds; the
+    # least recently used shoes are dropped beyond `max_shoes` and dealt fresh later.
+    # Hands live in `games`, a dict unless the caller supplies another mapping. A hand
+    # that ends on a hit or a stand stays there until the caller removes it, e.g. once it
+    # is settled, or the player's next start_game replaces it; hit() and stand() then
+    # return it unchanged.
+    # With `fresh_shoes` every hand is dealt from a newly shuffled shoe, so the shuffle
+    # made when the hand starts decides all of its cards. `game_rng` gives the generator
+    # that shuffle drew from, if it can be had again, so that a hand whose shoe is gone
+    # (dropped, or lost in a restart) goes on from the same shoe rather than a new one.
+    def __init__(self, decks: int = 6, penetration: float = 0.75, rng: Optional[random.Random] = None,
+                 max_shoes: int = 10000, rules: Rules = Rules(),
+                 games: Optional[MutableMapping[int, BlackjackGame]] = None, fresh_shoes: bool = False,
+                 game_rng: Optional[Callable[[BlackjackGame], Optional[random.Random]]] = None):
+        Shoe.validate(decks, penetration)
+        self.rules = rules
+        self.decks = decks
+        self.penetration = penetration
+        self.rng = rng or random.Random()
+        self.max_shoes = max_shoes
+        self.fresh_shoes = fresh_shoes
+        self.game_rng = game_rng
+        self.shoes: 'OrderedDict[int, Shoe]' = OrderedDict()
+        self.games: MutableMapping[int, BlackjackGame] = {} if games is None else games
+
+    def shoe(self, user_id: int) -> Shoe:
+        shoe = self.shoes.get(user_id)
+        if shoe is None:
+            game = self.games.get(user_id)
+            rng = self.game_rng(game) if game is not None and self.game_rng is not None else None
+            if rng is not None:
+                # The hand's own shoe again, dealt up to the cards already on the table.
+                shoe = Shoe(self.decks, self.penetration, rng)
+                shoe.position = len(game.player.cards) + len(game.dealer.cards)
+                shoe.rng = self.rng
             else:
-                value += 1
-                
-        return value
-
-    def hit(self, user_id: int) -> Tuple[List[str], int, bool]:
-        self.player_hands[user_id].append(self.deck.pop())
-        hand_value = self.calculate_hand(self.player_hands[user_id])
-        
-        if hand_value > 21:
-            self.game_state[user_id] = 'bust'
-            return (
-                [str(card) for card in self.player_hands[user_id]],
-                hand_value,
-                True
-            )
-            
-        return (
-            [str(card) for card in self.player_hands[user_id]],
-            hand_value,
-            False
-        )
-
-    def stand(self, user_id: int) -> Tuple[List[str], List[str], int, int, int]:
-        player_value = self.calculate_hand(self.player_hands[user_id])
-        
-        while self.calculate_hand(self.dealer_hand) < 17:
-            self.dealer_hand.append(self.deck.pop())
-            
-        dealer_value = self.calculate_hand(self.dealer_hand)
-        
-        if dealer_value > 21 or player_value > dealer_value:
-            self.game_state[user_id] = 'win'
-            win_amount = self.bets[user_id] * 2
-        elif dealer_value > player_value:
-            self.game_state[user_id] = 'lose'
-            win_amount = 0
+                shoe = Shoe(self.decks, self.penetration, self.rng)
+                if game is not None:
+                    # The player's previous shoe was dropped mid-game.
+                    shoe.reshuffle(game.player.cards + game.dealer.cards)
+            self.shoes[user_id] = shoe
+            if len(self.shoes) > self.max_shoes:
+                self.shoes.popitem(last=False)
+        else:
+            self.shoes.move_to_end(user_id)
+        return shoe
+
+    def _draw(self, shoe: Shoe, game: BlackjackGame) -> int:
+        if not shoe.remaining:
+            shoe.reshuffle(game.player.cards + game.dealer.cards)
+        return shoe.draw()
+
+    def start_game(self, user_id: int, bet: int) -> BlackjackGame:
+        self.games.pop(user_id, None)
+        shoe = self.shoe(user_id)
+        if shoe.needs_shuffle or (self.fresh_shoes and shoe.position):
+            shoe.reshuffle()
+
+        game = BlackjackGame(user_id, bet)
+        game.player.add(self._draw(shoe, game))
+        game.player.add(self._draw(shoe, game))
+        game.dealer.add(self._draw(shoe, game))
+        game.dealer.add(self._draw(shoe, game))
+        if game.player.is_blackjack:
+            game.result = 'blackjack'
+            game.win_amount = bet * self.rules.natural_pays
+        else:
+            self.games[user_id] = game
+        return game
+
+    def get_game(self, user_id: int) -> Optional[BlackjackGame]:
+        return self.games.get(user_id)
+
+    def hit(self, user_id: int) -> BlackjackGame:
+        game = self.games[user_id]
+        if game.result != 'playing':
+            return game
+        game.player.add(self._draw(self.shoe(user_id), game))
+        if game.player.is_bust:
+            game.result = 'bust'
+        return game
+
+    def stand(self, user_id: int) -> BlackjackGame:
+        game = self.games[user_id]
+        if game.result != 'playing':
+            return game
+        shoe = self.shoe(user_id)
+        dealer = game.dealer
+        while self.rules.dealer_draws(dealer.total, dealer.is_soft):
+            dealer.add(self._draw(shoe, game))
+
+        if dealer.total > 21 or game.player.total > dealer.total:
+            game.result = 'win'
+            game.win_amount = game.bet * self.rules.win_pays
+        elif dealer.total > game.player.total:
+            game.result = 'lose'
         else:
-            self.game_state[user_id] = 'draw'
-            win_amount = self.bets[user_id]
-            
-        return (
-            [str(card) for card in self.player_hands[user_id]],
-            [str(card) for card in self.dealer_hand],
-            player_value,
-            dealer_value,
-            win_amount
-        )
\ No newline at end of file
+            game.result = 'draw'
+            game.win_amount = game.bet
+        return game
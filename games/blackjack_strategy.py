@@ -0,0 +1,153 @@
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+from games.blackjack import CARD_VALUE, Rules
+
+# Infinite-shoe model: each of the 13 ranks is equally likely on every draw, so the
+# figures are exact for a continuously shuffled shoe and within a few hundredths of a
+# percent of a six-deck one.
+RANK_VALUES = CARD_VALUE[:13]
+RANK_PROBABILITY = 1 / 13
+DEALER_OUTCOMES = (17, 18, 19, 20, 21, 'bust')
+UPCARDS = tuple(range(2, 12))  # 11 is an ace
+
+HIT = 'hit'
+STAND = 'stand'
+
+
+def add_card(total: int, soft_aces: int, value: int) -> Tuple[int, int]:
+    # Hand.add: aces come in as 11 and fall back to 1 while the hand would bust.
+    total += value
+    if value == 11:
+        soft_aces += 1
+    while total > 21 and soft_aces:
+        total -= 10
+        soft_aces -= 1
+    return total, soft_aces
+
+
+class StrategyEntry:
+    __slots__ = ('action', 'hit_ev', 'stand_ev')
+
+    def __init__(self, action: str, hit_ev: float, stand_ev: float):
+        self.action = action
+        self.hit_ev = hit_ev
+        self.stand_ev = stand_ev
+
+    @property
+    def ev(self) -> float:
+        return max(self.hit_ev, self.stand_ev)
+
+
+class BasicStrategy:
+    # Exact expected values, per coin bet, of standing and of hitting (then playing on
+    # optimally) for every player state against every dealer upcard, by memoized
+    # recursion over the rules the game deals by. After construction `table` answers
+    # a hint with one dict lookup.
+    def __init__(self, rules: Rules = Rules()):
+        self.rules = rules
+        self._dealer: Dict[Tuple[int, int], Dict] = {}
+        self._best: Dict[Tuple[int, int, int], float] = {}
+        self.table: Dict[Tuple[int, bool, int], StrategyEntry] = {}
+        for upcard in UPCARDS:
+            for total in range(4, 22):
+                for soft in (0, 1):
+                    if soft and total < 12:
+                        continue
+                    stand = self.stand_ev(total, upcard)
+                    hit = self.hit_ev(total, soft, upcard)
+                    self.table[(total, bool(soft), upcard)] = StrategyEntry(
+                        HIT if hit > stand else STAND, hit, stand
+                    )
+        self.house_edge = -self.deal_ev()
+
+    def dealer_outcomes(self, total: int, soft_aces: int) -> Dict:
+        # Probability of each final dealer total ('bust' above 21) from a partial hand.
+        key = (total, soft_aces)
+        cached = self._dealer.get(key)
+        if cached is not None:
+            return cached
+        if total > 21:
+            outcomes = {'bust': 1.0}
+        elif not self.rules.dealer_draws(total, soft_aces > 0):
+            outcomes = {total: 1.0}
+        else:
+            outcomes = dict.fromkeys(DEALER_OUTCOMES, 0.0)
+            for value in RANK_VALUES:
+                for outcome, p in self.dealer_outcomes(*add_card(total, soft_aces, value)).items():
+                    outcomes[outcome] += RANK_PROBABILITY * p
+        self._dealer[key] = outcomes
+        return outcomes
+
+    def dealer_distribution(self, upcard: int) -> Dict:
+        # The hole card is simply the dealer's next draw: there is no peek for a natural.
+        return self.dealer_outcomes(*add_card(0, 0, upcard))
+
+    def stand_ev(self, total: int, upcard: int) -> float:
+        win = self.rules.win_pays - 1
+        ev = 0.0
+        for outcome, p in self.dealer_distribution(upcard).items():
+            if outcome == 'bust' or total > outcome:
+                ev += p * win
+            elif total < outcome:
+                ev -= p
+        return ev
+
+    def best_ev(self, total: int, soft_aces: int, upcard: int) -> float:
+        if total > 21:
+            return -1.0
+        key = (total, soft_aces, upcard)
+        cached = self._best.get(key)
+        if cached is None:
+            cached = self._best[key] = max(self.stand_ev(total, upcard), self.hit_ev(total, soft_aces, upcard))
+        return cached
+
+    def hit_ev(self, total: int, soft_aces: int, upcard: int) -> float:
+        return sum(
+            RANK_PROBABILITY * self.best_ev(*add_card(total, soft_aces, value), upcard)
+            for value in RANK_VALUES
+        )
+
+    def deal_ev(self) -> float:
+        # Expected result of a whole round: a two-card 21 is paid at once, anything
+        # else is played out optimally against the upcard.
+        natural = self.rules.natural_pays - 1
+        ev = 0.0
+        for first in RANK_VALUES:
+            for second in RANK_VALUES:
+                total, soft_aces = add_card(*add_card(0, 0, first), second)
+                for upcard in RANK_VALUES:
+                    p = RANK_PROBABILITY ** 3
+                    ev += p * (natural if total == 21 else self.best_ev(total, soft_aces, upcard))
+        return ev
+
+    def hint(self, total: int, soft: bool, upcard: int) -> Optional[StrategyEntry]:
+        return self.table.get((total, soft, upcard))
+
+    def format_table(self) -> str:
+        header = 'hand  ' + ' '.join(f'{("A" if upcard == 11 else upcard):>2}' for upcard in UPCARDS)
+        lines: List[str] = [header]
+        for soft, label in ((False, 'hard'), (True, 'soft')):
+            for total in range(12 if soft else 4, 22):
+                row = ' '.join(
+                    f'{self.table[(total, soft, upcard)].action[0].upper():>2}' for upcard in UPCARDS
+                )
+                lines.append(f'{label[0]}{total:<4} {row}')
+        lines.append(f'house edge: {self.house_edge:.4%}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Blackjack basic strategy and house edge for the game rules')
+    parser.add_argument('--natural-pays', type=int, default=Rules.natural_pays,
+                        help='coins returned per coin bet on a two-card 21')
+    parser.add_argument('--win-pays', type=int, default=Rules.win_pays,
+                        help='coins returned per coin bet on a won hand')
+    parser.add_argument('--dealer-hits-soft-17', action='store_true')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    strategy = BasicStrategy(Rules(args.natural_pays, args.win_pays, args.dealer_hits_soft_17))
+    print(strategy.format_table())
+    print(f'computed in {(time.perf_counter() - started) * 1000:.1f} ms')
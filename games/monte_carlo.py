@@ -0,0 +1,247 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from games.blackjack import CARD_VALUE, Blackjack
+from games.blackjack_strategy import HIT, BasicStrategy
+from games.roulette import BetType, Roulette, RouletteTable
+from games.slots import SlotMachine
+from games.slots_simulator import expected_rtp
+
+GAMES = ('slots', 'roulette', 'blackjack')
+# The bets the roulette keyboard offers, plus a straight-up bet on a random number.
+ROULETTE_BETS = (
+    [(BetType.COLOR, color) for color in ('red', 'black', 'green')]
+    + [(BetType.PARITY, parity) for parity in ('even', 'odd')]
+    + [(BetType.DOZEN, str(dozen)) for dozen in (1, 2, 3)]
+    + [(BetType.HALF, str(half)) for half in (1, 2)]
+)
+PERCENTILES = (0.01, 0.05, 0.5, 0.95, 0.99)
+# Shards per game unless told otherwise. Fixed rather than derived from the worker count,
+# as the shards decide the seeds: 64 keeps up to 16 cores busy with 4 shards each.
+DEFAULT_SHARDS = 64
+
+# One round of a game with a unit bet on every bet type: (bet type, coins paid back).
+Round = List[Tuple[str, int]]
+
+
+class Histogram:
+    # Exact counts per integer value. Payouts, session results and drawdowns are all
+    # whole numbers of bets in a bounded range, so this stays small, merges by adding
+    # counts and answers any percentile exactly.
+    __slots__ = ('counts',)
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+
+    def add(self, value: int):
+        self.counts[value] = self.counts.get(value, 0) + 1
+
+    def merge(self, other: 'Histogram'):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> int:
+        rank = q * (self.count - 1)
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen > rank:
+                return value
+        return 0
+
+    def share_at_least(self, threshold: int) -> float:
+        total = self.count
+        return sum(c for v, c in self.counts.items() if v >= threshold) / total if total else 0.0
+
+
+@dataclass
+class BetStats:
+    # Streaming totals for one game and bet type. Integer sums make merging shards
+    # exact: mean and variance come from the count, sum and sum of squares.
+    rounds: int = 0
+    paid: int = 0
+    paid_squares: int = 0
+    hits: int = 0
+    payouts: Histogram = field(default_factory=Histogram)
+    # Net result and deepest drawdown, in bets, of every whole session.
+    session_net: Histogram = field(default_factory=Histogram)
+    drawdown: Histogram = field(default_factory=Histogram)
+
+    def merge(self, other: 'BetStats'):
+        self.rounds += other.rounds
+        self.paid += other.paid
+        self.paid_squares += other.paid_squares
+        self.hits += other.hits
+        self.payouts.merge(other.payouts)
+        self.session_net.merge(other.session_net)
+        self.drawdown.merge(other.drawdown)
+
+    @property
+    def rtp(self) -> float:
+        return self.paid / self.rounds if self.rounds else 0.0
+
+    @property
+    def variance(self) -> float:
+        return self.paid_squares / self.rounds - self.rtp ** 2 if self.rounds else 0.0
+
+    @property
+    def std_error(self) -> float:
+        return (self.variance / self.rounds) ** 0.5 if self.rounds else 0.0
+
+
+def _slots_rounds(rng: random.Random) -> Iterator[Round]:
+    machine = SlotMachine(rng)
+    while True:
+        yield [('spin', machine.spin(1)[1])]
+
+
+def _roulette_rounds(rng: random.Random) -> Iterator[Round]:
+    # Every bet type has its own player and so its own spin.
+    roulette = Roulette(rng)
+    bets = [(f'{bet_type.value} {value}', bet_type, value) for bet_type, value in ROULETTE_BETS]
+    while True:
+        results = []
+        for user_id, (name, bet_type, value) in enumerate(bets):
+            roulette.place_bet(user_id, bet_type, value, 1)
+            results.append((name, roulette.spin(user_id)[1]))
+        roulette.place_bet(len(bets), BetType.NUMBER, str(rng.randrange(37)), 1)
+        results.append(('number', roulette.spin(len(bets))[1]))
+        yield results
+
+
+def _blackjack_rounds(rng: random.Random) -> Iterator[Round]:
+    # A six-deck shoe played by the basic strategy the hint button gives.
+    table = Blackjack(rng=rng)
+    strategy = BasicStrategy(table.rules)
+    while True:
+        game = table.start_game(0, 1)
+        while game.result == 'playing':
+            hint = strategy.hint(game.player.total, game.player.is_soft, CARD_VALUE[game.dealer.cards[0]])
+            if hint.action == HIT:
+                table.hit(0)
+            else:
+                table.stand(0)
+        yield [('basic strategy', game.win_amount)]
+
+
+ROUNDS: Dict[str, Callable[[random.Random], Iterator[Round]]] = {
+    'slots': _slots_rounds,
+    'roulette': _roulette_rounds,
+    'blackjack': _blackjack_rounds,
+}
+
+
+def run_shard(game: str, seed: str, sessions: int, session_rounds: int) -> Dict[str, BetStats]:
+    # One independent, reproducible piece of a simulation: `sessions` sessions of
+    # `session_rounds` rounds dealt from a generator seeded with `seed`.
+    rounds = ROUNDS[game](random.Random(seed))
+    stats: Dict[str, BetStats] = {}
+    for _ in range(sessions):
+        net: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        for _ in range(session_rounds):
+            for bet, paid in next(rounds):
+                entry = stats.get(bet)
+                if entry is None:
+                    entry = stats[bet] = BetStats()
+                entry.rounds += 1
+                entry.paid += paid
+                entry.paid_squares += paid * paid
+                entry.hits += paid > 0
+                entry.payouts.add(paid)
+                balance = net[bet] = net.get(bet, 0) + paid - 1
+                if balance < low.get(bet, 0):
+                    low[bet] = balance
+        for bet, balance in net.items():
+            stats[bet].session_net.add(balance)
+            stats[bet].drawdown.add(-low.get(bet, 0))
+    return stats
+
+
+def exact_rtp(game: str) -> Dict[str, float]:
+    # Closed-form returns to check the simulation against, where the game has one.
+    if game == 'slots':
+        return {'spin': expected_rtp(SlotMachine())}
+    if game == 'roulette':
+        table = RouletteTable()
+        columns = {f'{bet_type.value} {value}': table.position_index[(bet_type, value)]
+                   for bet_type, value in ROULETTE_BETS}
+        returns = {name: float(table.payouts[:, column].mean()) for name, column in columns.items()}
+        returns['number'] = float(table.payouts[:, :37].mean())
+        return returns
+    # Infinite-shoe figure; the simulated six-deck shoe differs by a few hundredths of a percent.
+    return {'basic strategy': 1 + BasicStrategy().deal_ev()}
+
+
+def simulate(games: List[str], rounds: int, seed: int = 0, session_rounds: int = 100,
+             shards: int = DEFAULT_SHARDS, workers: Optional[int] = None) -> Dict[str, Dict[str, BetStats]]:
+    # Splits each game's `rounds` into whole-session shards run across a process pool
+    # and merges the shard statistics as they finish. Shard seeds depend only on the
+    # seed, game and shard number, so a run is reproducible with any worker count.
+    workers = workers or os.cpu_count() or 1
+    sessions = max(rounds // session_rounds, 1)
+    results: Dict[str, Dict[str, BetStats]] = {game: {} for game in games}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = []
+        for game in games:
+            for shard in range(shards):
+                count = sessions // shards + (shard < sessions % shards)
+                if count:
+                    futures.append((game, pool.submit(run_shard, game, f'{seed}:{game}:{shard}',
+                                                      count, session_rounds)))
+        for game, future in futures:
+            merged = results[game]
+            for bet, stats in future.result().items():
+                if bet in merged:
+                    merged[bet].merge(stats)
+                else:
+                    merged[bet] = stats
+    return results
+
+
+def format_report(results: Dict[str, Dict[str, BetStats]], session_rounds: int, bankroll: int) -> str:
+    lines = []
+    for game, bets in results.items():
+        exact = exact_rtp(game)
+        lines.append(f'{game}:')
+        lines.append(f'  {"bet":<16} {"rounds":>10} {"RTP":>9} {"95% CI":>9} {"exact":>9} {"hit":>7} '
+                     f'{"std":>6}  session net p1/p5/p50/p95/p99  drawdown p99  ruin')
+        for bet, stats in bets.items():
+            net = '/'.join(str(stats.session_net.quantile(q)) for q in PERCENTILES)
+            expected = exact.get(bet)
+            lines.append(
+                f'  {bet:<16} {stats.rounds:>10} {stats.rtp:>9.4%} ±{1.96 * stats.std_error:>7.4%} '
+                f'{"" if expected is None else format(expected, ".4%"):>9} {stats.hits / stats.rounds:>7.2%} '
+                f'{stats.variance ** 0.5:>6.2f}  {net:<30} {stats.drawdown.quantile(0.99):>12}  '
+                f'{stats.drawdown.share_at_least(bankroll):.2%}'
+            )
+    lines.append(f'sessions of {session_rounds} unit bets; ruin: share of sessions that lose a '
+                 f'{bankroll}-bet bankroll at some point')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of every game across CPU cores')
+    parser.add_argument('--games', nargs='+', choices=GAMES, default=list(GAMES))
+    parser.add_argument('--rounds', type=int, default=1_000_000, help='rounds per game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--session', type=int, default=100, help='rounds per session for session results')
+    parser.add_argument('--bankroll', type=int, default=50, help='session bankroll in bets for the ruin rate')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help='shards per game')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    simulated = simulate(args.games, args.rounds, args.seed, args.session, args.shards, args.workers)
+    elapsed = time.perf_counter() - started
+    print(format_report(simulated, args.session, args.bankroll))
+    print(f'simulated {args.rounds * len(args.games)} rounds in {elapsed:.2f} s')
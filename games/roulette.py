@@ -1,7 +1,9 @@
+import copy
 from dataclasses import dataclass
 from enum import Enum
 import random
-from typing import List, Tuple, Dict
+import numpy as np
+from typing import List, Tuple, Dict, Optional
 
 class BetType(Enum):
     NUMBER = 'number'
@@ -32,7 +34,8 @@ class RouletteNumber:
         return f"{color_emoji} {self.number}"
 
 class Roulette:
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
         self.numbers = [RouletteNumber(i) for i in range(37)]
         self.multipliers = {
             BetType.NUMBER: 35,
@@ -55,7 +58,7 @@ class Roulette:
         if user_id not in self.active_games:
             return None, 0
             
-        result = random.choice(self.numbers)
+        result = self.rng.choice(self.numbers)
         total_win = 0
         
         for bet in self.active_games[user_id]:
@@ -80,4 +83,107 @@ class Roulette:
         return False
 
     def get_active_bets(self, user_id: int) -> List[Bet]:
-        return self.active_games.get(user_id, [])
\ No newline at end of file
+        return self.active_games.get(user_id, [])
+
+@dataclass
+class RoundResult:
+    round_id: int
+    number: RouletteNumber
+    # (user_id, total stake, total payout) for every player with bets in the round.
+    settlements: List[Tuple[int, int, int]]
+
+
+class RouletteTable:
+    # One wheel shared by every player. Bets collect in flat arrays while the round is
+    # open and a single spin settles all of them in one pass over `payouts`, a
+    # 37 x bet-position matrix of multipliers precomputed from Roulette's own rules.
+    def __init__(self, roulette: Optional[Roulette] = None):
+        self.roulette = roulette or Roulette()
+        self.positions: List[Tuple[BetType, str]] = (
+            [(BetType.NUMBER, str(n)) for n in range(37)]
+            + [(BetType.COLOR, color) for color in ('red', 'black', 'green')]
+            + [(BetType.PARITY, parity) for parity in ('even', 'odd')]
+            + [(BetType.DOZEN, str(dozen)) for dozen in (1, 2, 3)]
+            + [(BetType.HALF, str(half)) for half in (1, 2)]
+        )
+        self.position_index = {position: i for i, position in enumerate(self.positions)}
+        self.payouts = np.array([
+            [
+                self.roulette.multipliers[bet_type] if self.roulette._check_win(Bet(bet_type, value, 1), number) else 0
+                for bet_type, value in self.positions
+            ]
+            for number in self.roulette.numbers
+        ], dtype=np.int64)
+        # Counts up from 1 per spin; whoever drives the rounds may set an id unique across
+        # restarts instead, as it ends up in settlement keys.
+        self.round_id = 1
+        # Event loop time at which the current round closes, set by whoever drives the rounds.
+        self.closes_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._players: Dict[int, int] = {}
+        self._stakes: List[int] = []
+        self._bet_players: List[int] = []
+        self._bet_positions: List[int] = []
+        self._bet_amounts: List[int] = []
+
+    @property
+    def players(self) -> int:
+        return len(self._players)
+
+    def stake(self, user_id: int) -> int:
+        player = self._players.get(user_id)
+        return 0 if player is None else self._stakes[player]
+
+    def open_bets(self) -> Dict[int, List[Tuple[BetType, str, int]]]:
+        # The current round's bets per player, e.g. to carry them over a restart.
+        user_ids = list(self._players)
+        bets: Dict[int, List[Tuple[BetType, str, int]]] = {user_id: [] for user_id in user_ids}
+        for player, position, amount in zip(self._bet_players, self._bet_positions, self._bet_amounts):
+            bet_type, value = self.positions[position]
+            bets[user_ids[player]].append((bet_type, value, amount))
+        return bets
+
+    def place_bet(self, user_id: int, bet_type: BetType, value: str, amount: int) -> bool:
+        position = self.position_index.get((bet_type, value))
+        if position is None or amount <= 0:
+            return False
+        player = self._players.get(user_id)
+        if player is None:
+            player = self._players[user_id] = len(self._stakes)
+            self._stakes.append(0)
+        self._stakes[player] += amount
+        self._bet_players.append(player)
+        self._bet_positions.append(position)
+        self._bet_amounts.append(amount)
+        return True
+
+    def close(self) -> 'RouletteTable':
+        # Takes the round's bets off the table and returns them as a table of their own to
+        # spin. This table opens the next round at once, so chips placed while the closed
+        # round is drawn and settled go to the next one.
+        closed = copy.copy(self)
+        self.round_id += 1
+        self._reset()
+        return closed
+
+    def draw(self) -> int:
+        # Index of a random winning number, for spin().
+        return self.roulette.rng.randrange(len(self.roulette.numbers))
+
+    def spin(self, number: Optional[int] = None) -> RoundResult:
+        # Closes the round: every bet is paid from the winning number's row at once.
+        if number is None:
+            number = self.draw()
+        players = len(self._stakes)
+        won = self.payouts[number, self._bet_positions] * np.array(self._bet_amounts, dtype=np.int64)
+        paid = np.bincount(np.array(self._bet_players, dtype=np.int64), weights=won, minlength=players)
+        user_ids = list(self._players)
+        settlements = [
+            (user_ids[player], self._stakes[player], int(paid[player])) for player in range(players)
+        ]
+        result = RoundResult(self.round_id, self.roulette.numbers[number], settlements)
+        self.round_id += 1
+        self._reset()
+        return result
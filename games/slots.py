@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 import random
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 @dataclass
 class Symbol:
@@ -9,7 +9,8 @@ class Symbol:
     multiplier: int
 
 class SlotMachine:
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
         self.symbols = [
             Symbol('7️⃣', 'seven', 10),
             Symbol('🍒', 'cherry', 5),
@@ -21,7 +22,7 @@ class SlotMachine:
         self.reels = 3
         
     def spin(self, bet: int) -> Tuple[List[Symbol], int]:
-        result = [random.choice(self.symbols) for _ in range(self.reels)]
+        result = [self.rng.choice(self.symbols) for _ in range(self.reels)]
         win_amount = self._calculate_win(result, bet)
         return result, win_amount
         
@@ -35,7 +36,7 @@ class SlotMachine:
         symbols = [s.emoji for s in self.symbols]
         
         for _ in range(3):  # 3 animation frames
-            frame = ' '.join(random.choice(symbols) for _ in range(self.reels))
+            frame = ' '.join(self.rng.choice(symbols) for _ in range(self.reels))
             frames.append(frame)
             
         return frames
\ No newline at end of file
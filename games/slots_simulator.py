@@ -0,0 +1,129 @@
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from games.slots import SlotMachine
+
+
+@dataclass
+class SimulationResult:
+    spins: int
+    rtp: float
+    expected_rtp: float
+    hit_frequency: float
+    variance: float
+    max_win: int
+    # Win multiplier -> number of spins that paid it; 0 counts the losing spins.
+    win_distribution: Dict[int, int]
+    # Biggest multiplier hit in a session of `session_spins` spins -> number of sessions.
+    session_spins: int
+    max_win_distribution: Dict[int, int]
+
+    @property
+    def std_error(self) -> float:
+        return (self.variance / self.spins) ** 0.5 if self.spins else 0.0
+
+    def format(self) -> str:
+        lines = [
+            f'spins:         {self.spins}',
+            f'RTP:           {self.rtp:.4%} (paytable {self.expected_rtp:.4%}, '
+            f'95% CI ±{1.96 * self.std_error:.4%})',
+            f'hit frequency: {self.hit_frequency:.4%} (1 in {1 / self.hit_frequency:.1f})'
+            if self.hit_frequency else 'hit frequency: 0',
+            f'variance:      {self.variance:.4f} (std {self.variance ** 0.5:.4f} bets per spin)',
+            f'max win:       x{self.max_win}',
+            'wins by multiplier:'
+        ]
+        for multiplier, count in sorted(self.win_distribution.items(), reverse=True):
+            if multiplier:
+                lines.append(f'  x{multiplier:<4} {count:>12}  {count / self.spins:.6%}')
+        sessions = sum(self.max_win_distribution.values())
+        if sessions:
+            lines.append(f'max win per {self.session_spins}-spin session ({sessions} sessions):')
+            for multiplier, count in sorted(self.max_win_distribution.items(), reverse=True):
+                lines.append(f'  x{multiplier:<4} {count:>12}  {count / sessions:.4%}')
+        return '\n'.join(lines)
+
+
+def expected_rtp(machine: SlotMachine) -> float:
+    # Exact return of SlotMachine.spin: each reel picks a symbol uniformly and only
+    # `reels` of a kind pay, so every symbol lines up with probability 1 / n ** reels.
+    count = len(machine.symbols)
+    return sum(s.multiplier for s in machine.symbols) / count ** machine.reels
+
+
+def simulate(machine: SlotMachine, spins: int, seed: Optional[int] = None,
+             chunk: int = 1_000_000, session_spins: int = 100) -> SimulationResult:
+    # Evaluates `spins` spins of a unit bet against machine.symbols, `chunk` spins per
+    # batch of arrays, so memory stays flat however many spins are requested.
+    rng = np.random.default_rng(seed)
+    multipliers = np.array([s.multiplier for s in machine.symbols], dtype=np.int64)
+    distribution = np.zeros(int(multipliers.max()) + 1, dtype=np.int64)
+    session_max = np.zeros_like(distribution)
+    # Whole sessions per batch, so none is split across two of them.
+    chunk = max(chunk // session_spins, 1) * session_spins
+    total = 0
+    total_squares = 0
+
+    done = 0
+    while done < spins:
+        size = min(chunk, spins - done)
+        reels = rng.integers(0, len(multipliers), size=(size, machine.reels), dtype=np.uint8)
+        hit = (reels == reels[:, :1]).all(axis=1)
+        payout = np.where(hit, multipliers[reels[:, 0]], 0)
+        distribution += np.bincount(payout, minlength=len(distribution))
+        sessions = size // session_spins
+        if sessions:
+            peaks = payout[:sessions * session_spins].reshape(sessions, session_spins).max(axis=1)
+            session_max += np.bincount(peaks, minlength=len(session_max))
+        total += int(payout.sum())
+        total_squares += int(np.dot(payout, payout))
+        done += size
+
+    mean = total / spins if spins else 0.0
+    # Variance of the net result per spin in bets; the stake itself is constant.
+    variance = total_squares / spins - mean ** 2 if spins else 0.0
+    paid = np.nonzero(distribution)[0]
+    return SimulationResult(
+        spins=spins,
+        rtp=mean,
+        expected_rtp=expected_rtp(machine),
+        hit_frequency=int(distribution[1:].sum()) / spins if spins else 0.0,
+        variance=variance,
+        max_win=int(paid.max()) if len(paid) else 0,
+        win_distribution={int(m): int(distribution[m]) for m in paid},
+        session_spins=session_spins,
+        max_win_distribution={int(m): int(session_max[m]) for m in np.nonzero(session_max)[0]}
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate the slots paytable and check its return to player')
+    parser.add_argument('--spins', type=int, default=10_000_000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=1_000_000, help='spins evaluated per array batch')
+    parser.add_argument('--session', type=int, default=100, help='spins per session for the max-win distribution')
+    parser.add_argument('--min-rtp', type=float, default=None, help='fail if the simulated RTP is lower')
+    parser.add_argument('--max-rtp', type=float, default=None, help='fail if the simulated RTP is higher')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = simulate(SlotMachine(), args.spins, args.seed, args.chunk, args.session)
+    print(result.format())
+    print(f'simulated in {time.perf_counter() - started:.2f} s')
+
+    # A simulation far outside the exact figure means the simulator no longer matches the machine.
+    problems = []
+    if abs(result.rtp - result.expected_rtp) > 5 * result.std_error:
+        problems.append(f'simulated RTP {result.rtp:.4%} disagrees with the paytable {result.expected_rtp:.4%}')
+    if args.min_rtp is not None and result.rtp < args.min_rtp:
+        problems.append(f'RTP {result.rtp:.4%} is below {args.min_rtp:.4%}')
+    if args.max_rtp is not None and result.rtp > args.max_rtp:
+        problems.append(f'RTP {result.rtp:.4%} is above {args.max_rtp:.4%}')
+    for problem in problems:
+        print(f'FAIL: {problem}', file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -1,126 +1,256 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Dict
+from pydantic import ConfigDict
+from types import MappingProxyType
+from typing import Callable, List, Dict, Optional, Tuple
+from callbacks import BET_AMOUNTS, LAYOUTS, SetLayout, SetLanguage, SlotsBet, RouletteBet, BlackjackBet
+from games.roulette import BetType
+
+class FrozenButton(InlineKeyboardButton):
+    model_config = ConfigDict(frozen=True)
+
+class FrozenKeyboard(InlineKeyboardMarkup):
+    # Rows are validated into tuples: one cached markup is shared by every handler, so
+    # neither the model nor its rows may be changed in place.
+    model_config = ConfigDict(frozen=True)
+    inline_keyboard: Tuple[Tuple[FrozenButton, ...], ...]
 
 class KeyboardManager:
-    def __init__(self):
-        self.layouts = {
-            'vertical': self._create_vertical_layout,
-            'horizontal': self._create_horizontal_layout
+    TEXTS = {
+        'main': {
+            'ru': ['👤 Профиль', '🎮 Игры', '⚙️ Настройки', '🏆 Рейтинг', '📜 Правила'],
+            'en': ['👤 Profile', '🎮 Games', '⚙️ Settings', '🏆 Rating', '📜 Rules']
+        },
+        'games': {
+            'ru': ['🎲 21 (Блэкджек)', '🎰 Рулетка', '🎰 Слоты', '🔙 Назад'],
+            'en': ['🎲 21 (Blackjack)', '🎰 Roulette', '🎰 Slots', '🔙 Back']
+        },
+        'settings': {
+            'ru': ['📱 Расположение кнопок', '🌍 Язык', '🔙 Назад'],
+            'en': ['📱 Button layout', '🌍 Language', '🔙 Back']
+        },
+        'layout': {
+            'ru': {'vertical': '⬇️ Вертикально', 'horizontal': '➡️ Горизонтально', 'back': '🔙 Назад'},
+            'en': {'vertical': '⬇️ Vertical', 'horizontal': '➡️ Horizontal', 'back': '🔙 Back'}
+        },
+        'language': {
+            'ru': {'back': '🔙 Назад'},
+            'en': {'back': '🔙 Back'}
+        },
+        'slots': {
+            'ru': {'bets': BET_AMOUNTS, 'back': '🔙 Назад'},
+            'en': {'bets': BET_AMOUNTS, 'back': '🔙 Back'}
+        },
+        'bet': {
+            'ru': {'bets': BET_AMOUNTS, 'back': '🔙 Назад'},
+            'en': {'bets': BET_AMOUNTS, 'back': '🔙 Back'}
+        },
+        'blackjack': {
+            'ru': ['🃏 Ещё карту', '✋ Хватит', '💡 Подсказка'],
+            'en': ['🃏 Hit', '✋ Stand', '💡 Hint']
+        },
+        'roulette': {
+            'ru': {
+                'colors': ['🔴 Красное', '⚫️ Чёрное', '🟢 Зеро'],
+                'parity': ['2️⃣ Чёт', '1️⃣ Нечет'],
+                'dozens': ['1️⃣ 1-12', '2️⃣ 13-24', '3️⃣ 25-36'],
+                'halves': ['⬇️ 1-18', '⬆️ 19-36'],
+                'actions': ['🎯 Крутить', '🔙 Назад']
+            },
+            'en': {
+                'colors': ['🔴 Red', '⚫️ Black', '🟢 Zero'],
+                'parity': ['2️⃣ Even', '1️⃣ Odd'],
+                'dozens': ['1️⃣ 1-12', '2️⃣ 13-24', '3️⃣ 25-36'],
+                'halves': ['⬇️ 1-18', '⬆️ 19-36'],
+                'actions': ['🎯 Spin', '🔙 Back']
+            }
+        }
+    }
+
+    def __init__(self, languages: Optional[Dict[str, str]] = None, default_language: str = 'ru'):
+        self.layouts = {layout: getattr(self, f'_create_{layout}_layout') for layout in LAYOUTS}
+        self.languages = dict(languages or {'ru': 'Русский', 'en': 'English'})
+        self.default_language = default_language
+        self.builders: Dict[str, Callable[[str, str], InlineKeyboardMarkup]] = {
+            'main': self._build_main,
+            'games': self._build_games,
+            'settings': self._build_settings,
+            'layout': self._build_layout,
+            'language': self._build_language,
+            'slots': self._build_slots,
+            'bet': self._build_bet,
+            'blackjack': self._build_blackjack,
+            'roulette': self._build_roulette
         }
+        # Every (keyboard, layout, language) combination is built once; handlers share the frozen markups.
+        self._cache = MappingProxyType({
+            (name, layout_type, lang): build(layout_type, lang)
+            for name, build in self.builders.items()
+            for layout_type in self.layouts
+            for lang in self.languages
+        })
+
+    def _texts(self, keyboard: str, lang: str):
+        texts = self.TEXTS[keyboard]
+        return texts.get(lang) or texts[self.default_language]
+
+    def _cached(self, keyboard: str, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        markup = self._cache.get((keyboard, layout_type, lang))
+        if markup is None:
+            if layout_type not in self.layouts:
+                layout_type = 'vertical'
+            if lang not in self.languages:
+                lang = self.default_language
+            markup = self._cache[(keyboard, layout_type, lang)]
+        return markup
 
     def get_keyboard(self, keyboard_type: str, layout_type: str = 'vertical', **kwargs) -> InlineKeyboardMarkup:
         keyboard_method = getattr(self, f'get_{keyboard_type}_keyboard', None)
         if not keyboard_method:
             raise ValueError(f"Unknown keyboard type: {keyboard_type}")
-            
+
         return keyboard_method(layout_type, **kwargs)
 
     def _create_vertical_layout(self, buttons: List[Dict]) -> List[List[InlineKeyboardButton]]:
-        return [[InlineKeyboardButton(**button)] for button in buttons]
+        return [[FrozenButton(**button)] for button in buttons]
 
     def _create_horizontal_layout(self, buttons: List[Dict]) -> List[List[InlineKeyboardButton]]:
         return [
-            [InlineKeyboardButton(**button) for button in buttons[i:i+3]]
+            [FrozenButton(**button) for button in buttons[i:i+3]]
             for i in range(0, len(buttons), 3)
         ]
 
+    def _markup(self, layout_type: str, buttons: List[Dict]) -> InlineKeyboardMarkup:
+        return FrozenKeyboard(inline_keyboard=self.layouts[layout_type](buttons))
+
     def get_main_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
-        texts = {
-            'ru': ['👤 Профиль', '🎮 Игры', '⚙️ Настройки', '🏆 Рейтинг', '📜 Правила'],
-            'en': ['👤 Profile', '🎮 Games', '⚙️ Settings', '🏆 Rating', '📜 Rules']
-        }
-        
+        return self._cached('main', layout_type, lang)
+
+    def get_games_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('games', layout_type, lang)
+
+    def get_settings_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('settings', layout_type, lang)
+
+    def get_layout_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('layout', layout_type, lang)
+
+    def get_language_keyboard(self, lang: str = 'ru', layout_type: str = 'vertical') -> InlineKeyboardMarkup:
+        return self._cached('language', layout_type, lang)
+
+    def get_slots_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('slots', layout_type, lang)
+
+    def get_bet_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('bet', layout_type, lang)
+
+    def get_blackjack_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('blackjack', layout_type, lang)
+
+    def get_roulette_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+        return self._cached('roulette', layout_type, lang)
+
+    def _build_main(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
         buttons = [
             {'text': text, 'callback_data': data}
-            for text, data in zip(texts[lang], ['profile', 'games', 'settings', 'rating', 'rules'])
+            for text, data in zip(self._texts('main', lang), ['profile', 'games', 'settings', 'rating', 'rules'])
         ]
-        
-        return InlineKeyboardMarkup(
-            inline_keyboard=self.layouts[layout_type](buttons)
-        )
+        return self._markup(layout_type, buttons)
 
-    def get_games_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
-        texts = {
-            'ru': ['🎲 21 (Блэкджек)', '🎰 Рулетка', '🎰 Слоты', '🔙 Назад'],
-            'en': ['🎲 21 (Blackjack)', '🎰 Roulette', '🎰 Slots', '🔙 Back']
-        }
-        
+    def _build_games(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        texts = self._texts('games', lang)
         buttons = [
-            {'text': texts[lang][0], 'callback_data': 'blackjack'},
-            {'text': texts[lang][1], 'callback_data': 'roulette'},
-            {'text': texts[lang][2], 'callback_data': 'slots'},
-            {'text': texts[lang][3], 'callback_data': 'main_menu'}
+            {'text': texts[0], 'callback_data': 'blackjack'},
+            {'text': texts[1], 'callback_data': 'roulette'},
+            {'text': texts[2], 'callback_data': 'slots'},
+            {'text': texts[3], 'callback_data': 'main_menu'}
         ]
-        
-        return InlineKeyboardMarkup(
-            inline_keyboard=self.layouts[layout_type](buttons)
-        )
+        return self._markup(layout_type, buttons)
 
-    def get_slots_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
-        texts = {
-            'ru': {
-                'bets': ['💰 10', '💰 50', '💰 100'],
-                'back': '🔙 Назад'
-            },
-            'en': {
-                'bets': ['💰 10', '💰 50', '💰 100'],
-                'back': '🔙 Back'
-            }
-        }
-        
+    def _build_settings(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        texts = self._texts('settings', lang)
         buttons = [
-            {'text': bet, 'callback_data': f'slots_bet_{bet.split()[1]}'}
-            for bet in texts[lang]['bets']
+            {'text': texts[0], 'callback_data': 'layout_settings'},
+            {'text': texts[1], 'callback_data': 'language_settings'},
+            {'text': texts[2], 'callback_data': 'main_menu'}
         ]
-        buttons.append({'text': texts[lang]['back'], 'callback_data': 'games'})
-        
-        return InlineKeyboardMarkup(
-            inline_keyboard=self.layouts[layout_type](buttons)
-        )
+        return self._markup(layout_type, buttons)
 
-    def get_roulette_keyboard(self, layout_type: str, lang: str = 'ru') -> InlineKeyboardMarkup:
-        texts = {
-            'ru': {
-                'colors': ['🔴 Красное', '⚫️ Чёрное', '🟢 Зеро'],
-                'parity': ['2️⃣ Чёт', '1️⃣ Нечет'],
-                'dozens': ['1️⃣ 1-12', '2️⃣ 13-24', '3️⃣ 25-36'],
-                'halves': ['⬇️ 1-18', '⬆️ 19-36'],
-                'actions': ['🎯 Крутить', '🔙 Назад']
-            },
-            'en': {
-                'colors': ['🔴 Red', '⚫️ Black', '🟢 Zero'],
-                'parity': ['2️⃣ Even', '1️⃣ Odd'],
-                'dozens': ['1️⃣ 1-12', '2️⃣ 13-24', '3️⃣ 25-36'],
-                'halves': ['⬇️ 1-18', '⬆️ 19-36'],
-                'actions': ['🎯 Spin', '🔙 Back']
+    def _build_layout(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        # The keyboard is shown in the user's current layout, which is also marked.
+        texts = self._texts('layout', lang)
+        buttons = [
+            {
+                'text': ('✅ ' if layout == layout_type else '') + texts.get(layout, layout),
+                'callback_data': SetLayout(layout=layout).pack()
             }
-        }
+            for layout in self.layouts
+        ]
+        buttons.append({'text': texts['back'], 'callback_data': 'settings'})
+        return self._markup(layout_type, buttons)
+
+    def _build_language(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        buttons = [
+            {'text': ('✅ ' if code == lang else '') + name, 'callback_data': SetLanguage(lang=code).pack()}
+            for code, name in self.languages.items()
+        ]
+        buttons.append({'text': self._texts('language', lang)['back'], 'callback_data': 'settings'})
+        return self._markup(layout_type, buttons)
 
+    def _build_slots(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        texts = self._texts('slots', lang)
+        buttons = [
+            {'text': f'💰 {bet}', 'callback_data': SlotsBet(amount=bet).pack()}
+            for bet in texts['bets']
+        ]
+        buttons.append({'text': texts['back'], 'callback_data': 'games'})
+        return self._markup(layout_type, buttons)
+
+    def _build_bet(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        texts = self._texts('bet', lang)
+        buttons = [
+            {'text': f'💰 {bet}', 'callback_data': BlackjackBet(amount=bet).pack()}
+            for bet in texts['bets']
+        ]
+        buttons.append({'text': texts['back'], 'callback_data': 'games'})
+        return self._markup(layout_type, buttons)
+
+    def _build_blackjack(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        texts = self._texts('blackjack', lang)
+        buttons = [
+            {'text': texts[0], 'callback_data': 'blackjack_hit'},
+            {'text': texts[1], 'callback_data': 'blackjack_stand'},
+            {'text': texts[2], 'callback_data': 'blackjack_hint'}
+        ]
+        return self._markup(layout_type, buttons)
+
+    def _build_roulette(self, layout_type: str, lang: str) -> InlineKeyboardMarkup:
+        # The betting grid has a fixed shape regardless of the layout setting.
+        texts = self._texts('roulette', lang)
         buttons = []
-        
+
         buttons.append([
-            InlineKeyboardButton(text=text, callback_data=f'roulette_color_{color}')
-            for text, color in zip(texts[lang]['colors'], ['red', 'black', 'green'])
+            FrozenButton(text=text, callback_data=RouletteBet(bet_type=BetType.COLOR, value=color).pack())
+            for text, color in zip(texts['colors'], ['red', 'black', 'green'])
         ])
-        
+
         buttons.append([
-            InlineKeyboardButton(text=text, callback_data=f'roulette_parity_{parity}')
-            for text, parity in zip(texts[lang]['parity'], ['even', 'odd'])
+            FrozenButton(text=text, callback_data=RouletteBet(bet_type=BetType.PARITY, value=parity).pack())
+            for text, parity in zip(texts['parity'], ['even', 'odd'])
         ])
-        
+
         buttons.append([
-            InlineKeyboardButton(text=text, callback_data=f'roulette_dozen_{i+1}')
-            for i, text in enumerate(texts[lang]['dozens'])
+            FrozenButton(text=text, callback_data=RouletteBet(bet_type=BetType.DOZEN, value=str(i + 1)).pack())
+            for i, text in enumerate(texts['dozens'])
         ])
-        
+
         buttons.append([
-            InlineKeyboardButton(text=text, callback_data=f'roulette_half_{i+1}')
-            for i, text in enumerate(texts[lang]['halves'])
+            FrozenButton(text=text, callback_data=RouletteBet(bet_type=BetType.HALF, value=str(i + 1)).pack())
+            for i, text in enumerate(texts['halves'])
         ])
-        
+
         buttons.append([
-            InlineKeyboardButton(text=texts[lang]['actions'][0], callback_data='roulette_spin'),
-            InlineKeyboardButton(text=texts[lang]['actions'][1], callback_data='games')
+            FrozenButton(text=texts['actions'][0], callback_data='roulette_spin'),
+            FrozenButton(text=texts['actions'][1], callback_data='games')
         ])
-        
-        return InlineKeyboardMarkup(inline_keyboard=buttons)
\ No newline at end of file
+
+        return FrozenKeyboard(inline_keyboard=buttons)
@@ -0,0 +1,249 @@
+import gc
+import random
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+class _Infinity:
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return other is self
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __ge__(self, other):
+        return True
+
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, next: list, width: list):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+_NIL = _Node(_Infinity(), [], [])
+
+
+class IndexableSkipList:
+    # Sorted container where every link also stores how many items it skips, so
+    # insert, remove, lookup by position and position of a value are all O(log n).
+    MAX_LEVELS = 32
+
+    def __init__(self, values: Iterable = ()):
+        self._rng = random.Random()
+        self._build(sorted(values))
+
+    def _random_level(self) -> int:
+        # Geometric with p = 1/2: one level plus the number of trailing zero bits.
+        bits = self._rng.getrandbits(self.MAX_LEVELS - 1)
+        return (bits & -bits).bit_length() if bits else self.MAX_LEVELS
+
+    def _build(self, values: list):
+        # Links pre-sorted values level by level in O(n) instead of n inserts.
+        self.size = len(values)
+        self.head = _Node(None, [_NIL] * self.MAX_LEVELS, [1] * self.MAX_LEVELS)
+        last = [self.head] * self.MAX_LEVELS
+        last_position = [0] * self.MAX_LEVELS
+        for position, value in enumerate(values, 1):
+            levels = self._random_level()
+            node = _Node(value, [_NIL] * levels, [0] * levels)
+            for level in range(levels):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(self.MAX_LEVELS):
+            last[level].width[level] = self.size + 1 - last_position[level]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int):
+        if not 0 <= index < self.size:
+            raise IndexError('skip list index out of range')
+        node = self.head
+        index += 1
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def index(self, value) -> int:
+        node = self.head
+        position = 0
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+        if node.next[0] is _NIL or node.next[0].value != value:
+            raise ValueError(f'{value!r} is not in the list')
+        return position
+
+    def islice(self, start: int, stop: int) -> Iterator:
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return
+        node = self.head
+        index = start + 1
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        for _ in range(stop - start):
+            yield node.value
+            node = node.next[0]
+
+    def insert(self, value):
+        chain = [None] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_level()
+        new_node = _Node(value, [None] * levels, [None] * levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain = [None] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is _NIL or target.value != value:
+            raise ValueError(f'{value!r} is not in the list')
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+class LeaderboardEntry:
+    __slots__ = ('user_id', 'username', 'rating', 'wins', 'games_played')
+
+    def __init__(self, user_id: int, username: str, rating: int, wins: int, games_played: int):
+        self.user_id = user_id
+        self.username = username
+        self.rating = rating
+        self.wins = wins
+        self.games_played = games_played
+
+    def to_dict(self) -> Dict:
+        return {
+            'username': self.username,
+            'rating': self.rating,
+            'wins': self.wins,
+            'games_played': self.games_played
+        }
+
+
+class Leaderboard:
+    # Players not banned, ordered by rating (highest first), ties broken by user_id.
+    # Updated on the database thread and read from the event loop, hence the lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, LeaderboardEntry] = {}
+        self._order = IndexableSkipList()
+
+    @staticmethod
+    def _key(entry: LeaderboardEntry) -> Tuple[int, int]:
+        return (-entry.rating, entry.user_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, rows: Iterable[Tuple[int, str, int, int, int]]):
+        # rows: (user_id, username, rating, wins, games_played)
+        # Creating millions of small objects would otherwise trigger repeated GC passes.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            entries = {row[0]: LeaderboardEntry(*row) for row in rows}
+            order = IndexableSkipList(self._key(entry) for entry in entries.values())
+        finally:
+            if gc_enabled:
+                gc.enable()
+        with self._lock:
+            self._entries = entries
+            self._order = order
+
+    def update(self, user_id: int, username: str, rating: int, wins: int, games_played: int,
+               is_banned: bool = False):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if is_banned:
+                if entry is not None:
+                    self._order.remove(self._key(entry))
+                    del self._entries[user_id]
+                return
+
+            if entry is None:
+                entry = LeaderboardEntry(user_id, username, rating, wins, games_played)
+                self._entries[user_id] = entry
+                self._order.insert(self._key(entry))
+                return
+
+            if entry.rating != rating:
+                self._order.remove(self._key(entry))
+                entry.rating = rating
+                self._order.insert(self._key(entry))
+            entry.username = username
+            entry.wins = wins
+            entry.games_played = games_played
+
+    def remove(self, user_id: int):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._order.remove(self._key(entry))
+
+    def top(self, limit: int = 10) -> List[LeaderboardEntry]:
+        with self._lock:
+            return [self._entries[user_id] for _, user_id in self._order.islice(0, limit)]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        # 1-based place, or None for unknown and banned players.
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return self._order.index(self._key(entry)) + 1
+
+    def around(self, user_id: int, radius: int = 1) -> List[Tuple[int, LeaderboardEntry]]:
+        # (place, entry) pairs for the player and up to `radius` neighbours on each side.
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return []
+            index = self._order.index(self._key(entry))
+            start = max(index - radius, 0)
+            return [
+                (start + offset + 1, self._entries[neighbour_id])
+                for offset, (_, neighbour_id) in enumerate(self._order.islice(start, index + radius + 1))
+            ]
@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from user_cache import UserRecord
+
+# Ledger entry types. A 'bet' row records a stake taken off the balance when it is
+# placed ahead of the outcome (roulette chips, a blackjack hand); the 'settle' row
+# carries both the stake and the payout, and then only credits the payout. A game
+# settled in one step (slots) has no 'bet' row and its 'settle' row moves both.
+BET = 'bet'
+SETTLE = 'settle'
+
+LedgerRow = Tuple[int, str, str, int, int, Optional[str], Optional[str], Optional[str], datetime]
+
+
+class Posting:
+    # What a keyed ledger write (Database.place_bet, settle_game) did. `user` is the
+    # updated user, or None if the write was refused. `replayed` means the key had been
+    # posted before and nothing changed; `payout` and `outcome` are then the stored ones,
+    # so a redelivered update can show the player what they got the first time.
+    __slots__ = ('user', 'replayed', 'payout', 'outcome')
+
+    def __init__(self, user: Optional[UserRecord], replayed: bool = False, payout: int = 0,
+                 outcome: Optional[str] = None):
+        self.user = user
+        self.replayed = replayed
+        self.payout = payout
+        self.outcome = outcome
+
+
+class LedgerWriter:
+    # Append-only buffer in front of the transactions table. Rows are written with a
+    # single executemany when the owning Database commits, so they land in the same
+    # transaction as the balance change they describe.
+    INSERT = '''
+    INSERT INTO transactions
+        (user_id, entry_type, game_type, bet_amount, win_amount, result, outcome, idempotency_key, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    '''
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.flushes = 0
+        self.rows_written = 0
+        self._rows: List[LedgerRow] = []
+        self._pending_keys: Dict[str, LedgerRow] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def append(self, user_id: int, entry_type: str, game_type: str, bet: int, payout: int,
+               result: Optional[str] = None, idempotency_key: Optional[str] = None,
+               timestamp: Optional[datetime] = None, outcome: Optional[str] = None):
+        # outcome: what the player was shown, e.g. the slot reels, kept for redeliveries.
+        row = (
+            user_id, entry_type, game_type, bet, payout, result, outcome, idempotency_key, timestamp or datetime.now()
+        )
+        self._rows.append(row)
+        if idempotency_key is not None:
+            self._pending_keys[idempotency_key] = row
+
+    def posted(self, idempotency_key: str) -> Optional[Tuple[int, Optional[str]]]:
+        # (payout, outcome) of the entry posted under the key, buffered or written; None if there is none.
+        row = self._pending_keys.get(idempotency_key)
+        if row is not None:
+            return row[4], row[6]
+        cursor = self.conn.execute(
+            'SELECT win_amount, outcome FROM transactions WHERE idempotency_key = ?', (idempotency_key,)
+        )
+        return cursor.fetchone()
+
+    def is_posted(self, idempotency_key: str) -> bool:
+        return self.posted(idempotency_key) is not None
+
+    def mark(self) -> int:
+        return len(self._rows)
+
+    def rollback_to(self, mark: int):
+        # Drops rows appended after `mark`, e.g. by a call whose savepoint was rolled back.
+        for row in self._rows[mark:]:
+            self._pending_keys.pop(row[7], None)
+        del self._rows[mark:]
+
+    def flush(self):
+        if not self._rows:
+            return
+        self.conn.executemany(self.INSERT, self._rows)
+        self.flushes += 1
+        self.rows_written += len(self._rows)
+        self._rows.clear()
+        self._pending_keys.clear()
+
+    def discard(self):
+        self._rows.clear()
+        self._pending_keys.clear()
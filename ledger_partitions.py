@@ -0,0 +1,175 @@
+import argparse
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+# The transactions table is the live partition: it only holds the current month(s).
+# Closed months are moved day by day into one SQLite file per month under the archive
+# directory, and their settlements are folded into ledger_daily on the way out, so
+# recent history reads ledger_daily plus the live partition and never the archives.
+
+ARCHIVE_COLUMNS = (
+    'id, user_id, entry_type, game_type, bet_amount, win_amount, result, idempotency_key, timestamp'
+)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def archive_path(archive_dir: str, month: str) -> str:
+    return os.path.join(archive_dir, f'transactions-{month}.db')
+
+
+def closed_days(conn: sqlite3.Connection, before: date) -> List[str]:
+    cursor = conn.execute(
+        'SELECT DISTINCT substr(timestamp, 1, 10) FROM transactions WHERE timestamp < ? ORDER BY 1',
+        (before.isoformat(),)
+    )
+    return [row[0] for row in cursor]
+
+
+def _archive_day(conn: sqlite3.Connection, path: str, day: str, until: str) -> int:
+    # Step one, committed on its own: copy the day into the month file. Re-running it
+    # replaces the day, so a crash before step two cannot duplicate archived rows.
+    conn.execute('ATTACH DATABASE ? AS archive', (path,))
+    try:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.transactions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            entry_type TEXT,
+            game_type TEXT,
+            bet_amount INTEGER,
+            win_amount INTEGER,
+            result TEXT,
+            idempotency_key TEXT,
+            timestamp TIMESTAMP
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_user_time ON transactions (user_id, timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_time ON transactions (timestamp)')
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM archive.transactions WHERE timestamp >= ? AND timestamp < ?', (day, until))
+        cursor = conn.execute(f'''
+        INSERT INTO archive.transactions ({ARCHIVE_COLUMNS})
+        SELECT {ARCHIVE_COLUMNS} FROM main.transactions WHERE timestamp >= ? AND timestamp < ?
+        ''', (day, until))
+        conn.commit()
+        return cursor.rowcount
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE archive')
+
+
+def _roll_up_day(conn: sqlite3.Connection, day: str, until: str):
+    # Step two, one transaction: fold the day's settlements and drop them from the live partition.
+    conn.execute('BEGIN')
+    try:
+        conn.execute('''
+        INSERT INTO ledger_daily (user_id, day, game_type, games, wins, wagered, paid)
+        SELECT user_id, ?, game_type, COUNT(*), COALESCE(SUM(result = 'win'), 0), SUM(bet_amount), SUM(win_amount)
+        FROM transactions
+        WHERE entry_type = 'settle' AND timestamp >= ? AND timestamp < ?
+        GROUP BY user_id, game_type
+        ON CONFLICT (user_id, day, game_type) DO UPDATE SET
+            games = games + excluded.games,
+            wins = wins + excluded.wins,
+            wagered = wagered + excluded.wagered,
+            paid = paid + excluded.paid
+        ''', (day, day, until))
+        conn.execute('DELETE FROM transactions WHERE timestamp >= ? AND timestamp < ?', (day, until))
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def archive_closed_months(conn: sqlite3.Connection, archive_dir: str, live_months: int = 1,
+                          today: Optional[date] = None) -> Dict[str, int]:
+    # Moves every month older than the last `live_months` out of the live partition.
+    # Each day is its own short transaction, so the bot keeps writing in between.
+    # Returns the number of rows archived per month.
+    today = today or date.today()
+    before = add_months(month_start(today), 1 - live_months)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    archived: Dict[str, int] = {}
+    for day in closed_days(conn, before):
+        month = day[:7]
+        until = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        path = archive_path(archive_dir, month)
+        archived[month] = archived.get(month, 0) + _archive_day(conn, path, day, until)
+        _roll_up_day(conn, day, until)
+
+    for month, rows in archived.items():
+        conn.execute('''
+        INSERT INTO ledger_partitions (month, path, rows, archived_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (month) DO UPDATE SET rows = rows + excluded.rows, archived_at = excluded.archived_at
+        ''', (month, archive_path(archive_dir, month), rows, datetime.now()))
+        conn.commit()
+    return archived
+
+
+def list_partitions(conn: sqlite3.Connection) -> List[Dict]:
+    cursor = conn.execute('SELECT month, path, rows, archived_at FROM ledger_partitions ORDER BY month')
+    return [{'month': month, 'path': path, 'rows': rows, 'archived_at': archived_at}
+            for month, path, rows, archived_at in cursor]
+
+
+def open_partition(conn: sqlite3.Connection, month: str) -> sqlite3.Connection:
+    # Read-only connection to an archived month, for audits; archives are never written again.
+    row = conn.execute('SELECT path FROM ledger_partitions WHERE month = ?', (month,)).fetchone()
+    if row is None:
+        raise KeyError(f'Ledger partition {month} is not archived')
+    return sqlite3.connect(f'file:{row[0]}?mode=ro', uri=True)
+
+
+def user_history(conn: sqlite3.Connection, user_id: int, days: int = 30,
+                 today: Optional[date] = None) -> List[Dict]:
+    # Per day and game totals for the last `days` days: closed days come from the
+    # rollups and open ones from the live partition, both through their user index.
+    since = ((today or date.today()) - timedelta(days=days - 1)).isoformat()
+    cursor = conn.execute('''
+    SELECT day, game_type, SUM(games), SUM(wins), SUM(wagered), SUM(paid)
+    FROM (
+        SELECT day, game_type, games, wins, wagered, paid
+        FROM ledger_daily
+        WHERE user_id = ? AND day >= ?
+        UNION ALL
+        SELECT substr(timestamp, 1, 10), game_type, 1, COALESCE(result = 'win', 0), bet_amount, win_amount
+        FROM transactions
+        WHERE user_id = ? AND timestamp >= ? AND entry_type = 'settle'
+    )
+    GROUP BY day, game_type
+    ORDER BY day DESC, game_type
+    ''', (user_id, since, user_id, since))
+    return [
+        {'day': day, 'game_type': game_type, 'games': games, 'wins': wins, 'wagered': wagered, 'paid': paid}
+        for day, game_type, games, wins, wagered, paid in cursor
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive closed months of the ledger into daily rollups')
+    parser.add_argument('path', nargs='?', default='casino.db')
+    parser.add_argument('--archive-dir', default='ledger_archive')
+    parser.add_argument('--live-months', type=int, default=1, help='months kept in the live partition')
+    parser.add_argument('--list', action='store_true', help='only list archived partitions')
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.path, timeout=5)
+    if not args.list:
+        for archived_month, count in archive_closed_months(connection, args.archive_dir, args.live_months).items():
+            print(f'archived {archived_month}: {count} rows')
+    for partition in list_partitions(connection):
+        print(f"{partition['month']}: {partition['rows']} rows in {partition['path']}")
+    connection.close()
@@ -6,6 +6,11 @@ messages = {
 🎮 Games played: {}
 🏆 Wins: {}
 🏅 Rating: {}''',
+    'profile_by_game': '\n\n📊 By game:',
+    'profile_game_stats': '\n{}: {} games, {:.0%} won\n   wagered {}, net {:+d}, RTP {:.1%}',
+    'game_slots': '🎰 Slots',
+    'game_roulette': '🎡 Roulette',
+    'game_blackjack': '🃏 Blackjack',
     'settings': '⚙️ Settings\n\nChoose parameters to configure:',
     'layout': '📱 Choose button layout:',
     'language': '🌍 Choose language:',
@@ -14,9 +19,11 @@ messages = {
     'registration_success': '✅ Registration successful! You can now play.',
     'already_registered': '❌ You are already registered!',
     'top_players': '🏆 Top players:\n\n{}',
+    'your_rank': '📍 Your place: {} of {}',
     'moderation_menu': '🛡️ Moderation menu',
     'user_banned': '🚫 User banned',
     'user_unbanned': '✅ User unbanned',
+    'select_game': '🎮 Choose a game:',
     'select_bet': '💰 Select your bet:',
     'blackjack_game': '''🎲 Blackjack
 
@@ -31,6 +38,10 @@ Dealer cards: {} ({}⭐️)''',
     'blackjack_lose': '😔 You lost {} coins.',
     'blackjack_draw': '🤝 Draw! Your bet has been returned.',
     'blackjack_bust': '💥 Bust! You lost {} coins.',
+    'blackjack_hint': '💡 Best move: {}\nHit: {:+.1f}% of the bet\nStand: {:+.1f}% of the bet',
+    'action_hit': 'hit',
+    'action_stand': 'stand',
+    'banned': '🚫 You are banned',
     'daily_limit_reached': '⚠️ Daily game limit reached!',
     'insufficient_balance': '⚠️ Insufficient balance for bet!',
     'game_not_found': '❌ Game not found!',
@@ -47,6 +58,7 @@ Dozens (x3)
 Halves (x2)''',
     'roulette_win': '🎉 The ball landed on {}!\nYou won {} coins!',
     'roulette_lose': '😔 The ball landed on {}. Better luck next time!',
+    'roulette_round': '🎡 The wheel spins for all players in {} s.\nYour bets: {} coins',
     'bet_placed': '✅ Bet placed!',
     'no_bets': '⚠️ Place at least one bet before spinning!',
     'slots_welcome': '''🎰 Welcome to Slots!
@@ -63,6 +75,18 @@ Select your bet:''',
     'slots_spinning': '🎰 Spinning...\n{}',
     'slots_win': '🎉 {}!\nYou won {} coins!',
     'slots_lose': '😔 {}!\nBetter luck next time!',
+    'fair_commitment': '🔐 Next round hash: {}',
+    'fair_reveal': '🔓 Server seed: {}\nClient seed: {}',
+    'fair_info': '''🔐 Provably fair mode
+
+Chain anchors and seeds handed out from them:
+🎰 Slots: {} ({})
+🃏 Blackjack: {} ({})
+🎡 Roulette table: {} ({})
+
+Before a round you see its hash, after it the server seed and the client seed, which includes your tap. Every seed hashes (SHA-256) to the one revealed before it in the same chain, back to the anchor. Check a round and replay its outcome:
+python entropy.py <game> <server seed> <client seed> --commitment <hash>''',
+    'fair_off': '🎲 Provably fair mode is off.',
     'rules': '''📜 Game Rules
 
 🎲 Blackjack:
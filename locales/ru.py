@@ -6,6 +6,11 @@ messages = {
 🎮 Игр сыграно: {}
 🏆 Побед: {}
 🏅 Рейтинг: {}''',
+    'profile_by_game': '\n\n📊 По играм:',
+    'profile_game_stats': '\n{}: игр {}, побед {:.0%}\n   ставки {}, итог {:+d}, RTP {:.1%}',
+    'game_slots': '🎰 Слоты',
+    'game_roulette': '🎡 Рулетка',
+    'game_blackjack': '🃏 Блэкджек',
     'settings': '⚙️ Настройки\n\nВыберите параметры для настройки:',
     'layout': '📱 Выберите расположение кнопок:',
     'language': '🌍 Выберите язык:',
@@ -14,9 +19,11 @@ messages = {
     'registration_success': '✅ Регистрация успешна! Теперь вы можете играть.',
     'already_registered': '❌ Вы уже зарегистрированы!',
     'top_players': '🏆 Топ игроков:\n\n{}',
+    'your_rank': '📍 Ваше место: {} из {}',
     'moderation_menu': '🛡️ Меню модерации',
     'user_banned': '🚫 Пользователь заблокирован',
     'user_unbanned': '✅ Пользователь разблокирован',
+    'select_game': '🎮 Выберите игру:',
     'select_bet': '💰 Выберите ставку:',
     'blackjack_game': '''🎲 Блэкджек
 
@@ -31,6 +38,10 @@ messages = {
     'blackjack_lose': '😔 Вы проиграли {} монет.',
     'blackjack_draw': '🤝 Ничья! Ставка возвращена.',
     'blackjack_bust': '💥 Перебор! Вы проиграли {} монет.',
+    'blackjack_hint': '💡 Лучший ход: {}\nЕщё карту: {:+.1f}% ставки\nХватит: {:+.1f}% ставки',
+    'action_hit': 'ещё карту',
+    'action_stand': 'хватит',
+    'banned': '🚫 Вы заблокированы',
     'daily_limit_reached': '⚠️ Достигнут дневной лимит игр!',
     'insufficient_balance': '⚠️ Недостаточно монет для ставки!',
     'game_not_found': '❌ Игра не найдена!',
@@ -47,6 +58,7 @@ messages = {
 Половины (x2)''',
     'roulette_win': '🎉 Шарик остановился на {}!\nВы выиграли {} монет!',
     'roulette_lose': '😔 Шарик остановился на {}. Повезёт в следующий раз!',
+    'roulette_round': '🎡 Шарик будет запущен для всех игроков через {} с.\nВаши ставки: {} монет',
     'bet_placed': '✅ Ставка принята!',
     'no_bets': '⚠️ Сделайте хотя бы одну ставку перед запуском!',
     'slots_welcome': '''🎰 Добро пожаловать в Слоты!
@@ -63,6 +75,18 @@ messages = {
     'slots_spinning': '🎰 Крутим...\n{}',
     'slots_win': '🎉 {}!\nВы выиграли {} монет!',
     'slots_lose': '😔 {}!\nПовезёт в следующий раз!',
+    'fair_commitment': '🔐 Хеш следующего раунда: {}',
+    'fair_reveal': '🔓 Серверный seed: {}\nКлиентский seed: {}',
+    'fair_info': '''🔐 Доказуемо честный режим
+
+Якоря цепочек и выдано seed из них:
+🎰 Слоты: {} ({})
+🃏 Блэкджек: {} ({})
+🎡 Стол рулетки: {} ({})
+
+До раунда вы видите его хеш, после — серверный seed и клиентский seed, в который входит ваше нажатие. Каждый seed хешируется (SHA-256) в раскрытый перед ним в той же цепочке, вплоть до якоря. Проверить раунд и повторить его исход:
+python entropy.py <игра> <серверный seed> <клиентский seed> --commitment <хеш>''',
+    'fair_off': '🎲 Доказуемо честный режим выключен.',
     'rules': '''📜 Правила игр
 
 🎲 Блэкджек:
@@ -0,0 +1,58 @@
+import importlib
+from string import Formatter
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+from user_cache import UserRecord
+
+class LocaleRegistry:
+    # Loads every locale module once at startup; resolving a user's messages is a dict lookup.
+    def __init__(self, languages: Mapping[str, str], default_language: str = 'ru'):
+        self.default_language = default_language
+        self._messages: Dict[str, Mapping[str, str]] = {}
+        self._fields: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+
+        for lang in languages:
+            messages = importlib.import_module(f'locales.{lang}').messages
+            self._messages[lang] = MappingProxyType(dict(messages))
+            self._fields[lang] = {key: self._parse(text) for key, text in messages.items()}
+
+        if default_language not in self._messages:
+            raise ValueError(f"Default language '{default_language}' is not available")
+        self._default = self._messages[default_language]
+
+        problems = self.check()
+        if problems:
+            raise ValueError('Locale check failed:\n' + '\n'.join(problems))
+
+    @staticmethod
+    def _parse(template: str) -> Tuple[str, ...]:
+        # Placeholder names in order of appearance; '' for an automatically numbered {}.
+        return tuple(field for _, field, _, _ in Formatter().parse(template) if field is not None)
+
+    def check(self) -> List[str]:
+        problems = []
+        reference = self._fields[self.default_language]
+        for lang, fields in self._fields.items():
+            for key in reference.keys() - fields.keys():
+                problems.append(f"{lang}: missing key '{key}'")
+            for key in fields.keys() - reference.keys():
+                problems.append(f"{lang}: unknown key '{key}'")
+            for key in reference.keys() & fields.keys():
+                if fields[key] != reference[key]:
+                    problems.append(
+                        f"{lang}: '{key}' placeholders {fields[key]} differ from "
+                        f"{self.default_language} {reference[key]}"
+                    )
+        return problems
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self._messages)
+
+    def get(self, lang: Optional[str]) -> Mapping[str, str]:
+        return self._messages.get(lang, self._default)
+
+    def for_user(self, user: Optional[UserRecord]) -> Mapping[str, str]:
+        if user is None:
+            return self._default
+        return self._messages.get(user.language, self._default)
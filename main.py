@@ -1,54 +1,115 @@
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import time
+from datetime import datetime
 from aiogram import Bot, Dispatcher, types
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters.command import Command
-from database import Database
-from games.blackjack import Blackjack
-from games.roulette import Roulette, BetType
+from animations import AnimationScheduler
+from database import AsyncDatabase
+from entropy import EntropyPool, FairRound, Owner, ProvablyFair, SeedChain
+from user_cache import UserCache, UserRecord
+from middlewares import UserContextMiddleware, UserLaneMiddleware
+from outbound import SendScheduler
+from sessions import SessionStore
+from localization import LocaleRegistry
+from games.blackjack import Blackjack, BlackjackGame, CARD_VALUE, HIDDEN
+from games.blackjack_strategy import BasicStrategy, HIT
+from games.roulette import BetType, Roulette, RouletteTable
 from games.slots import SlotMachine
 from keyboards import KeyboardManager
+from callbacks import CallbackRouter, SetLayout, SetLanguage, SlotsBet, RouletteBet, BlackjackBet
 from config import Config
-import importlib
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
 
 logging.basicConfig(level=logging.INFO)
+load_dotenv()
 
 config = Config()
-bot = Bot(token="TOKEN")
+# TELEGRAM_API_URL points the bot at a local Bot API server (or a fake one in tests).
+bot = Bot(
+    token=os.getenv('TELEGRAM_API_TOKEN'),
+    session=AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL)) if config.BOT_API_URL else None
+)
+send_scheduler = SendScheduler(
+    config.OUTBOUND_GLOBAL_RATE, config.OUTBOUND_CHAT_RATE, config.OUTBOUND_CHAT_BURST,
+    config.OUTBOUND_GROUP_RATE, config.OUTBOUND_GROUP_BURST, config.OUTBOUND_MAX_RETRIES
+)
+bot.session.middleware(send_scheduler)
 dp = Dispatcher()
-db = Database()
-kb = KeyboardManager()
-blackjack_games = {}
-roulette_games = {}
-slot_machines = {}
-
-def get_locale(user_id: int):
-    user = db.get_user(user_id)
-    if not user:
-        return importlib.import_module('locales.ru').messages
-    return importlib.import_module(f'locales.{user["language"]}').messages
+callbacks = CallbackRouter()
+db = AsyncDatabase(
+    config.DATABASE_PATH,
+    group_commit_window=config.DB_GROUP_COMMIT_WINDOW,
+    group_commit_max=config.DB_GROUP_COMMIT_MAX,
+    user_cache=UserCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL),
+    daily_limit=config.MAX_DAILY_GAMES
+)
+user_lanes = UserLaneMiddleware()
+dp.update.outer_middleware(user_lanes)
+dp.update.outer_middleware(UserContextMiddleware(db))
+kb = KeyboardManager(config.AVAILABLE_LANGUAGES, config.DEFAULT_LANGUAGE)
+locales = LocaleRegistry(config.AVAILABLE_LANGUAGES, config.DEFAULT_LANGUAGE)
+# Hands in play; idle or surplus ones wait in the database until their player returns.
+blackjack_sessions = SessionStore(
+    'blackjack', db, BlackjackGame.snapshot, BlackjackGame.restore, config.SESSION_TTL, config.SESSION_MAX
+)
+# Every game draws from one CSPRNG buffer; in provably fair mode a round draws from its own seeds.
+rng = EntropyPool(config.RNG_POOL_BYTES)
+
+def record_fair_round(fair_round: FairRound):
+    db.record_fair_round(fair_round.key, fair_round.game_type, fair_round.user_id, fair_round.chain,
+                         fair_round.commitment, fair_round.server_seed, fair_round.client_seed)
+
+fairness = ProvablyFair(
+    rng, config.FAIR_CHAIN_LENGTH, config.PROVABLY_FAIR, config.SESSION_MAX, on_open=record_fair_round
+)
+# Every player has a chain per game; the shared roulette table has one kept in the database.
+ROULETTE_OWNER = ('roulette', 0)
+# Ids of the taps that placed the open round's chips, mixed into its client seed.
+roulette_taps = []
+blackjack = Blackjack(
+    config.BLACKJACK_DECKS, config.BLACKJACK_PENETRATION, rng, games=blackjack_sessions,
+    fresh_shoes=config.PROVABLY_FAIR,
+    game_rng=lambda game: FairRound.restore(game.fair).stream() if game.fair else None
+)
+# Solved once at startup for the table's rules; a hint is then a dict lookup.
+blackjack_strategy = BasicStrategy(blackjack.rules)
+roulette_table = RouletteTable(Roulette(rng))
+# Message to update with the result, per player with bets in the current round
+roulette_messages = {}
+# Spins carry no per-player state, so every player shares one machine.
+slot_machine = SlotMachine(rng)
+animations = AnimationScheduler(
+    config.ANIMATION_FRAME_INTERVAL, config.ANIMATION_CHAT_INTERVAL, config.ANIMATION_MAX_ACTIVE
+)
 
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    user = db.get_user(message.from_user.id)
+async def cmd_start(message: types.Message, user: Optional[UserRecord]):
     if not user:
-        locale = get_locale(message.from_user.id)
+        locale = locales.for_user(user)
         await message.answer(
             locale['registration_required'],
             reply_markup=None
         )
         return
 
-    locale = get_locale(message.from_user.id)
+    locale = locales.for_user(user)
     await message.answer(
         locale['welcome'],
-        reply_markup=kb.get_main_keyboard(user['layout_type'], user['language'])
+        reply_markup=kb.get_main_keyboard(user.layout_type, user.language)
     )
 
 @dp.message(Command("register"))
-async def cmd_register(message: types.Message):
+async def cmd_register(message: types.Message, user: Optional[UserRecord]):
     args = message.text.split()
-    locale = get_locale(message.from_user.id)
+    locale = locales.for_user(user)
     
     if len(args) < 2:
         await message.answer(
@@ -59,14 +120,14 @@ async def cmd_register(message: types.Message):
 
     username = args[1]
     
-    if db.is_registered(message.from_user.id):
+    if user:
         await message.answer(
             locale['already_registered'],
             reply_markup=None
         )
         return
 
-    if db.register_user(message.from_user.id, username):
+    if await db.register_user(message.from_user.id, username):
         await message.answer(
             locale['registration_success'],
             reply_markup=kb.get_main_keyboard('vertical', 'ru')
@@ -83,322 +144,637 @@ async def cmd_register(message: types.Message):
             reply_markup=None
         )
 
+@dp.message(Command("fair"))
+async def cmd_fair(message: types.Message, user: Optional[UserRecord]):
+    locale = locales.for_user(user)
+    if not fairness.enabled:
+        return await message.answer(locale['fair_off'])
+    # Starts the player's chains if they have not played yet.
+    slots = fairness.chain(('slots', message.from_user.id))
+    hands = fairness.chain(('blackjack', message.from_user.id))
+    table = await roulette_chain()
+    await message.answer(locale['fair_info'].format(
+        slots.anchor, slots.used, hands.anchor, hands.used, table.anchor, table.used
+    ))
+
+async def roulette_chain() -> SeedChain:
+    # Every webhook worker spins from the chain in the database: catch up with it.
+    root, length, used = await db.fair_chain('roulette', fairness.pool.randbytes(32), fairness.chain_length)
+    return fairness.adopt(ROULETTE_OWNER, root, length, used)
+
+def fair_commitment(locale, owner: Owner) -> str:
+    # In provably fair mode, the hash of the owner's next round for the end of a message.
+    commitment = fairness.commitment(owner)
+    return '' if commitment is None else '\n\n' + locale['fair_commitment'].format(commitment)
+
+def fair_result(locale, fair_round: Optional[FairRound], owner: Owner) -> str:
+    if fair_round is None:
+        return ''
+    reveal = locale['fair_reveal'].format(fair_round.server_seed, fair_round.client_seed)
+    return '\n\n' + reveal + fair_commitment(locale, owner)
+
+async def roulette_commitment(locale) -> str:
+    if fairness.enabled:
+        await roulette_chain()
+    return fair_commitment(locale, ROULETTE_OWNER)
+
+async def stored_fair_round(key: str) -> Optional[FairRound]:
+    # The round that decided an already settled ledger entry, to reveal it again.
+    if not fairness.enabled:
+        return None
+    row = await db.get_fair_round(key)
+    return FairRound(*row) if row else None
+
 @dp.callback_query()
-async def handle_callback(callback: types.CallbackQuery):
-    user_id = callback.from_user.id
-    user = db.get_user(user_id)
+async def handle_callback(callback: types.CallbackQuery, user: Optional[UserRecord]):
+    locale = locales.for_user(user)
     
     if not user:
-        locale = get_locale(user_id)
         await callback.answer(locale['registration_required'], show_alert=True)
         return
 
-    if db.is_banned(user_id):
-        await callback.answer("🚫 Вы заблокированы", show_alert=True)
+    if user.is_banned:
+        await callback.answer(locale['banned'], show_alert=True)
         return
 
-    locale = get_locale(user_id)
+    # Route handlers return the result of callback.answer() when they answered themselves
+    answered = None
     try:
-        # Profile button
-        if callback.data == 'profile':
-            await callback.message.edit_text(
-                locale['profile'].format(
-                    user['balance'],
-                    user['games_played'],
-                    user['wins'],
-                    user['rating']
-                ),
-                reply_markup=kb.get_main_keyboard(user['layout_type'], user['language'])
+        answered = await callbacks.dispatch(callback, user=user, locale=locale)
+    except Exception as e:
+        if isinstance(e, TelegramBadRequest) and "message is not modified" in str(e):
+            pass
+        elif isinstance(e, TelegramRetryAfter):
+            # The game is already settled; only the message update hit the flood limit.
+            logging.warning(f"Flood limit while answering callback {callback.data}: {e}")
+        else:
+            logging.error(f"Error in callback handler: {e}")
+            answered = await callback.answer(locale['error_occurred'], show_alert=True)
+
+    if not answered:
+        await callback.answer()
+
+# Profile button
+@callbacks.exact('profile')
+async def show_profile(callback: types.CallbackQuery, user: UserRecord, locale):
+    text = locale['profile'].format(
+        user.balance,
+        user.games_played,
+        user.wins,
+        user.rating
+    )
+    played = [stats for stats in (await db.get_game_stats(user.user_id)).values() if stats.games]
+    if played:
+        text += locale['profile_by_game'] + ''.join(
+            locale['profile_game_stats'].format(
+                locale[f'game_{stats.game_type}'], stats.games, stats.win_rate, stats.wagered, stats.net, stats.rtp
             )
+            for stats in played
+        )
+    await callback.message.edit_text(
+        text,
+        reply_markup=kb.get_main_keyboard(user.layout_type, user.language)
+    )
 
-        # Games menu
-        elif callback.data == 'games':
-            await callback.message.edit_text(
-                "🎮 Выберите игру:",
-                reply_markup=kb.get_games_keyboard(user['layout_type'], user['language'])
-            )
+# Games menu
+@callbacks.exact('games')
+async def show_games(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['select_game'],
+        reply_markup=kb.get_games_keyboard(user.layout_type, user.language)
+    )
 
-        # Settings menu
-        elif callback.data == 'settings':
-            await callback.message.edit_text(
-                locale['settings'],
-                reply_markup=kb.get_settings_keyboard(user['layout_type'], user['language'])
-            )
+# Settings menu
+@callbacks.exact('settings')
+async def show_settings(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['settings'],
+        reply_markup=kb.get_settings_keyboard(user.layout_type, user.language)
+    )
 
-        # Layout settings
-        elif callback.data == 'layout_settings':
-            await callback.message.edit_text(
-                locale['layout'],
-                reply_markup=kb.get_layout_keyboard(user['layout_type'], user['language'])
-            )
+# Layout settings
+@callbacks.exact('layout_settings')
+async def show_layout_settings(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['layout'],
+        reply_markup=kb.get_layout_keyboard(user.layout_type, user.language)
+    )
 
-        # Change layout
-        elif callback.data.startswith('set_layout_'):
-            layout = callback.data.replace('set_layout_', '')
-            db.update_settings(user_id, layout_type=layout)
-            await callback.message.edit_text(
-                locale['layout'],
-                reply_markup=kb.get_layout_keyboard(layout, user['language'])
-            )
+# Change layout
+@callbacks.prefix(SetLayout)
+async def set_layout(callback: types.CallbackQuery, user: UserRecord, locale, callback_data: SetLayout):
+    await db.update_settings(user.user_id, layout_type=callback_data.layout)
+    await callback.message.edit_text(
+        locale['layout'],
+        reply_markup=kb.get_layout_keyboard(callback_data.layout, user.language)
+    )
 
-        # Language settings
-        elif callback.data == 'language_settings':
-            await callback.message.edit_text(
-                locale['language'],
-                reply_markup=kb.get_language_keyboard(user['language'])
-            )
+# Language settings
+@callbacks.exact('language_settings')
+async def show_language_settings(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['language'],
+        reply_markup=kb.get_language_keyboard(user.language)
+    )
 
-        # Change language
-        elif callback.data.startswith('set_lang_'):
-            lang = callback.data.replace('set_lang_', '')
-            db.update_settings(user_id, language=lang)
-            locale = get_locale(user_id)
-            await callback.message.edit_text(
-                locale['settings'],
-                reply_markup=kb.get_settings_keyboard(user['layout_type'], lang)
-            )
+# Change language
+@callbacks.prefix(SetLanguage)
+async def set_language(callback: types.CallbackQuery, user: UserRecord, locale, callback_data: SetLanguage):
+    user = await db.update_settings(user.user_id, language=callback_data.lang)
+    locale = locales.for_user(user)
+    await callback.message.edit_text(
+        locale['settings'],
+        reply_markup=kb.get_settings_keyboard(user.layout_type, callback_data.lang)
+    )
 
-        # Rating
-        elif callback.data == 'rating':
-            top_players = db.get_top_players(10)
-            top_text = "\n".join(
-                f"{i+1}. {player['username']} - {player['rating']} 🏆"
-                for i, player in enumerate(top_players)
-            )
-            await callback.message.edit_text(
-                locale['top_players'].format(top_text),
-                reply_markup=kb.get_main_keyboard(user['layout_type'], user['language'])
-            )
+# Rating
+@callbacks.exact('rating')
+async def show_rating(callback: types.CallbackQuery, user: UserRecord, locale):
+    top_players = await db.get_top_players(10)
+    top_text = "\n".join(
+        f"{i+1}. {player['username']} - {player['rating']} 🏆"
+        for i, player in enumerate(top_players)
+    )
 
-        # Rules
-        elif callback.data == 'rules':
-            await callback.message.edit_text(
-                locale['rules'],
-                reply_markup=kb.get_main_keyboard(user['layout_type'], user['language'])
+    neighbours = await db.get_rank(user.user_id)
+    place = next((player['place'] for player in neighbours if player['user_id'] == user.user_id), None)
+    if place is not None:
+        if place > len(top_players):
+            top_text += "\n...\n" + "\n".join(
+                f"{player['place']}. {player['username']} - {player['rating']} 🏆"
+                for player in neighbours
+                if player['place'] > len(top_players)
             )
+        top_text += "\n\n" + locale['your_rank'].format(place, await db.count_ranked_players())
+    await callback.message.edit_text(
+        locale['top_players'].format(top_text),
+        reply_markup=kb.get_main_keyboard(user.layout_type, user.language)
+    )
 
-        # Main menu
-        elif callback.data == 'main_menu':
-            await callback.message.edit_text(
-                locale['welcome'],
-                reply_markup=kb.get_main_keyboard(user['layout_type'], user['language'])
-            )
+# Rules
+@callbacks.exact('rules')
+async def show_rules(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['rules'],
+        reply_markup=kb.get_main_keyboard(user.layout_type, user.language)
+    )
 
-        # Slots game
-        elif callback.data == 'slots':
-            if not db.check_daily_limit(user_id):
-                await callback.answer(locale['daily_limit_reached'], show_alert=True)
-                return
+# Main menu
+@callbacks.exact('main_menu')
+async def show_main_menu(callback: types.CallbackQuery, user: UserRecord, locale):
+    await callback.message.edit_text(
+        locale['welcome'],
+        reply_markup=kb.get_main_keyboard(user.layout_type, user.language)
+    )
 
-            if user_id not in slot_machines:
-                slot_machines[user_id] = SlotMachine()
+# Slots game
+@callbacks.exact('slots')
+async def open_slots(callback: types.CallbackQuery, user: UserRecord, locale):
+    if not await db.check_daily_limit(user.user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
 
-            await callback.message.edit_text(
-                locale['slots_welcome'],
-                reply_markup=kb.get_slots_keyboard(user['layout_type'], user['language'])
-            )
+    await callback.message.edit_text(
+        locale['slots_welcome'] + fair_commitment(locale, ('slots', user.user_id)),
+        reply_markup=kb.get_slots_keyboard(user.layout_type, user.language)
+    )
 
-        # Slots bet
-        elif callback.data.startswith('slots_bet_'):
-            bet = int(callback.data.replace('slots_bet_', ''))
-            
-            if user['balance'] < bet:
-                await callback.answer(locale['insufficient_balance'], show_alert=True)
-                return
-                
-            game = slot_machines[user_id]
-            db.update_balance(user_id, -bet)
-            
-            # Animate spinning
-            msg = await callback.message.edit_text(
-                locale['slots_spinning'].format('🎰 | 🎰 | 🎰')
-            )
-            
-            for frame in game.get_animation_frames():
-                await asyncio.sleep(0.5)
-                await msg.edit_text(locale['slots_spinning'].format(frame))
-            
-            # Final result
-            result, win_amount = game.spin(bet)
-            result_display = ' '.join(s.emoji for s in result)
-            
-            if win_amount > 0:
-                db.update_balance(user_id, win_amount)
-                db.update_stats(user_id, 'win')
-                await msg.edit_text(
-                    locale['slots_win'].format(result_display, win_amount),
-                    reply_markup=kb.get_slots_keyboard(user['layout_type'], user['language'])
-                )
-            else:
-                db.update_stats(user_id, 'lose')
-                await msg.edit_text(
-                    locale['slots_lose'].format(result_display),
-                    reply_markup=kb.get_slots_keyboard(user['layout_type'], user['language'])
-                )
-
-        # Roulette game
-        elif callback.data == 'roulette':
-            if not db.check_daily_limit(user_id):
-                await callback.answer(locale['daily_limit_reached'], show_alert=True)
-                return
-
-            if user_id not in roulette_games:
-                roulette_games[user_id] = Roulette()
+# Slots bet
+@callbacks.prefix(SlotsBet)
+async def play_slots(callback: types.CallbackQuery, user: UserRecord, locale, callback_data: SlotsBet):
+    bet = callback_data.amount
+    
+    if user.balance < bet:
+        return await callback.answer(locale['insufficient_balance'], show_alert=True)
+    if not await db.check_daily_limit(user.user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
+        
+    game = slot_machine
+    key = f'settle:{callback.id}'
+    # The tap's callback id goes into the client seed; the hash published before it cannot foresee it.
+    fair_round = fairness.open(('slots', user.user_id), key, f'{user.user_id}:{callback.id}', user.user_id)
+    with fairness.use(fair_round):
+        result, win_amount = game.spin(bet)
+    result_display = ' '.join(s.emoji for s in result)
+    settled = await db.settle_game(
+        user.user_id, 'slots', bet, win_amount, 'win' if win_amount > 0 else 'lose',
+        idempotency_key=key, outcome=result_display
+    )
+    if settled.user is None:
+        return await callback.answer(locale['insufficient_balance'], show_alert=True)
+
+    if settled.replayed:
+        # A redelivered tap: the spin above was never settled, so its seed is not spent
+        # and the player sees the spin that was.
+        fairness.release(('slots', user.user_id), fair_round)
+        if settled.outcome is None:
+            return
+        result_display, win_amount = settled.outcome, settled.payout
+        fair_round = await stored_fair_round(key)
+
+    if win_amount > 0:
+        text = locale['slots_win'].format(result_display, win_amount)
+    else:
+        text = locale['slots_lose'].format(result_display)
+    text += fair_result(locale, fair_round, ('slots', user.user_id))
+    if settled.replayed:
+        return await callback.message.edit_text(
+            text, reply_markup=kb.get_slots_keyboard(user.layout_type, user.language)
+        )
 
-            await callback.message.edit_text(
-                locale['roulette_welcome'],
-                reply_markup=kb.get_roulette_keyboard(user['layout_type'], user['language'])
-            )
+    # The spin is settled; the animation plays in the background and ends on the result.
+    frames = ['🎰 | 🎰 | 🎰'] + game.get_animation_frames()
+    animations.submit(
+        callback.message,
+        [locale['slots_spinning'].format(frame) for frame in frames],
+        text,
+        kb.get_slots_keyboard(user.layout_type, user.language)
+    )
+
+# Roulette game
+@callbacks.exact('roulette')
+async def open_roulette(callback: types.CallbackQuery, user: UserRecord, locale):
+    if not await db.check_daily_limit(user.user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
+
+    await callback.message.edit_text(
+        locale['roulette_welcome'] + await roulette_commitment(locale),
+        reply_markup=kb.get_roulette_keyboard(user.layout_type, user.language)
+    )
+
+# Roulette bets go on the shared table and are settled when its round closes
+@callbacks.prefix(RouletteBet)
+async def place_roulette_bet(callback: types.CallbackQuery, user: UserRecord, locale, callback_data: RouletteBet):
+    if (callback_data.bet_type, callback_data.value) not in roulette_table.position_index:
+        return
+    if not await db.check_daily_limit(user.user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
+    # The chip is paid for as it is placed; the round's settlement only pays out.
+    staked = await db.place_bet(user.user_id, 'roulette', 10, idempotency_key=f'bet:{callback.id}')
+    if staked.user is None:
+        return await callback.answer(locale['insufficient_balance'], show_alert=True)
+    if staked.replayed:
+        # A redelivered tap: its chip is already on the table.
+        return await callback.answer(locale['bet_placed'])
+
+    roulette_table.place_bet(user.user_id, callback_data.bet_type, callback_data.value, 10)
+    roulette_messages[user.user_id] = callback.message
+    if fairness.enabled:
+        roulette_taps.append(callback.id)
+    return await callback.answer(locale['bet_placed'])
+
+# Roulette spin: the wheel turns for everyone once the round closes
+@callbacks.exact('roulette_spin')
+async def spin_roulette(callback: types.CallbackQuery, user: UserRecord, locale):
+    stake = roulette_table.stake(user.user_id)
+    if not stake:
+        return await callback.answer(locale['no_bets'], show_alert=True)
+
+    seconds = max(int(roulette_table.closes_at - asyncio.get_running_loop().time()), 0)
+    return await callback.answer(
+        locale['roulette_round'].format(seconds, stake) + await roulette_commitment(locale), show_alert=True
+    )
 
-        # Roulette bets
-        elif callback.data.startswith('roulette_'):
-            if user_id not in roulette_games:
-                roulette_games[user_id] = Roulette()
-
-            game = roulette_games[user_id]
-            action = callback.data.replace('roulette_', '')
-
-            if action == 'spin':
-                if not game.get_active_bets(user_id):
-                    await callback.answer(locale['no_bets'], show_alert=True)
-                    return
-
-                result, win_amount = game.spin(user_id)
-                if win_amount > 0:
-                    db.update_balance(user_id, win_amount)
-                    db.update_stats(user_id, 'win')
-                    await callback.message.edit_text(
-                        locale['roulette_win'].format(str(result), win_amount),
-                        reply_markup=kb.get_roulette_keyboard(user['layout_type'], user['language'])
-                    )
-                else:
-                    db.update_stats(user_id, 'lose')
-                    await callback.message.edit_text(
-                        locale['roulette_lose'].format(str(result)),
-                        reply_markup=kb.get_roulette_keyboard(user['layout_type'], user['language'])
-                    )
-            else:
-                bet_parts = action.split('_')
-                if len(bet_parts) == 2:
-                    bet_type, value = bet_parts
-                    if game.place_bet(user_id, BetType[bet_type.upper()], value, 10):
-                        await callback.answer(locale['bet_placed'])
-
-        # Blackjack game
-        elif callback.data == 'blackjack':
-            if not db.check_daily_limit(user_id):
-                await callback.answer(locale['daily_limit_reached'], show_alert=True)
-                return
+async def announce_roulette(message: types.Message, user: Optional[UserRecord], number, payout: int,
+                            fair_round: Optional[FairRound]):
+    locale = locales.for_user(user)
+    if user is None:
+        text = locale['insufficient_balance']
+    elif payout > 0:
+        text = locale['roulette_win'].format(str(number), payout)
+    else:
+        text = locale['roulette_lose'].format(str(number))
+    text += fair_result(locale, fair_round, ROULETTE_OWNER)
+    layout_type, lang = (user.layout_type, user.language) if user else ('vertical', config.DEFAULT_LANGUAGE)
+    await message.edit_text(text, reply_markup=kb.get_roulette_keyboard(layout_type, lang))
+
+def reopen_roulette(table: RouletteTable, taps: List[str], messages: Dict[int, types.Message]):
+    # Puts the bets of a round that could not be spun back on the open one.
+    for user_id, bets in table.open_bets().items():
+        for bet_type, value, amount in bets:
+            roulette_table.place_bet(user_id, bet_type, value, amount)
+        if user_id in messages:
+            roulette_messages.setdefault(user_id, messages[user_id])
+    roulette_taps[:0] = taps
+
+async def run_roulette_table():
+    # One spin per round for every player at the table, settled as a single database batch.
+    # Rounds close on wall clock multiples of the round length and are numbered by that
+    # time in milliseconds, so a restarted bot never reuses the settlement keys of a round.
+    loop = asyncio.get_running_loop()
+    closes = 0.0
+    while True:
+        # Past the previous close even if the sleep woke up a little early.
+        closes = (max(time.time(), closes) // config.ROULETTE_ROUND_SECONDS + 1) * config.ROULETTE_ROUND_SECONDS
+        roulette_table.closes_at = loop.time() + closes - time.time()
+        await asyncio.sleep(roulette_table.closes_at - loop.time())
+        if not roulette_table.players:
+            continue
+
+        round_id = roulette_table.round_id = round(closes * 1000)
+        # The round's chips, taps and messages; later ones belong to the next round.
+        table = roulette_table.close()
+        taps = list(roulette_taps)
+        roulette_taps.clear()
+        messages = dict(roulette_messages)
+        roulette_messages.clear()
+        fair_round = seed = recorded = None
+        try:
+            if fairness.enabled:
+                # The table's next seed, with the taps of every chip on it as the client seed.
+                chain = await roulette_chain()
+                seed = (chain.root, chain.used)
+                taps_hash = hashlib.sha256(' '.join(taps).encode()).hexdigest()
+                client_seed = f'roulette:{round_id}:{taps_hash}'
+                fair_round = FairRound('roulette', f'roulette:{round_id}', None, chain.anchor,
+                                       chain.seed(chain.used).hex(), client_seed)
+                recorded = (fair_round.key, fair_round.game_type, None, fair_round.chain,
+                            fair_round.commitment, fair_round.server_seed, fair_round.client_seed)
+            with fairness.use(fair_round):
+                number = table.draw()
+            # Webhook workers share the wheel: whoever closes the round first decides the
+            # number and spends the seed, and the others reveal that round instead of theirs.
+            number, recorded = await db.spin_roulette_round(round_id, number, recorded, seed)
+        except (Exception, asyncio.CancelledError) as error:
+            # The chips are paid for: they stay on the table for the next round, or for the
+            # snapshot taken at shutdown.
+            reopen_roulette(table, taps, messages)
+            if isinstance(error, asyncio.CancelledError):
+                raise
+            logging.exception("Failed to spin roulette round %d", round_id)
+            continue
+        if recorded is not None:
+            fair_round = FairRound(*recorded)
+            try:
+                # The next commitment shown with the result is the seed after the spent one.
+                await roulette_chain()
+            except Exception:
+                logging.exception("Failed to read the roulette chain")
+        round_result = table.spin(number)
+        try:
+            postings = await db.settle_round('roulette', [
+                (user_id, stake, payout, 'win' if payout > 0 else 'lose', f'roulette:{round_id}:{user_id}')
+                for user_id, stake, payout in round_result.settlements
+            ], staked=True)
+        except Exception:
+            logging.exception("Failed to settle roulette round %d", round_id)
+            continue
+
+        announcements = [
+            announce_roulette(messages[user_id], settled.user, round_result.number, settled.payout, fair_round)
+            for (user_id, _, _), settled in zip(round_result.settlements, postings)
+            if user_id in messages
+        ]
+        for error in await asyncio.gather(*announcements, return_exceptions=True):
+            if isinstance(error, Exception):
+                logging.error(f"Failed to announce roulette round {round_id}: {error}")
+
+# Blackjack game
+@callbacks.exact('blackjack')
+async def open_blackjack(callback: types.CallbackQuery, user: UserRecord, locale):
+    if not await db.check_daily_limit(user.user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
+
+    await callback.message.edit_text(
+        locale['select_bet'] + fair_commitment(locale, ('blackjack', user.user_id)),
+        reply_markup=kb.get_bet_keyboard(user.layout_type, user.language)
+    )
 
+# Blackjack bet
+@callbacks.prefix(BlackjackBet)
+async def start_blackjack(callback: types.CallbackQuery, user: UserRecord, locale, callback_data: BlackjackBet):
+    user_id = user.user_id
+    bet = callback_data.amount
+    
+    if not await db.check_daily_limit(user_id):
+        return await callback.answer(locale['daily_limit_reached'], show_alert=True)
+    # The stake leaves the balance as the hand is dealt; settling it only pays out.
+    staked = await db.place_bet(user_id, 'blackjack', bet, idempotency_key=f'bet:{callback.id}')
+    if staked.user is None:
+        return await callback.answer(locale['insufficient_balance'], show_alert=True)
+    if staked.replayed:
+        # A redelivered tap: the hand was dealt the first time; show it if it is still in play.
+        game = await blackjack_sessions.load(user_id)
+        if game is not None:
             await callback.message.edit_text(
-                locale['select_bet'],
-                reply_markup=kb.get_bet_keyboard(user['layout_type'], user['language'])
+                blackjack_hand_text(locale, game),
+                reply_markup=kb.get_blackjack_keyboard(user.layout_type, user.language)
             )
+        return
 
-        # Blackjack bet
-        elif callback.data.startswith('bet_'):
-            bet = int(callback.data.replace('bet_', ''))
-            
-            if user['balance'] < bet:
-                await callback.answer(locale['insufficient_balance'], show_alert=True)
-                return
-
-            game = Blackjack()
-            blackjack_games[user_id] = game
-            player_cards, dealer_cards, is_blackjack, win_amount = game.start_game(user_id, bet)
-            
-            if is_blackjack:
-                db.update_balance(user_id, win_amount)
-                db.update_stats(user_id, 'win')
-                await callback.message.edit_text(
-                    locale['blackjack_win'].format(win_amount),
-                    reply_markup=kb.get_games_keyboard(user['layout_type'], user['language'])
-                )
-            else:
-                player_value = game.calculate_hand(game.player_hands[user_id])
-                dealer_card = str(game.dealer_hand[0])
-                await callback.message.edit_text(
-                    locale['blackjack_game'].format(
-                        ' '.join(str(card) for card in player_cards),
-                        player_value,
-                        f"{dealer_card} 🂠",
-                        bet
-                    ),
-                    reply_markup=kb.get_blackjack_keyboard(user['layout_type'], user['language'])
-                )
-
-        # Blackjack actions
-        elif callback.data.startswith('blackjack_'):
-            game = blackjack_games.get(user_id)
-            if not game:
-                await callback.answer(locale['game_not_found'], show_alert=True)
-                return
-
-            action = callback.data.replace('blackjack_', '')
-            
-            if action == 'hit':
-                player_cards, hand_value, is_bust = game.hit(user_id)
-                
-                if is_bust:
-                    bet = game.bets[user_id]
-                    db.update_balance(user_id, -bet)
-                    db.update_stats(user_id, 'lose')
-                    await callback.message.edit_text(
-                        locale['blackjack_bust'].format(bet),
-                        reply_markup=kb.get_games_keyboard(user['layout_type'], user['language'])
-                    )
-                    del blackjack_games[user_id]
-                else:
-                    dealer_card = str(game.dealer_hand[0])
-                    await callback.message.edit_text(
-                        locale['blackjack_game'].format(
-                            ' '.join(str(card) for card in player_cards),
-                            hand_value,
-                            f"{dealer_card} 🂠",
-                            game.bets[user_id]
-                        ),
-                        reply_markup=kb.get_blackjack_keyboard(user['layout_type'], user['language'])
-                    )
-                    
-            elif action == 'stand':
-                player_cards, dealer_cards, player_value, dealer_value, win_amount = game.stand(user_id)
-                
-                result_text = locale['blackjack_result'].format(
-                    ' '.join(str(card) for card in player_cards),
-                    player_value,
-                    ' '.join(str(card) for card in dealer_cards),
-                    dealer_value
-                )
-
-                if win_amount > game.bets[user_id]:
-                    db.update_balance(user_id, win_amount)
-                    db.update_stats(user_id, 'win')
-                    result_text += '\n' + locale['blackjack_win'].format(win_amount)
-                elif win_amount == game.bets[user_id]:
-                    db.update_balance(user_id, win_amount)
-                    result_text += '\n' + locale['blackjack_draw']
-                else:
-                    db.update_balance(user_id, -game.bets[user_id])
-                    db.update_stats(user_id, 'lose')
-                    result_text += '\n' + locale['blackjack_lose'].format(game.bets[user_id])
-                
-                await callback.message.edit_text(
-                    result_text,
-                    reply_markup=kb.get_games_keyboard(user['layout_type'], user['language'])
-                )
-                del blackjack_games[user_id]
+    # A new hand replaces any unfinished one, in memory or snapshotted.
+    blackjack_sessions.discard(user_id)
+    # With fairness on, every hand gets a fresh shoe shuffled from the round's seeds.
+    fair_round = fairness.open(('blackjack', user_id), f'bet:{callback.id}', f'{user_id}:{callback.id}', user_id)
+    with fairness.use(fair_round):
+        game = blackjack.start_game(user_id, bet)
+    if fair_round is not None:
+        game.fair = fair_round.snapshot()
+    
+    if game.result == 'blackjack':
+        settled = await db.settle_game(
+            user_id, 'blackjack', bet, game.win_amount, 'win',
+            idempotency_key=f'settle:{callback.id}', staked=True
+        )
+        if settled.user is None:
+            return await callback.answer(locale['insufficient_balance'], show_alert=True)
+        await callback.message.edit_text(
+            locale['blackjack_win'].format(game.win_amount) + fair_result(locale, fair_round, ('blackjack', user_id)),
+            reply_markup=kb.get_games_keyboard(user.layout_type, user.language)
+        )
+    else:
+        await callback.message.edit_text(
+            blackjack_hand_text(locale, game),
+            reply_markup=kb.get_blackjack_keyboard(user.layout_type, user.language)
+        )
 
-    except Exception as e:
-        if isinstance(e, TelegramBadRequest) and "message is not modified" in str(e):
-            pass
+def blackjack_hand_text(locale, game: BlackjackGame) -> str:
+    return locale['blackjack_game'].format(
+        game.player.text,
+        game.player.total,
+        f"{game.dealer_up_card} {HIDDEN}",
+        game.bet
+    )
+
+def fair_blackjack_result(locale, game: BlackjackGame) -> str:
+    return fair_result(locale, FairRound.restore(game.fair) if game.fair else None, ('blackjack', game.user_id))
+
+# Blackjack hit
+@callbacks.exact('blackjack_hit')
+async def blackjack_hit(callback: types.CallbackQuery, user: UserRecord, locale):
+    user_id = user.user_id
+    if not await blackjack_sessions.load(user_id):
+        return await callback.answer(locale['game_not_found'], show_alert=True)
+
+    game = blackjack.hit(user_id)
+    
+    if game.result != 'playing':
+        # Bust now, or earlier with a settlement that did not go through.
+        await settle_blackjack(callback, user, locale, game)
+    else:
+        await callback.message.edit_text(
+            blackjack_hand_text(locale, game),
+            reply_markup=kb.get_blackjack_keyboard(user.layout_type, user.language)
+        )
+
+# Blackjack hint
+@callbacks.exact('blackjack_hint')
+async def blackjack_hint(callback: types.CallbackQuery, user: UserRecord, locale):
+    game = await blackjack_sessions.load(user.user_id)
+    if not game:
+        return await callback.answer(locale['game_not_found'], show_alert=True)
+
+    hint = blackjack_strategy.hint(game.player.total, game.player.is_soft, CARD_VALUE[game.dealer.cards[0]])
+    return await callback.answer(locale['blackjack_hint'].format(
+        locale['action_hit'] if hint.action == HIT else locale['action_stand'],
+        hint.hit_ev * 100,
+        hint.stand_ev * 100
+    ), show_alert=True)
+
+# Blackjack stand
+@callbacks.exact('blackjack_stand')
+async def blackjack_stand(callback: types.CallbackQuery, user: UserRecord, locale):
+    user_id = user.user_id
+    if not await blackjack_sessions.load(user_id):
+        return await callback.answer(locale['game_not_found'], show_alert=True)
+
+    game = blackjack.stand(user_id)
+    await settle_blackjack(callback, user, locale, game)
+
+async def settle_blackjack(callback: types.CallbackQuery, user: UserRecord, locale, game: BlackjackGame):
+    # The finished hand leaves the session store only once its settlement is written: if
+    # that fails, the player's next tap on the hand settles it again.
+    user_id = user.user_id
+    settled = await db.settle_game(
+        user_id, 'blackjack', game.bet, game.win_amount, 'lose' if game.result == 'bust' else game.result,
+        idempotency_key=f'settle:{callback.id}', staked=True
+    )
+    blackjack_sessions.discard(user_id)
+    if settled.user is None:
+        return await callback.answer(locale['insufficient_balance'], show_alert=True)
+
+    if game.result == 'bust':
+        result_text = locale['blackjack_bust'].format(game.bet)
+    else:
+        result_text = locale['blackjack_result'].format(
+            game.player.text,
+            game.player.total,
+            game.dealer.text,
+            game.dealer.total
+        )
+        if game.result == 'win':
+            result_text += '\n' + locale['blackjack_win'].format(game.win_amount)
+        elif game.result == 'draw':
+            result_text += '\n' + locale['blackjack_draw']
         else:
-            logging.error(f"Error in callback handler: {e}")
-            await callback.answer(locale['error_occurred'], show_alert=True)
+            result_text += '\n' + locale['blackjack_lose'].format(game.bet)
+    result_text += fair_blackjack_result(locale, game)
+    
+    await callback.message.edit_text(
+        result_text,
+        reply_markup=kb.get_games_keyboard(user.layout_type, user.language)
+    )
 
-    await callback.answer()
+async def archive_ledger():
+    while True:
+        try:
+            archived = await asyncio.to_thread(db.archive_ledger, config.LEDGER_ARCHIVE_DIR, config.LEDGER_LIVE_MONTHS)
+            for month, rows in archived.items():
+                logging.info("Archived ledger partition %s: %d rows", month, rows)
+        except Exception:
+            logging.exception("Ledger archiving failed")
+        await asyncio.sleep(config.LEDGER_ARCHIVE_INTERVAL)
+
+async def refresh_leaderboard():
+    # A webhook worker only settles its own players' games; everyone else's come from SQLite.
+    while True:
+        await asyncio.sleep(config.LEADERBOARD_REFRESH_INTERVAL)
+        try:
+            await db.refresh_leaderboard(config.WORKER_INDEX, config.WORKER_COUNT)
+        except Exception:
+            logging.exception("Leaderboard refresh failed")
+
+async def sweep_sessions():
+    while True:
+        await asyncio.sleep(config.SESSION_SWEEP_INTERVAL)
+        if blackjack_sessions.sweep():
+            logging.info("Sessions %s", blackjack_sessions.format_stats())
+
+async def flush_daily_games():
+    while True:
+        await asyncio.sleep(config.DAILY_FLUSH_INTERVAL)
+        db.flush_daily_games()
+
+def snapshot_roulette():
+    # The open round's bets, and the message to announce them in, outlive a restart.
+    rows = [
+        (user_id, json.dumps({
+            'bets': [[bet_type.value, value, amount] for bet_type, value, amount in bets],
+            'chat_id': roulette_messages[user_id].chat.id if user_id in roulette_messages else None,
+            'message_id': roulette_messages[user_id].message_id if user_id in roulette_messages else None
+        }))
+        for user_id, bets in roulette_table.open_bets().items()
+    ]
+    if rows:
+        db.save_sessions('roulette', rows)
+
+async def restore_roulette():
+    for user_id, state in await db.take_sessions('roulette', config.WORKER_INDEX, config.WORKER_COUNT):
+        state = json.loads(state)
+        for bet_type, value, amount in state['bets']:
+            roulette_table.place_bet(user_id, BetType(bet_type), value, amount)
+        if state['chat_id'] is not None:
+            roulette_messages[user_id] = types.Message(
+                message_id=state['message_id'], date=datetime.now(),
+                chat=types.Chat(id=state['chat_id'], type='private')
+            ).as_(bot)
+
+async def startup() -> list:
+    # Shared by polling (main) and the webhook workers; returns the background tasks.
+    await blackjack_sessions.start(config.WORKER_INDEX, config.WORKER_COUNT)
+    await db.load_daily_games(config.WORKER_INDEX, config.WORKER_COUNT)
+    for game_type in ('slots', 'blackjack'):
+        fairness.restore(game_type, await db.take_sessions(f'fair:{game_type}', config.WORKER_INDEX, config.WORKER_COUNT))
+    await restore_roulette()
+    background = [
+        asyncio.create_task(run_roulette_table()),
+        asyncio.create_task(sweep_sessions()),
+        asyncio.create_task(flush_daily_games())
+    ]
+    # One archiver for the shared file: two processes moving the same day would lose rows.
+    if config.WORKER_INDEX == 0:
+        background.append(asyncio.create_task(archive_ledger()))
+    if config.WORKER_COUNT > 1:
+        background.append(asyncio.create_task(refresh_leaderboard()))
+    return background
+
+async def shutdown(background: list):
+    for task in background:
+        task.cancel()
+    await animations.close()
+    blackjack_sessions.close()
+    snapshot_roulette()
+    # Hashes already published stay valid for the rounds they were shown for.
+    for game_type in ('slots', 'blackjack'):
+        chains = fairness.snapshot(game_type)
+        if chains:
+            db.save_sessions(f'fair:{game_type}', chains)
+    logging.info("Sessions %s", blackjack_sessions.format_stats())
+    logging.info("User lanes: %s", user_lanes.format_stats())
+    await send_scheduler.close()
+    logging.info("Outbound requests:\n%s", send_scheduler.format_stats())
+    logging.info("Animations: %s", animations.format_stats())
+    logging.info("Callback route timings:\n%s", callbacks.format_stats())
+    db.flush_daily_games()
+    logging.info("Daily limits: %s", db.daily.format_stats())
+    logging.info("Randomness: %s", fairness.format_stats())
+    db.close()
 
 async def main():
-    await dp.start_polling(bot)
+    background = await startup()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await shutdown(background)
 
 if __name__ == "__main__":
     asyncio.run(main())
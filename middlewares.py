@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+from database import AsyncDatabase
+
+class UserContextMiddleware(BaseMiddleware):
+    # Resolves the sender's record once per update and hands it to handlers as `user`.
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user: User = data.get('event_from_user')
+        data['user'] = await self.db.get_user(from_user.id) if from_user else None
+        return await handler(event, data)
+
+
+class UserLane:
+    __slots__ = ('lock', 'pending', 'callbacks')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Updates of the user running or waiting, and the buttons among them.
+        self.pending = 0
+        self.callbacks: Set[Tuple[int, str]] = set()
+
+
+class UserLaneMiddleware(BaseMiddleware):
+    # Runs one update at a time per user, in arrival order, so a handler never reads a
+    # balance or a game that another update of the same user is still changing. A tap on
+    # a button whose previous tap is still queued or running is answered at once and
+    # dropped. Registered before UserContextMiddleware, so `user` is read inside the lane.
+    def __init__(self):
+        self._lanes: Dict[int, UserLane] = {}
+        self.serialized = 0
+        self.duplicates = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user: User = data.get('event_from_user')
+        if from_user is None:
+            return await handler(event, data)
+        lane = self._lanes.get(from_user.id)
+        if lane is None:
+            lane = self._lanes[from_user.id] = UserLane()
+
+        key = None
+        callback = event.callback_query
+        if callback is not None:
+            key = (callback.message.message_id if callback.message else 0, callback.data or '')
+            if key in lane.callbacks:
+                self.duplicates += 1
+                return await callback.answer()
+            lane.callbacks.add(key)
+        if lane.pending:
+            self.serialized += 1
+        lane.pending += 1
+        try:
+            async with lane.lock:
+                return await handler(event, data)
+        finally:
+            lane.pending -= 1
+            lane.callbacks.discard(key)
+            if not lane.pending:
+                del self._lanes[from_user.id]
+
+    def format_stats(self) -> str:
+        return f'{len(self._lanes)} busy, {self.serialized} waited for an earlier update, {self.duplicates} duplicate taps dropped'
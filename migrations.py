@@ -0,0 +1,295 @@
+import argparse
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    # PRAGMA journal_mode and friends cannot run inside a transaction.
+    transactional: bool = True
+
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, description: str, transactional: bool = True):
+    def decorator(apply: Callable[[sqlite3.Connection], None]):
+        if version in MIGRATIONS:
+            raise ValueError(f"Migration {version} is defined twice")
+        MIGRATIONS[version] = Migration(version, description, apply, transactional)
+        return apply
+    return decorator
+
+
+@migration(1, 'initial schema')
+def _initial_schema(conn: sqlite3.Connection):
+    # IF NOT EXISTS: databases created before migrations existed already have these tables.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE,
+        balance INTEGER DEFAULT 1000,
+        games_played INTEGER DEFAULT 0,
+        wins INTEGER DEFAULT 0,
+        last_game TIMESTAMP,
+        rating INTEGER DEFAULT 1000,
+        layout_type TEXT DEFAULT 'vertical',
+        language TEXT DEFAULT 'ru',
+        is_banned INTEGER DEFAULT 0,
+        registration_date TIMESTAMP,
+        games_today INTEGER DEFAULT 0,
+        last_daily_reset TIMESTAMP
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        game_type TEXT,
+        bet_amount INTEGER,
+        win_amount INTEGER,
+        timestamp TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS moderation_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        moderator_id INTEGER,
+        user_id INTEGER,
+        action TEXT,
+        reason TEXT,
+        timestamp TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+
+
+@migration(2, 'write-ahead log journal', transactional=False)
+def _enable_wal(conn: sqlite3.Connection):
+    # Persistent: readers no longer block the writer and a commit appends to the log
+    # instead of rewriting pages through a rollback journal.
+    mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+    if mode.lower() != 'wal' and conn.execute('PRAGMA database_list').fetchone()[2]:
+        raise RuntimeError(f"Could not switch the journal to WAL, SQLite kept '{mode}'")
+
+
+@migration(3, 'indexes for ledger, moderation and rating queries')
+def _hot_query_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_time ON transactions (user_id, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_moderation_logs_user ON moderation_logs (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating)')
+
+
+@migration(4, 'ledger entry types, results and idempotency keys')
+def _ledger_columns(conn: sqlite3.Connection):
+    # Rows written before the ledger existed were all settlements.
+    conn.execute("ALTER TABLE transactions ADD COLUMN entry_type TEXT NOT NULL DEFAULT 'settle'")
+    conn.execute('ALTER TABLE transactions ADD COLUMN result TEXT')
+    conn.execute('ALTER TABLE transactions ADD COLUMN idempotency_key TEXT')
+    # NULL keys never conflict, so only entries posted with a key are deduplicated.
+    conn.execute('CREATE UNIQUE INDEX idx_transactions_idempotency ON transactions (idempotency_key)')
+
+
+@migration(5, 'daily ledger rollups and archived partitions')
+def _ledger_rollups(conn: sqlite3.Connection):
+    # Settlements of closed months folded per user, day and game; see ledger_partitions.py.
+    conn.execute('''
+    CREATE TABLE ledger_daily (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        game_type TEXT NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        wagered INTEGER NOT NULL,
+        paid INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, game_type)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_ledger_daily_day ON ledger_daily (day)')
+    # The archiver walks the live partition day by day.
+    conn.execute('CREATE INDEX idx_transactions_time ON transactions (timestamp)')
+    conn.execute('''
+    CREATE TABLE ledger_partitions (
+        month TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        archived_at TIMESTAMP
+    )
+    ''')
+
+
+@migration(6, 'per-user, per-game statistics')
+def _user_game_stats(conn: sqlite3.Connection):
+    # Kept current by settle_game; `python game_stats.py` recomputes it from the ledger.
+    conn.execute('''
+    CREATE TABLE user_game_stats (
+        user_id INTEGER NOT NULL,
+        game_type TEXT NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        wagered INTEGER NOT NULL,
+        paid INTEGER NOT NULL,
+        PRIMARY KEY (user_id, game_type)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+    INSERT INTO user_game_stats (user_id, game_type, games, wins, wagered, paid)
+    SELECT user_id, game_type, SUM(games), SUM(wins), SUM(wagered), SUM(paid)
+    FROM (
+        SELECT user_id, game_type, games, wins, wagered, paid FROM ledger_daily
+        UNION ALL
+        SELECT user_id, game_type, 1, COALESCE(result = 'win', 0), bet_amount, win_amount
+        FROM transactions WHERE entry_type = 'settle'
+    )
+    GROUP BY user_id, game_type
+    ''')
+
+
+@migration(7, 'game session snapshots')
+def _game_sessions(conn: sqlite3.Connection):
+    # Unfinished games moved out of memory (see sessions.py); a row lives until the game resumes.
+    conn.execute('''
+    CREATE TABLE game_sessions (
+        game_type TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        state TEXT NOT NULL,
+        saved_at TIMESTAMP,
+        PRIMARY KEY (game_type, user_id)
+    ) WITHOUT ROWID
+    ''')
+
+
+@migration(8, 'provably fair rounds')
+def _fair_rounds(conn: sqlite3.Connection):
+    # Seeds of every provably fair round (see entropy.py), keyed like the ledger entry it decided.
+    conn.execute('''
+    CREATE TABLE fair_rounds (
+        round_key TEXT PRIMARY KEY,
+        game_type TEXT NOT NULL,
+        user_id INTEGER,
+        chain TEXT NOT NULL,
+        commitment TEXT NOT NULL,
+        server_seed TEXT NOT NULL,
+        client_seed TEXT NOT NULL,
+        created TIMESTAMP
+    ) WITHOUT ROWID
+    ''')
+
+
+@migration(9, 'settlement outcomes')
+def _settlement_outcomes(conn: sqlite3.Connection):
+    # What the player was shown for a settlement, so a redelivered update shows it again
+    # instead of a result that was never settled. Archived partitions do not keep it.
+    conn.execute('ALTER TABLE transactions ADD COLUMN outcome TEXT')
+
+
+@migration(10, 'shared roulette rounds')
+def _roulette_rounds(conn: sqlite3.Connection):
+    # The number of each roulette round, keyed by its closing time, so that webhook
+    # workers, each holding its own players' bets, all settle against the same spin.
+    conn.execute('''
+    CREATE TABLE roulette_rounds (
+        round_id INTEGER PRIMARY KEY,
+        number INTEGER,
+        spun_at TIMESTAMP
+    )
+    ''')
+
+
+@migration(11, 'shared fair chains')
+def _fair_chains(conn: sqlite3.Connection):
+    # Chains of seeds every process draws from, like the roulette table's: each webhook
+    # worker spins from the same one, so a seed is spent once whoever closes the round.
+    conn.execute('''
+    CREATE TABLE fair_chains (
+        owner TEXT PRIMARY KEY,
+        root TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        used INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+
+@migration(12, 'changed players index')
+def _changed_players(conn: sqlite3.Connection):
+    # Webhook workers re-read the players whose games or registration are newer than their
+    # last leaderboard refresh (AsyncDatabase.refresh_leaderboard) instead of every user.
+    conn.execute('CREATE INDEX idx_users_last_game ON users (last_game)')
+    conn.execute('CREATE INDEX idx_users_registration ON users (registration_date)')
+    conn.execute('CREATE INDEX idx_moderation_logs_time ON moderation_logs (timestamp)')
+
+
+def latest_version() -> int:
+    return max(MIGRATIONS)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP
+    )
+    ''')
+    conn.commit()
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: Optional[int] = None) -> List[int]:
+    # Forward-only: applies every pending migration up to `target` (default: latest)
+    # in order and returns the versions that were applied.
+    target = latest_version() if target is None else target
+    version = current_version(conn)
+    if version > latest_version():
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this code supports ({latest_version()})"
+        )
+
+    applied = []
+    for number in sorted(MIGRATIONS):
+        if number <= version or number > target:
+            continue
+        step = MIGRATIONS[number]
+        if step.transactional:
+            conn.execute('BEGIN')
+            try:
+                step.apply(conn)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                    (step.version, step.description, datetime.now())
+                )
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        else:
+            conn.commit()
+            step.apply(conn)
+            conn.execute(
+                'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                (step.version, step.description, datetime.now())
+            )
+            conn.commit()
+        applied.append(number)
+    return applied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upgrade the bot database schema')
+    parser.add_argument('path', nargs='?', default='casino.db')
+    parser.add_argument('--status', action='store_true', help='only print the schema version')
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.path)
+    print(f'{args.path}: schema version {current_version(connection)}, latest {latest_version()}')
+    if not args.status:
+        for applied_version in migrate(connection):
+            print(f'applied {applied_version}: {MIGRATIONS[applied_version].description}')
+    connection.close()
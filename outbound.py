@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Lanes, highest priority first. Requests go out in the RESULT lane unless the code
+# sending them sets `send_lane`; it is a context variable, so it follows the task.
+RESULT = 0
+FRAME = 1
+LANES = ('result', 'frame')
+
+send_lane: ContextVar[int] = ContextVar('send_lane', default=RESULT)
+
+
+class TokenBucket:
+    # `rate` tokens per second up to `burst`. reserve() always takes a token and may go
+    # into debt, returning how long the caller must wait: callers of one bucket are
+    # served in the order they asked.
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        # Set from a 429: nothing is sent before this time whatever the tokens say.
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class LaneStats:
+    __slots__ = ('queued', 'max_queued', 'sent', 'dropped', 'retries', 'floods', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.queued = 0
+        self.max_queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.retries = 0
+        self.floods = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.sent if self.sent else 0.0
+
+
+class SendScheduler(BaseRequestMiddleware):
+    # Bot session middleware pacing every request addressed to a chat: a bucket per chat
+    # (private chats and groups have separate limits) and one global bucket whose tokens
+    # go to the highest-priority lane first. A FRAME request never waits for its chat and
+    # waits at most `frame_timeout` for a global token; otherwise it fails with
+    # RetryAfter, as a 429 would, and gives its chat token back, so stale frames neither
+    # go out late nor hold up the result behind them. A 429 blocks the chat for its retry_after and
+    # RESULT requests are retried up to `max_retries` times. Requests without a chat
+    # (answerCallbackQuery, getMe, ...) are not limited.
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_rate: float = 20 / 60, group_burst: float = 3.0, max_retries: int = 3,
+                 frame_timeout: float = 1.0):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.frame_timeout = frame_timeout
+        self._chats: Dict[int, TokenBucket] = {}
+        self._prune_at = 1024
+        self._global: Optional[TokenBucket] = None
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.stats = [LaneStats() for _ in LANES]
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                # A full bucket is the same as a new one, so idle chats can be forgotten.
+                self._chats = {chat: b for chat, b in self._chats.items() if not b.idle(now)}
+                self._prune_at = max(1024, 2 * len(self._chats))
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self):
+        # Hands out global tokens to waiting requests in (lane, arrival) order.
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            wait = self._global.delay(loop.time())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self._global.reserve(loop.time())
+                future.set_result(None)
+
+    async def _acquire(self, chat_id: int, lane: int, method: TelegramMethod):
+        loop = asyncio.get_running_loop()
+        bucket = self._chat_bucket(chat_id, loop.time())
+        if lane == FRAME:
+            wait = bucket.delay(loop.time())
+            if wait > 0:
+                self.stats[lane].dropped += 1
+                raise TelegramRetryAfter(method, 'Chat is rate limited, frame dropped', math.ceil(wait))
+        wait = bucket.reserve(loop.time())
+        while wait > 0:
+            await asyncio.sleep(wait)
+            # A 429 for the chat may have arrived while waiting.
+            wait = bucket.blocked_until - loop.time()
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._global = self._global or TokenBucket(self.global_rate, self.global_rate, loop.time())
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = loop.create_future()
+        heapq.heappush(self._waiting, (lane, next(self._order), future))
+        self._wakeup.set()
+        if lane != FRAME:
+            await future
+            return
+        try:
+            await asyncio.wait_for(future, self.frame_timeout)
+        except asyncio.TimeoutError:
+            bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+            self.stats[lane].dropped += 1
+            raise TelegramRetryAfter(method, 'Send queue is full, frame dropped', math.ceil(self.frame_timeout))
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if not isinstance(chat_id, int):
+            # No chat, or a channel @username: nothing to pace it by.
+            return await make_request(bot, method)
+
+        lane = send_lane.get()
+        stats = self.stats[lane]
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            stats.queued += 1
+            stats.max_queued = max(stats.max_queued, stats.queued)
+            try:
+                await self._acquire(chat_id, lane, method)
+            finally:
+                stats.queued -= 1
+            waited = time.perf_counter() - started
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                stats.floods += 1
+                loop = asyncio.get_running_loop()
+                bucket = self._chat_bucket(chat_id, loop.time())
+                bucket.blocked_until = max(bucket.blocked_until, loop.time() + e.retry_after)
+                if lane != RESULT or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                stats.retries += 1
+                logging.warning("Flood limit in chat %s, retrying in %s s", chat_id, e.retry_after)
+                continue
+            stats.sent += 1
+            return response
+
+    @property
+    def queued(self) -> int:
+        return sum(stats.queued for stats in self.stats)
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+
+    def format_stats(self) -> str:
+        return '\n'.join(
+            f"{name}: {stats.sent} sent, {stats.dropped} dropped, {stats.queued} queued (max {stats.max_queued}), "
+            f"{stats.floods} flood limits, {stats.retries} retries, "
+            f"avg wait {stats.avg_wait * 1000:.1f} ms, max {stats.max_wait * 1000:.1f} ms"
+            for name, stats in zip(LANES, self.stats)
+        )
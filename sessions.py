@@ -0,0 +1,157 @@
+import json
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Generic, Iterable, Optional, Set, Tuple, TypeVar
+
+from database import AsyncDatabase
+
+V = TypeVar('V')
+
+
+def deep_size(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    # Bytes held by obj and everything it references through slots, attributes and containers.
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif not isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        for name in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+        if hasattr(obj, '__dict__'):
+            size += deep_size(vars(obj), seen)
+    return size
+
+
+class SessionRecord:
+    __slots__ = ('value', 'touched')
+
+    def __init__(self, value, touched: float):
+        self.value = value
+        self.touched = touched
+
+
+class SessionStore(Generic[V]):
+    # Live sessions of one game by user id, least recently used first. Sessions idle for
+    # `ttl` seconds (see sweep) and the oldest beyond `max_sessions` leave memory as a
+    # snapshot in game_sessions, so an abandoned game costs nothing until its player
+    # comes back and load() resumes it; close() snapshots the rest so a restart
+    # resumes them too. The dict-style methods never touch the database.
+    def __init__(self, game_type: str, db: AsyncDatabase, encode: Callable[[V], Dict],
+                 decode: Callable[[int, Dict], V], ttl: float = 1800.0, max_sessions: int = 10000):
+        self.game_type = game_type
+        self.db = db
+        self.encode = encode
+        self.decode = decode
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[int, SessionRecord]' = OrderedDict()
+        # Users with a snapshot waiting in the database, so load() only asks for those.
+        self._snapshotted: Set[int] = set()
+        self.evicted = 0
+        self.expired = 0
+        self.resumed = 0
+
+    async def start(self, shard: int = 0, shards: int = 1):
+        self._snapshotted = set(await self.db.session_users(self.game_type, shard, shards))
+
+    def get(self, user_id: int, default=None):
+        record = self._sessions.get(user_id)
+        if record is None:
+            return default
+        record.touched = time.monotonic()
+        self._sessions.move_to_end(user_id)
+        return record.value
+
+    def __getitem__(self, user_id: int) -> V:
+        value = self.get(user_id, KeyError)
+        if value is KeyError:
+            raise KeyError(user_id)
+        return value
+
+    def __setitem__(self, user_id: int, value: V):
+        self._sessions[user_id] = SessionRecord(value, time.monotonic())
+        self._sessions.move_to_end(user_id)
+        if len(self._sessions) > self.max_sessions:
+            self.evicted += len(self._sessions) - self.max_sessions
+            self._save(self._sessions.popitem(last=False) for _ in range(len(self._sessions) - self.max_sessions))
+
+    def __delitem__(self, user_id: int):
+        del self._sessions[user_id]
+
+    def pop(self, user_id: int, *default):
+        record = self._sessions.pop(user_id, None)
+        if record is None:
+            if default:
+                return default[0]
+            raise KeyError(user_id)
+        return record.value
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _save(self, records: Iterable[Tuple[int, SessionRecord]]):
+        rows = [(user_id, json.dumps(self.encode(record.value))) for user_id, record in records]
+        if rows:
+            self._snapshotted.update(user_id for user_id, _ in rows)
+            self.db.save_sessions(self.game_type, rows)
+
+    async def load(self, user_id: int) -> Optional[V]:
+        # The live session, or the player's snapshot moved back into memory.
+        value = self.get(user_id)
+        if value is not None or user_id not in self._snapshotted:
+            return value
+        self._snapshotted.discard(user_id)
+        state = await self.db.take_session(self.game_type, user_id)
+        if state is None or user_id in self._sessions:
+            return self.get(user_id)
+        value = self.decode(user_id, json.loads(state))
+        self[user_id] = value
+        self.resumed += 1
+        return value
+
+    def discard(self, user_id: int):
+        # Forgets the session and any snapshot of it, e.g. when a new game replaces it.
+        self._sessions.pop(user_id, None)
+        if user_id in self._snapshotted:
+            self._snapshotted.discard(user_id)
+            self.db.drop_session(self.game_type, user_id)
+
+    def sweep(self) -> int:
+        # Snapshots and drops every session idle for longer than the TTL.
+        deadline = time.monotonic() - self.ttl
+        idle = []
+        for user_id, record in self._sessions.items():
+            if record.touched > deadline:
+                break
+            idle.append(user_id)
+        self._save((user_id, self._sessions.pop(user_id)) for user_id in idle)
+        self.expired += len(idle)
+        return len(idle)
+
+    def close(self):
+        self._save(list(self._sessions.items()))
+        self._sessions.clear()
+
+    def memory_bytes(self, sample: int = 64) -> int:
+        # Estimated from the first `sample` sessions; exact for up to that many.
+        if not self._sessions:
+            return sys.getsizeof(self._sessions)
+        records = list(islice(self._sessions.values(), sample))
+        per_session = sum(deep_size(record) for record in records) / len(records)
+        return sys.getsizeof(self._sessions) + int(per_session * len(self._sessions))
+
+    def format_stats(self) -> str:
+        return (f"{self.game_type}: {len(self._sessions)} live (~{self.memory_bytes() / 1024:.0f} KB), "
+                f"{len(self._snapshotted)} snapshotted, {self.expired} expired, {self.evicted} evicted, "
+                f"{self.resumed} resumed")
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from games.blackjack import ACE, Blackjack, BlackjackGame, Hand, Shoe
+
+# Cards by rank within the first suit: 0 is a two, 8 a ten, 12 an ace.
+TWO, FIVE, NINE, TEN, KING = 0, 3, 7, 8, 11
+
+
+def hand(*cards: int) -> Hand:
+    result = Hand()
+    for card in cards:
+        result.add(card)
+    return result
+
+
+def test_hand_totals_and_soft_aces():
+    assert hand(ACE, FIVE).total == 16 and hand(ACE, FIVE).is_soft
+    assert hand(ACE, FIVE, TEN).total == 16 and not hand(ACE, FIVE, TEN).is_soft
+    assert hand(ACE, ACE, NINE).total == 21
+    assert hand(ACE, KING).is_blackjack
+    assert not hand(FIVE, FIVE + 13, ACE).is_blackjack
+    assert hand(TEN, KING, TWO).is_bust
+
+
+def test_hand_text_lists_every_card():
+    assert hand(ACE, TEN).text == 'A♠️ 10♠️'
+
+
+def test_shoe_deals_every_card_of_its_decks_once():
+    shoe = Shoe(2, 0.5, random.Random(3))
+    cards = [shoe.draw() for _ in range(shoe.remaining)]
+    assert sorted(cards) == sorted(list(range(52)) * 2)
+    assert shoe.needs_shuffle
+
+
+def test_shoe_reshuffle_leaves_cards_in_play_out():
+    shoe = Shoe(1, 0.75, random.Random(4))
+    shoe.reshuffle([ACE, TEN])
+    assert shoe.remaining == 50
+    assert ACE not in shoe.cards and TEN not in shoe.cards
+    assert shoe.cut == int(50 * 0.75)
+
+
+@pytest.mark.parametrize('decks, penetration', [(0, 0.75), (9, 0.75), (6, 0), (6, 1.5)])
+def test_shoe_rejects_bad_rules(decks, penetration):
+    with pytest.raises(ValueError):
+        Shoe(decks, penetration)
+
+
+def test_dropped_shoe_resumes_from_the_hands_own_shuffle():
+    # game_rng gives back the generator the hand's shoe was shuffled with.
+    blackjack = Blackjack(6, 0.75, random.Random(42), game_rng=lambda game: random.Random(42))
+    reference = Shoe(6, 0.75, random.Random(42)).cards
+    game = blackjack.start_game(1, 10)
+    assert game.result == 'playing'
+    blackjack.shoes.clear()
+    game = blackjack.hit(1)
+    assert game.player.cards == [reference[0], reference[1], reference[4]]
+    assert game.dealer.cards == [reference[2], reference[3]]
+
+
+def test_game_snapshot_round_trip():
+    game = BlackjackGame(1, 50)
+    game.player.add(ACE)
+    game.dealer.add(TEN)
+    game.fair = {'server_seed': '00'}
+    restored = BlackjackGame.restore(1, game.snapshot())
+    assert restored.player.cards == [ACE] and restored.dealer.cards == [TEN]
+    assert restored.bet == 50 and restored.fair == game.fair
+
+
+def test_finished_hand_stays_until_removed():
+    blackjack = Blackjack(6, 0.75, random.Random(42))
+    game = blackjack.start_game(1, 10)
+    blackjack.stand(1)
+    assert blackjack.get_game(1) is game and game.result != 'playing'
+    cards = list(game.player.cards), list(game.dealer.cards)
+    assert blackjack.hit(1) is game and blackjack.stand(1) is game
+    assert (game.player.cards, game.dealer.cards) == cards
+    restored = BlackjackGame.restore(1, game.snapshot())
+    assert (restored.result, restored.win_amount) == (game.result, game.win_amount)
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from callbacks import BlackjackBet, CallbackRouter, SetLanguage, SetLayout, SlotsBet
+
+
+def make_router(calls):
+    router = CallbackRouter()
+
+    async def handler(callback, callback_data):
+        calls.append(callback_data)
+        return callback_data
+
+    for factory in (SetLayout, SetLanguage, SlotsBet, BlackjackBet):
+        router.prefix(factory)(handler)
+    return router
+
+
+def dispatch(router, data):
+    return asyncio.run(router.dispatch(SimpleNamespace(data=data)))
+
+
+def test_offered_payloads_reach_their_handler():
+    calls = []
+    router = make_router(calls)
+    assert dispatch(router, SlotsBet(amount=50).pack()) == SlotsBet(amount=50)
+    assert dispatch(router, 'bet:100') == BlackjackBet(amount=100)
+    assert dispatch(router, 'set_layout:horizontal') == SetLayout(layout='horizontal')
+    assert dispatch(router, 'set_lang:en') == SetLanguage(lang='en')
+    assert len(calls) == 4
+
+
+def test_forged_payloads_are_dropped():
+    calls = []
+    router = make_router(calls)
+    for data in ('slots_bet:1000000', 'slots_bet:-10', 'bet:0', 'bet:ten',
+                 'set_layout:diagonal', 'set_lang:xx'):
+        assert dispatch(router, data) is None
+    assert calls == []
+    assert router.stats['slots_bet'].errors == 2
+    assert router.stats['bet'].errors == 2
+    assert router.stats['set_layout'].errors == 1
+    assert router.stats['set_lang'].errors == 1
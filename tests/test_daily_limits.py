@@ -0,0 +1,52 @@
+import asyncio
+import time
+from datetime import datetime
+
+from daily_limits import DailyLimiter
+from database import AsyncDatabase
+
+
+def test_limit_and_rollover_at_midnight(monkeypatch):
+    now = datetime(2024, 5, 1, 23, 59, 30).timestamp()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    rollovers = []
+    limiter = DailyLimiter(2, on_rollover=rollovers.append)
+    limiter.played(1)
+    assert limiter.allowed(1)
+    limiter.played(1)
+    assert not limiter.allowed(1) and limiter.refused == 1
+    assert limiter.take_dirty() == [(1, 2)] and limiter.take_dirty() == []
+
+    now += 60
+    assert limiter.allowed(1)
+    assert limiter.games_today(1) == 0
+    assert rollovers == [datetime(2024, 5, 2)] and limiter.day_start == datetime(2024, 5, 2)
+
+
+def test_load_keeps_the_higher_count():
+    limiter = DailyLimiter(10)
+    limiter.played(1, 3)
+    limiter.load([(1, 2), (2, 5)])
+    assert limiter.games_today(1) == 3 and limiter.games_today(2) == 5
+
+
+def test_settlements_count_except_draws_and_replays(tmp_path):
+    async def run():
+        db = AsyncDatabase(str(tmp_path / 'casino.db'))
+        try:
+            for user_id in (1, 2):
+                await db.register_user(user_id, f'player{user_id}')
+            await db.settle_game(1, 'blackjack', 10, 10, 'draw', idempotency_key='settle:a', staked=True)
+            assert db.daily.games_today(1) == 0
+            await db.settle_game(1, 'slots', 10, 0, 'lose', idempotency_key='settle:b')
+            await db.settle_game(1, 'slots', 10, 0, 'lose', idempotency_key='settle:b')
+            assert db.daily.games_today(1) == 1
+
+            await db.settle_round('roulette', [
+                (1, 10, 0, 'draw', 'roulette:1:1'), (2, 10, 20, 'win', 'roulette:1:2')
+            ], staked=True)
+            assert db.daily.games_today(1) == 1 and db.daily.games_today(2) == 1
+        finally:
+            db.close()
+
+    asyncio.run(run())
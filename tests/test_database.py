@@ -0,0 +1,91 @@
+import asyncio
+
+from database import AsyncDatabase, Database
+
+
+def database(tmp_path) -> Database:
+    db = Database(str(tmp_path / 'casino.db'))
+    for user_id in (1, 2):
+        db.register_user(user_id, f'player{user_id}')
+    return db
+
+
+def balance(db: Database, user_id: int) -> int:
+    return db.conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+
+def test_place_bet_takes_the_stake_only_if_it_is_covered(tmp_path):
+    db = database(tmp_path)
+    posting = db.place_bet(1, 'blackjack', 600, idempotency_key='bet:a')
+    assert posting.user.balance == 400 and balance(db, 1) == 400
+
+    assert db.place_bet(1, 'blackjack', 600, idempotency_key='bet:b').user is None
+    assert db.place_bet(3, 'blackjack', 10, idempotency_key='bet:c').user is None
+    assert balance(db, 1) == 400
+    assert not db.ledger.is_posted('bet:b') and not db.ledger.is_posted('bet:c')
+
+
+def test_settlement_never_takes_the_balance_below_zero(tmp_path):
+    db = database(tmp_path)
+    assert db.settle_game(1, 'slots', 1001, 0, 'lose', idempotency_key='settle:a').user is None
+    assert balance(db, 1) == 1000
+    assert db.get_game_stats(1)['slots'].games == 0 and not db.ledger.is_posted('settle:a')
+
+    posting = db.settle_game(1, 'slots', 1000, 0, 'lose', idempotency_key='settle:b')
+    assert posting.user.balance == 0 and posting.user.games_played == 1
+    assert db.settle_game(2, 'blackjack', 10, 20, 'win', staked=True).user.balance == 1020
+
+
+def test_failed_call_rolls_back_only_itself_in_a_group(tmp_path):
+    async def run():
+        db = AsyncDatabase(str(tmp_path / 'casino.db'), group_commit_window=0.2)
+        try:
+            for user_id in (1, 2):
+                await db.register_user(user_id, f'player{user_id}')
+
+            def failing(user_id):
+                db._db.update_balance(user_id, 500)
+                raise RuntimeError('call failed')
+
+            db._db.failing = failing
+            results = await asyncio.gather(
+                db.update_balance(1, 100), db._call('failing', 2), db.update_balance(2, 50),
+                return_exceptions=True
+            )
+            assert isinstance(results[1], RuntimeError)
+            assert (await db.get_user(1)).balance == 1100
+            assert (await db.get_user(2)).balance == 1050
+        finally:
+            db.close()
+        assert balance(Database(str(tmp_path / 'casino.db')), 2) == 1050
+
+    asyncio.run(run())
+
+
+def test_failed_commit_rolls_back_the_whole_group(tmp_path):
+    async def run():
+        db = AsyncDatabase(str(tmp_path / 'casino.db'), group_commit_window=0.2)
+        try:
+            await db.register_user(1, 'player1')
+            flush = db._db.ledger.flush
+
+            def failing_flush():
+                db._db.ledger.flush = flush
+                raise RuntimeError('disk full')
+
+            db._db.ledger.flush = failing_flush
+            results = await asyncio.gather(
+                db.settle_game(1, 'slots', 10, 50, 'win', idempotency_key='settle:a'),
+                db.update_balance(1, 100),
+                return_exceptions=True
+            )
+            assert all(isinstance(result, RuntimeError) for result in results)
+            # The cached record that the rolled back calls updated is read again.
+            user = await db.get_user(1)
+            assert user.balance == 1000 and user.games_played == 0
+            # Nor was the settlement's key posted, so a retry is applied.
+            assert not (await db.settle_game(1, 'slots', 10, 50, 'win', idempotency_key='settle:a')).replayed
+        finally:
+            db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import hashlib
+
+from entropy import EntropyPool, FairRound, ProvablyFair, SeedChain, commit, replay, verify
+from games.roulette import Roulette, RouletteTable
+
+SLOTS = ('slots', 1)
+BLACKJACK = ('blackjack', 1)
+
+
+def test_seed_chain_links_back_to_its_anchor():
+    for length in (1, 31, 32, 33, 100):
+        chain = SeedChain(bytes(range(32)), length)
+        seeds = [chain.seed(index) for index in range(length)]
+        assert seeds[-1] == chain.root
+        assert hashlib.sha256(seeds[0]).hexdigest() == chain.anchor
+        for index in range(1, length):
+            assert hashlib.sha256(seeds[index]).digest() == seeds[index - 1]
+        assert SeedChain.restore(chain.snapshot()).anchor == chain.anchor
+
+
+def test_seeds_are_revealed_in_chain_order():
+    fairness = ProvablyFair(EntropyPool(), chain_length=5)
+    previous = fairness.anchor(SLOTS)
+    for n in range(5):
+        commitment = fairness.commitment(SLOTS)
+        fair_round = fairness.open(SLOTS, f'settle:{n}', f'1:{n}', 1)
+        assert fair_round.commitment == commitment
+        # Each revealed seed hashes to the one revealed just before it.
+        assert verify(fair_round.server_seed, commitment, previous)
+        previous = fair_round.server_seed
+    # A spent chain is followed by a new one.
+    assert fairness.open(SLOTS, 'settle:5', '1:5', 1).chain != fair_round.chain
+
+
+def test_owners_do_not_share_chains():
+    fairness = ProvablyFair(EntropyPool(), chain_length=10)
+    hand = fairness.open(BLACKJACK, 'bet:a', '1:a', 1)
+    spins = [fairness.open(SLOTS, f'settle:{n}', f'1:{n}', 1) for n in range(9)]
+    assert hand.chain != spins[0].chain
+    # No slots seed reveals the seed of the blackjack hand still in play.
+    revealed = {spin.server_seed for spin in spins}
+    for spin in spins:
+        seed = bytes.fromhex(spin.server_seed)
+        for _ in range(10):
+            seed = hashlib.sha256(seed).digest()
+            assert seed.hex() != hand.server_seed
+            revealed.add(seed.hex())
+    assert hand.server_seed not in revealed
+
+
+def test_release_gives_the_seed_back_only_while_it_is_the_last():
+    fairness = ProvablyFair(EntropyPool())
+    first = fairness.open(SLOTS, 'settle:a', '1:a', 1)
+    fairness.release(SLOTS, first)
+    assert fairness.commitment(SLOTS) == first.commitment
+    first = fairness.open(SLOTS, 'settle:a', '1:a', 1)
+    fairness.open(SLOTS, 'settle:b', '1:b', 1)
+    fairness.release(SLOTS, first)
+    assert fairness.commitment(SLOTS) != first.commitment
+
+
+def test_snapshot_keeps_published_commitments():
+    fairness = ProvablyFair(EntropyPool())
+    fairness.open(SLOTS, 'settle:a', '1:a', 1)
+    commitment = fairness.commitment(SLOTS)
+    restored = ProvablyFair(EntropyPool())
+    restored.restore('slots', fairness.snapshot('slots'))
+    assert restored.commitment(SLOTS) == commitment
+    assert fairness.snapshot('blackjack') == []
+
+
+def test_round_replays_with_the_game_code():
+    fairness = ProvablyFair(EntropyPool())
+    table = RouletteTable(Roulette(fairness.pool))
+    fair_round = fairness.open(('roulette', 0), 'roulette:1', 'roulette:1:taps')
+    with fairness.use(fair_round):
+        number = table.spin().number
+    restored = FairRound.restore(fair_round.snapshot())
+    assert replay('roulette', restored.server_seed, restored.client_seed) == str(number)
+    assert verify(restored.server_seed, commit(bytes.fromhex(restored.server_seed)))
+
+
+def test_disabled_fairness_hands_out_nothing():
+    fairness = ProvablyFair(EntropyPool(), enabled=False)
+    assert fairness.commitment(SLOTS) is None
+    assert fairness.open(SLOTS, 'settle:a', '1:a', 1) is None
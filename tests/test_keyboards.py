@@ -0,0 +1,20 @@
+import pytest
+
+from keyboards import KeyboardManager
+
+
+def test_cached_markups_cannot_be_changed():
+    kb = KeyboardManager()
+    markup = kb.get_roulette_keyboard('horizontal', 'en')
+    assert markup is kb.get_roulette_keyboard('horizontal', 'en')
+    with pytest.raises(AttributeError):
+        markup.inline_keyboard.append([])
+    with pytest.raises(AttributeError):
+        markup.inline_keyboard[0].append(markup.inline_keyboard[0][0])
+    with pytest.raises(Exception):
+        markup.inline_keyboard[0][0].text = 'changed'
+
+
+def test_unknown_layout_and_language_fall_back():
+    kb = KeyboardManager()
+    assert kb.get_main_keyboard('diagonal', 'xx') is kb.get_main_keyboard('vertical', 'ru')
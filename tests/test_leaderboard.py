@@ -0,0 +1,90 @@
+import asyncio
+import random
+
+import pytest
+
+from database import AsyncDatabase
+from leaderboard import IndexableSkipList, Leaderboard
+
+
+def check(skip: IndexableSkipList, expected: list):
+    assert len(skip) == len(expected)
+    assert [skip[i] for i in range(len(expected))] == expected
+    for position, value in enumerate(expected):
+        assert skip.index(value) == position
+    assert list(skip.islice(0, len(expected))) == expected
+
+
+def test_built_list_matches_sorted_values():
+    values = random.Random(1).sample(range(10000), 500)
+    check(IndexableSkipList(values), sorted(values))
+
+
+def test_insert_and_remove_keep_ranks():
+    rng = random.Random(2)
+    skip = IndexableSkipList(range(0, 200, 2))
+    expected = list(range(0, 200, 2))
+    for _ in range(300):
+        value = rng.randrange(400)
+        if value in expected and rng.random() < 0.5:
+            skip.remove(value)
+            expected.remove(value)
+        elif value not in expected:
+            skip.insert(value)
+            expected.append(value)
+            expected.sort()
+    check(skip, expected)
+
+
+def test_islice_clamps_to_bounds():
+    skip = IndexableSkipList(range(10))
+    assert list(skip.islice(-5, 3)) == [0, 1, 2]
+    assert list(skip.islice(8, 50)) == [8, 9]
+    assert list(skip.islice(6, 6)) == []
+
+
+def test_missing_values_and_positions_raise():
+    skip = IndexableSkipList([1, 3, 5])
+    with pytest.raises(ValueError):
+        skip.index(4)
+    with pytest.raises(ValueError):
+        skip.remove(6)
+    with pytest.raises(IndexError):
+        skip[3]
+
+
+def test_leaderboard_ranks_by_rating_then_user_id():
+    board = Leaderboard()
+    board.load([(1, 'alice', 1000, 0, 0), (2, 'bob', 1200, 0, 0), (3, 'carol', 1000, 0, 0)])
+    assert [entry.user_id for entry in board.top()] == [2, 1, 3]
+
+    board.update(3, 'carol', 1300, 1, 1)
+    assert board.rank(3) == 1
+    assert [(place, entry.user_id) for place, entry in board.around(2)] == [(1, 3), (2, 2), (3, 1)]
+
+    board.update(2, 'bob', 1200, 0, 0, is_banned=True)
+    assert board.rank(2) is None
+    assert [entry.user_id for entry in board.top()] == [3, 1]
+
+
+def test_refresh_takes_in_players_of_other_processes(tmp_path):
+    async def run():
+        path = str(tmp_path / 'casino.db')
+        ours, theirs = AsyncDatabase(path), AsyncDatabase(path)
+        try:
+            await ours.register_user(2, 'player2')
+            await theirs.register_user(3, 'player3')
+            await theirs.settle_game(3, 'slots', 10, 50, 'win', idempotency_key='settle:a')
+            await theirs.ban_user(2, 99, 'test')
+            assert ours._db.leaderboard.rank(3) is None
+
+            # This process serves the even user ids of two shards.
+            assert await ours.refresh_leaderboard(0, 2) == 2
+            assert ours._db.leaderboard.rank(3) == 1
+            assert ours._db.leaderboard.rank(2) is None
+            assert await ours.refresh_leaderboard(0, 2) == 2  # still within the lookback
+        finally:
+            ours.close()
+            theirs.close()
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+import sqlite3
+
+from database import Database
+from ledger import BET, SETTLE, LedgerWriter
+from migrations import migrate
+
+
+def writer() -> LedgerWriter:
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    return LedgerWriter(conn)
+
+
+def keys(ledger: LedgerWriter) -> list:
+    return [row[0] for row in ledger.conn.execute('SELECT idempotency_key FROM transactions ORDER BY id')]
+
+
+def test_rollback_drops_rows_and_keys_after_mark():
+    ledger = writer()
+    ledger.append(1, BET, 'roulette', 10, 0, idempotency_key='bet:a')
+    mark = ledger.mark()
+    ledger.append(1, SETTLE, 'roulette', 10, 20, 'win', idempotency_key='settle:a', outcome='red 1')
+    ledger.append(2, BET, 'roulette', 10, 0, idempotency_key='bet:b')
+    assert ledger.posted('settle:a') == (20, 'red 1')
+
+    ledger.rollback_to(mark)
+    assert len(ledger) == 1
+    assert ledger.is_posted('bet:a')
+    assert not ledger.is_posted('settle:a')
+    assert not ledger.is_posted('bet:b')
+
+    ledger.flush()
+    ledger.conn.commit()
+    assert keys(ledger) == ['bet:a']
+
+
+def test_flushed_keys_are_found_in_the_table():
+    ledger = writer()
+    ledger.append(1, SETTLE, 'slots', 10, 50, 'win', idempotency_key='settle:x', outcome='7 7 7')
+    ledger.flush()
+    assert len(ledger) == 0
+    assert ledger.posted('settle:x') == (50, '7 7 7')
+    # A second write under the same key is ignored.
+    ledger.append(1, SETTLE, 'slots', 10, 0, 'lose', idempotency_key='settle:x')
+    ledger.flush()
+    assert keys(ledger) == ['settle:x']
+    assert ledger.posted('settle:x') == (50, '7 7 7')
+
+
+def test_discard_forgets_pending_rows():
+    ledger = writer()
+    ledger.append(1, BET, 'blackjack', 50, 0, idempotency_key='bet:y')
+    ledger.discard()
+    assert not ledger.is_posted('bet:y')
+    ledger.flush()
+    assert keys(ledger) == []
+
+
+def test_replayed_keys_return_the_stored_posting(tmp_path):
+    db = Database(str(tmp_path / 'casino.db'))
+    db.register_user(1, 'player1')
+    assert db.place_bet(1, 'blackjack', 100, idempotency_key='bet:a').user.balance == 900
+    first = db.settle_game(1, 'blackjack', 100, 200, 'win', idempotency_key='settle:a',
+                           staked=True, outcome='20 vs 18')
+    assert first.user.balance == 1100 and not first.replayed
+
+    bet = db.place_bet(1, 'blackjack', 100, idempotency_key='bet:a')
+    again = db.settle_game(1, 'blackjack', 100, 0, 'lose', idempotency_key='settle:a', staked=True)
+    assert bet.replayed and again.replayed
+    assert (again.payout, again.outcome) == (200, '20 vs 18')
+    assert again.user.balance == 1100 and again.user.games_played == 1
+    assert db.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 2
@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+from middlewares import UserLaneMiddleware
+
+
+def tap(data: str, answered: list):
+    async def answer():
+        answered.append(data)
+
+    callback = SimpleNamespace(message=SimpleNamespace(message_id=7), data=data, answer=answer)
+    return SimpleNamespace(callback_query=callback)
+
+
+def test_duplicate_taps_are_dropped_and_the_rest_wait_their_turn():
+    async def run():
+        lanes = UserLaneMiddleware()
+        answered, handled = [], []
+        release = asyncio.Event()
+
+        async def handler(event, data):
+            handled.append(event.callback_query.data)
+            await release.wait()
+
+        def send(data):
+            return asyncio.create_task(lanes(handler, tap(data, answered), {'event_from_user': SimpleNamespace(id=1)}))
+
+        tasks = [send('slots_bet:10'), send('slots_bet:10'), send('profile')]
+        await asyncio.sleep(0)
+        # The repeated tap is answered right away; the other button waits for the lane.
+        assert answered == ['slots_bet:10'] and handled == ['slots_bet:10']
+        release.set()
+        await asyncio.gather(*tasks)
+        assert handled == ['slots_bet:10', 'profile']
+        assert (lanes.duplicates, lanes.serialized) == (1, 1)
+
+        # Once the first tap is done, the same button may be tapped again.
+        await send('slots_bet:10')
+        assert handled[-1] == 'slots_bet:10' and lanes._lanes == {}
+
+    asyncio.run(run())
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from migrations import MIGRATIONS, current_version, latest_version, migrate
+
+
+def tables(conn: sqlite3.Connection) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_fresh_database_gets_every_migration(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'casino.db')
+    assert migrate(conn) == sorted(MIGRATIONS)
+    assert current_version(conn) == latest_version()
+    assert {'users', 'transactions', 'game_sessions', 'fair_rounds', 'roulette_rounds', 'fair_chains'} <= tables(conn)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_migrate_is_idempotent_and_resumes_from_target(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'casino.db')
+    assert migrate(conn, 5) == [1, 2, 3, 4, 5]
+    assert current_version(conn) == 5
+    assert migrate(conn) == [version for version in sorted(MIGRATIONS) if version > 5]
+    assert migrate(conn) == []
+
+
+def test_newer_schema_is_refused(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'casino.db')
+    migrate(conn)
+    conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (latest_version() + 1, 'future'))
+    conn.commit()
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'casino.db')
+    migrate(conn, latest_version() - 1)
+    step = MIGRATIONS[latest_version()]
+    apply = step.apply
+
+    def broken(connection):
+        apply(connection)
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(step, 'apply', broken)
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+    assert current_version(conn) == latest_version() - 1
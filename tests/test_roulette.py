@@ -0,0 +1,40 @@
+from database import Database
+from games.roulette import BetType, RouletteTable
+
+
+def test_chips_placed_after_close_go_to_the_next_round():
+    table = RouletteTable()
+    table.place_bet(1, BetType.NUMBER, '7', 10)
+    closed = table.close()
+    # A chip placed while the closed round is drawn and settled.
+    table.place_bet(2, BetType.COLOR, 'red', 5)
+
+    result = closed.spin(7)
+    assert result.settlements == [(1, 10, 350)]
+    assert table.open_bets() == {2: [(BetType.COLOR, 'red', 5)]}
+    assert table.spin(7).settlements == [(2, 5, 10)]
+
+
+def test_a_failed_player_does_not_undo_the_round(tmp_path):
+    db = Database(str(tmp_path / 'casino.db'))
+    for user_id in (1, 2, 3):
+        db.register_user(user_id, f'player{user_id}')
+    settle_game = db.settle_game
+
+    def failing(user_id, *args):
+        # Player 2's settlement is written, then fails and must be rolled back on its own.
+        posting = settle_game(user_id, *args)
+        if user_id == 2:
+            raise RuntimeError('settlement failed')
+        return posting
+
+    db.settle_game = failing
+    postings = db.settle_round('roulette', [
+        (user_id, 10, 20, 'win', f'roulette:1:{user_id}') for user_id in (1, 2, 3)
+    ], staked=True)
+
+    assert [posting.user is not None for posting in postings] == [True, False, True]
+    balances = dict(db.conn.execute('SELECT user_id, balance FROM users'))
+    assert balances == {1: 1020, 2: 1000, 3: 1020}
+    assert db.get_user(2).balance == 1000 and db.get_user(2).wins == 0
+    assert not db.ledger.is_posted('roulette:1:2') and db.ledger.is_posted('roulette:1:3')
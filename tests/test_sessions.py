@@ -0,0 +1,71 @@
+import asyncio
+
+from database import AsyncDatabase
+from sessions import SessionStore
+
+
+def encode(value: dict) -> dict:
+    return value
+
+
+def decode(user_id: int, state: dict) -> dict:
+    return dict(state, user_id=user_id)
+
+
+def test_eviction_snapshots_least_recently_used(tmp_path):
+    async def run():
+        db = AsyncDatabase(str(tmp_path / 'casino.db'))
+        try:
+            store = SessionStore('blackjack', db, encode, decode, max_sessions=2)
+            store[1] = {'bet': 10}
+            store[2] = {'bet': 20}
+            store.get(1)  # 2 is now the least recently used
+            store[3] = {'bet': 30}
+            assert 2 not in store and 1 in store and 3 in store
+            assert store.evicted == 1
+
+            assert await store.load(2) == {'bet': 20, 'user_id': 2}
+            assert store.resumed == 1
+            # Loading 2 back evicted 1, now the oldest.
+            assert 1 not in store and await db.session_users('blackjack') == [1]
+        finally:
+            db.close()
+
+    asyncio.run(run())
+
+
+def test_sweep_and_discard(tmp_path):
+    async def run():
+        db = AsyncDatabase(str(tmp_path / 'casino.db'))
+        try:
+            store = SessionStore('blackjack', db, encode, decode, ttl=0)
+            store[1] = {'bet': 10}
+            store[2] = {'bet': 20}
+            assert store.sweep() == 2 and len(store) == 0
+            store.discard(1)
+            assert await store.load(1) is None
+            assert await store.load(2) == {'bet': 20, 'user_id': 2}
+        finally:
+            db.close()
+
+    asyncio.run(run())
+
+
+def test_close_carries_sessions_over_a_restart(tmp_path):
+    async def run():
+        path = str(tmp_path / 'casino.db')
+        db = AsyncDatabase(path)
+        store = SessionStore('blackjack', db, encode, decode)
+        store[7] = {'bet': 50}
+        store.close()
+        db.close()
+
+        db = AsyncDatabase(path)
+        try:
+            store = SessionStore('blackjack', db, encode, decode)
+            await store.start()
+            assert await store.load(7) == {'bet': 50, 'user_id': 7}
+        finally:
+            db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+class UserRecord:
+    __slots__ = (
+        'user_id', 'username', 'balance', 'games_played', 'wins', 'last_game', 'rating',
+        'layout_type', 'language', 'is_banned', 'registration_date', 'games_today', 'last_daily_reset'
+    )
+
+    def __init__(self, user_id: int, username: str, balance: int, games_played: int, wins: int,
+                 last_game, rating: int, layout_type: str, language: str, is_banned: int,
+                 registration_date, games_today: int, last_daily_reset):
+        self.user_id = user_id
+        self.username = username
+        self.balance = balance
+        self.games_played = games_played
+        self.wins = wins
+        self.last_game = last_game
+        self.rating = rating
+        self.layout_type = layout_type
+        self.language = language
+        self.is_banned = is_banned
+        self.registration_date = registration_date
+        self.games_today = games_today
+        self.last_daily_reset = last_daily_reset
+
+    def __repr__(self) -> str:
+        return f"UserRecord(user_id={self.user_id}, username={self.username!r}, balance={self.balance})"
+
+
+# Column list in UserRecord order, for SELECT and RETURNING clauses.
+USER_COLUMNS = ', '.join(UserRecord.__slots__)
+
+
+class UserCache:
+    # LRU with a per-entry TTL. Filled and updated by Database write methods on the
+    # writer thread and read from the event loop, hence the lock. An entry can also hold
+    # the user's per-game statistics (game type -> GameStats), which live and expire with it.
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[int, Tuple[float, UserRecord, Optional[Dict[str, Any]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, user_id: int) -> Optional[tuple]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def get(self, user_id: int) -> Optional[UserRecord]:
+        with self._lock:
+            entry = self._live(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: UserRecord):
+        with self._lock:
+            entry = self._entries.get(user.user_id)
+            stats = entry[2] if entry is not None else None
+            self._entries[user.user_id] = (time.monotonic() + self.ttl, user, stats)
+            self._entries.move_to_end(user.user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def game_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._live(user_id)
+            return entry[2] if entry is not None else None
+
+    def put_game_stats(self, user_id: int, stats: Dict[str, Any]):
+        # Only next to a cached user: the statistics are dropped whenever the user is.
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (entry[0], entry[1], stats)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
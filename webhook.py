@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+from config import Config
+from migrations import migrate
+
+# Update kinds whose object carries the sender as `from`.
+SENDER_KINDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member', 'chat_join_request'
+)
+
+
+def update_user_id(update: Dict) -> int:
+    # The sender of a raw update, read straight from the JSON; 0 when it has none.
+    for kind in SENDER_KINDS:
+        event = update.get(kind)
+        if event is not None:
+            sender = event.get('from') or event.get('chat') or {}
+            return sender.get('id', 0)
+    return 0
+
+
+class Shard:
+    # Updates bound for one worker, forwarded in arrival order as JSON batches of up to
+    # `batch_max`. While the worker is down (e.g. restarting) a batch is retried until
+    # `timeout`; after that its webhook requests fail and Telegram delivers them again.
+    def __init__(self, index: int, url: str, batch_max: int = 256, timeout: float = 30.0):
+        self.index = index
+        self.url = url
+        self.health_url = url.rsplit('/', 1)[0] + '/health'
+        self.batch_max = batch_max
+        self.timeout = timeout
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.forwarded = 0
+        self.batches = 0
+        self.failed = 0
+        self.pid: Optional[int] = None
+
+    async def run(self, session: aiohttp.ClientSession):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_max and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            error = await self._forward(session, [update for update, _ in batch])
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            if error is None:
+                self.forwarded += len(batch)
+                self.batches += 1
+            else:
+                self.failed += len(batch)
+
+    async def _forward(self, session: aiohttp.ClientSession, updates: List[Dict]) -> Optional[Exception]:
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            try:
+                async with session.post(self.url, json=updates) as response:
+                    response.raise_for_status()
+                    return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if time.monotonic() + delay > deadline:
+                    logging.error("Worker %d unreachable, %d updates refused: %s", self.index, len(updates), e)
+                    return e
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+
+class Ingress:
+    # Accepts Telegram's webhook requests and hands each update to worker
+    # user_id % workers, so one user's updates, and the games they are in, always land
+    # in the same process. A request is answered once its worker has accepted the update.
+    def __init__(self, config: Config, workers: int):
+        self.config = config
+        self.shards = [
+            Shard(index, f'http://127.0.0.1:{config.WEBHOOK_WORKER_PORT + index}/updates',
+                  config.WEBHOOK_BATCH_MAX, config.WEBHOOK_FORWARD_TIMEOUT)
+            for index in range(workers)
+        ]
+        self.received = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        secret = self.config.WEBHOOK_SECRET
+        if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+            return web.Response(status=403)
+        update = await request.json(loads=json.loads)
+        self.received += 1
+        shard = self.shards[update_user_id(update) % len(self.shards)]
+        future = asyncio.get_running_loop().create_future()
+        shard.queue.put_nowait((update, future))
+        try:
+            await future
+        except Exception:
+            return web.Response(status=503)
+        return web.Response()
+
+    async def ready(self, shard: Shard) -> bool:
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=1.0)) as session:
+                async with session.get(shard.health_url) as response:
+                    return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def status(self, request: web.Request) -> web.Response:
+        ready = await asyncio.gather(*(self.ready(shard) for shard in self.shards))
+        return web.json_response({
+            'received': self.received,
+            'workers': [
+                {'index': shard.index, 'pid': shard.pid, 'ready': up, 'queued': shard.queue.qsize(),
+                 'forwarded': shard.forwarded, 'batches': shard.batches, 'failed': shard.failed}
+                for shard, up in zip(self.shards, ready)
+            ]
+        })
+
+
+def run_worker(index: int, workers: int):
+    # One worker process: the bot's handlers behind a local HTTP endpoint the ingress posts to.
+    os.environ['WORKER_INDEX'] = str(index)
+    os.environ['WORKER_COUNT'] = str(workers)
+    asyncio.run(_serve_worker(index))
+
+
+async def _serve_worker(index: int):
+    import main
+
+    tasks = set()
+
+    async def updates(request: web.Request) -> web.Response:
+        for update in await request.json():
+            task = asyncio.create_task(main.dp.feed_raw_update(main.bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    background = await main.startup()
+    app = web.Application()
+    app.router.add_post('/updates', updates)
+    app.router.add_get('/health', lambda request: web.Response())
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', main.config.WEBHOOK_WORKER_PORT + index).start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    logging.info("Worker %d of %d ready", index, main.config.WORKER_COUNT)
+    await stop.wait()
+
+    # Stop taking updates, let the accepted ones finish, then snapshot unfinished games.
+    await runner.cleanup()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await main.shutdown(background)
+    await main.bot.session.close()
+    logging.info("Worker %d stopped", index)
+
+
+class Supervisor:
+    # Keeps one process per worker index alive, restarting any that exits. SIGTERM lets a
+    # worker drain and snapshot its sessions; one that takes longer than `timeout` is killed.
+    def __init__(self, workers: int, timeout: float = 30.0):
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.timeout = timeout
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._replacing: Set[int] = set()
+        self.restarts = 0
+
+    def start(self, index: int):
+        process = self.context.Process(target=run_worker, args=(index, self.workers), name=f'worker-{index}')
+        process.start()
+        self.processes[index] = process
+
+    def _stop(self, index: int, deadline: float):
+        process = self.processes[index]
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logging.error("Worker %d did not stop in %.0f s, killing it", index, self.timeout)
+            process.kill()
+            process.join()
+
+    async def watch(self, ingress: Ingress, interval: float = 1.0):
+        for index in range(self.workers):
+            self.start(index)
+        while True:
+            for index, process in enumerate(self.processes):
+                if index in self._replacing:
+                    continue
+                if not process.is_alive():
+                    logging.warning("Worker %d exited with %s, restarting", index, process.exitcode)
+                    self.restarts += 1
+                    self.start(index)
+                ingress.shards[index].pid = self.processes[index].pid
+            await asyncio.sleep(interval)
+
+    async def rolling_restart(self, ingress: Ingress):
+        # One worker at a time, each back up before the next goes down; the ingress holds
+        # a restarting worker's updates meanwhile.
+        for index in range(self.workers):
+            self._replacing.add(index)
+            try:
+                self.processes[index].terminate()
+                await asyncio.to_thread(self._stop, index, time.monotonic() + self.timeout)
+                self.start(index)
+                ingress.shards[index].pid = self.processes[index].pid
+                while not await ingress.ready(ingress.shards[index]):
+                    await asyncio.sleep(0.2)
+            finally:
+                self._replacing.discard(index)
+            logging.info("Worker %d restarted", index)
+
+    def stop(self):
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.timeout
+        for index, process in enumerate(self.processes):
+            if process is not None:
+                self._stop(index, deadline)
+
+
+async def serve(config: Config, workers: int):
+    # Migrations run here once, before any worker opens the database.
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    migrate(conn)
+    conn.close()
+
+    ingress = Ingress(config, workers)
+    supervisor = Supervisor(workers)
+    watcher = asyncio.create_task(supervisor.watch(ingress))
+    session = aiohttp.ClientSession()
+    forwarders = [asyncio.create_task(shard.run(session)) for shard in ingress.shards]
+
+    app = web.Application()
+    app.router.add_post(config.WEBHOOK_PATH, ingress.handle)
+    app.router.add_get('/status', ingress.status)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+
+    if config.WEBHOOK_URL:
+        from aiogram import Bot
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        api = AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL)) if config.BOT_API_URL else None
+        bot = Bot(os.getenv('TELEGRAM_API_TOKEN'), session=api)
+        await bot.set_webhook(config.WEBHOOK_URL, secret_token=config.WEBHOOK_SECRET)
+        await bot.session.close()
+    logging.info("Ingress on %s:%d%s with %d workers",
+                 config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_PATH, workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    # SIGHUP restarts the workers one by one, e.g. to deploy new code without dropping games.
+    restarts = set()
+
+    def restart():
+        task = asyncio.create_task(supervisor.rolling_restart(ingress))
+        restarts.add(task)
+        task.add_done_callback(restarts.discard)
+
+    loop.add_signal_handler(signal.SIGHUP, restart)
+    await stop.wait()
+
+    for task in restarts:
+        task.cancel()
+    await runner.cleanup()
+    watcher.cancel()
+    # Workers drain and snapshot their sessions; the forwarders go once they are gone.
+    await asyncio.to_thread(supervisor.stop)
+    for forwarder in forwarders:
+        forwarder.cancel()
+    await session.close()
+    logging.info("Ingress stopped after %d updates, %d worker restarts", ingress.received, supervisor.restarts)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Run the bot behind a webhook with N worker processes')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: Config.WEBHOOK_WORKERS)')
+    parser.add_argument('--port', type=int, default=None, help='ingress port (default: Config.WEBHOOK_PORT)')
+    args = parser.parse_args()
+
+    settings = Config()
+    if args.port is not None:
+        settings.WEBHOOK_PORT = args.port
+    asyncio.run(serve(settings, args.workers or settings.WEBHOOK_WORKERS))